@@ -13,303 +13,914 @@ import logging
 
 # Set up logging
 logger = logging.getLogger(__name__)
-from typing import List, Optional, Dict, Any, Tuple
+from typing import List, Optional, Dict, Any, Tuple, NamedTuple
+from bisect import bisect_right
 from dotenv import load_dotenv
-from collections import Counter, defaultdict
+from collections import Counter, OrderedDict, defaultdict
+from scipy import sparse
 from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.decomposition import TruncatedSVD
 from textblob import TextBlob
 import nltk
 from nltk.tokenize import word_tokenize, sent_tokenize
 from nltk.corpus import stopwords
 from nltk.util import ngrams
-import spacy
 from tqdm import tqdm
+import threading
+import time
+import weakref
+import random
+import hashlib
+import sqlite3
+import string
+import struct
+from functools import lru_cache, partial
+from email.utils import parsedate_to_datetime
+import httpx
+from openai import AsyncOpenAI, APIConnectionError, APIStatusError, APITimeoutError
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
 
-# Download all required NLTK data
-def download_nltk_data():
-    """Download required NLTK resources."""
-    import ssl
-    try:
-        _create_unverified_https_context = ssl._create_unverified_context
-    except AttributeError:
-        pass
-    else:
-        ssl._create_default_https_context = _create_unverified_https_context
+# Load environment variables from .env file in current directory
+load_dotenv()
+
+
+class ResourceRegistry:
+    """
+    Lazy, cached loader for the NLTK data and spaCy model used by the agent.
     
-    resources = [
-        'punkt',
-        'stopwords',
-        'averaged_perceptron_tagger',
-        'maxent_ne_chunker',
-        'words',
-        'punkt_tab'
-    ]
-    for resource in resources:
+    Nothing is loaded at import time. Each resource is loaded on first use and
+    recorded with its load time, so workers start fast and startup cost can be
+    reported. Settings come from the environment:
+        LIGHTHOUSE_SPACY_MODEL  spaCy model name (default en_core_web_lg)
+        LIGHTHOUSE_OFFLINE      if true, never download; fail fast when missing
+    """
+    # NLTK resource name -> data path used by nltk.data.find
+    NLTK_PATHS = {
+        'punkt': 'tokenizers/punkt',
+        'punkt_tab': 'tokenizers/punkt_tab',
+        'stopwords': 'corpora/stopwords',
+        'averaged_perceptron_tagger': 'taggers/averaged_perceptron_tagger',
+        'maxent_ne_chunker': 'chunkers/maxent_ne_chunker',
+        'words': 'corpora/words',
+    }
+    
+    def __init__(self, model_name: Optional[str] = None, offline: Optional[bool] = None):
+        self.model_name = model_name or os.getenv("LIGHTHOUSE_SPACY_MODEL", "en_core_web_lg")
+        if offline is None:
+            offline = os.getenv("LIGHTHOUSE_OFFLINE", "").lower() in ("1", "true", "yes")
+        self.offline = offline
+        self.loaded: Dict[str, Dict[str, Any]] = {}  # resource -> {'seconds': float, 'status': str}
+        self._lock = threading.RLock()
+        self._spacy_model = None
+        
+    def spacy_model(self):
+        """Return the spaCy model, loading (and, unless offline, downloading) it on first use."""
+        if self._spacy_model is not None:
+            return self._spacy_model
+        with self._lock:
+            if self._spacy_model is None:
+                import spacy
+                start = time.perf_counter()
+                try:
+                    model = spacy.load(self.model_name)
+                    status = 'loaded'
+                except OSError:
+                    if self.offline:
+                        self._record(f'spacy:{self.model_name}', start, 'missing')
+                        raise RuntimeError(
+                            f"spaCy model '{self.model_name}' is not installed and LIGHTHOUSE_OFFLINE is set. "
+                            f"Install it with 'python -m spacy download {self.model_name}'."
+                        )
+                    logger.info(f"Downloading spaCy model: {self.model_name}")
+                    spacy.cli.download(self.model_name)
+                    model = spacy.load(self.model_name)
+                    status = 'downloaded'
+                self._record(f'spacy:{self.model_name}', start, status)
+                self._spacy_model = model
+        return self._spacy_model
+        
+    def ensure_nltk(self, *resources: str):
+        """Make sure the given NLTK resources are available, downloading missing ones unless offline."""
+        for resource in resources:
+            key = f'nltk:{resource}'
+            if key in self.loaded:
+                continue
+            with self._lock:
+                if key in self.loaded:
+                    continue
+                start = time.perf_counter()
+                try:
+                    nltk.data.find(self.NLTK_PATHS.get(resource, resource))
+                    status = 'found'
+                except LookupError:
+                    if self.offline:
+                        self._record(key, start, 'missing')
+                        raise RuntimeError(f"NLTK resource '{resource}' is not installed and LIGHTHOUSE_OFFLINE is set.")
+                    status = 'downloaded' if self._download_nltk(resource) else 'unavailable'
+                self._record(key, start, status)
+                
+    @staticmethod
+    def _download_nltk(resource: str) -> bool:
+        import ssl
         try:
-            nltk.data.find(f'tokenizers/{resource}')
-        except LookupError:
-            try:
-                print(f"Downloading NLTK resource: {resource}")
-                nltk.download(resource, quiet=True)
-            except Exception as e:
-                print(f"Failed to download {resource}: {e}. Continuing without this resource.")
+            _create_unverified_https_context = ssl._create_unverified_context
+        except AttributeError:
+            pass
+        else:
+            ssl._create_default_https_context = _create_unverified_https_context
+        try:
+            print(f"Downloading NLTK resource: {resource}")
+            return bool(nltk.download(resource, quiet=True))
+        except Exception as e:
+            print(f"Failed to download {resource}: {e}. Continuing without this resource.")
+            return False
+            
+    def _record(self, resource: str, start: float, status: str):
+        self.loaded[resource] = {'seconds': time.perf_counter() - start, 'status': status}
+        logger.info(f"Resource {resource} {status} in {self.loaded[resource]['seconds']:.2f}s")
+        
+    def preload(self):
+        """Load everything up front (for workers that prefer paying the cost at startup)."""
+        self.ensure_nltk('punkt', 'punkt_tab')
+        self.spacy_model()
+        
+    def startup_report(self) -> str:
+        """Describe what has been loaded so far and how long each resource took."""
+        lines = [f"NLP resources (model={self.model_name}, offline={self.offline}):"]
+        if not self.loaded:
+            lines.append("- nothing loaded yet (resources load on first use)")
+        for resource, info in self.loaded.items():
+            lines.append(f"- {resource}: {info['status']} in {info['seconds']:.2f}s")
+        return "\n".join(lines)
 
-# Download NLTK data
-download_nltk_data()
 
-# Load spaCy model
-try:
-    nlp = spacy.load('en_core_web_lg')
-except OSError:
-    os.system('python -m spacy download en_core_web_lg')
-    nlp = spacy.load('en_core_web_lg')
+resources = ResourceRegistry()
 
-# Load environment variables from .env file in current directory
-load_dotenv()
 
-from openai import OpenAI
+class DocFeatures(NamedTuple):
+    """Reusable features derived from one spaCy Doc."""
+    sentences: List[str]                 # lowercase sentence texts
+    noun_chunks: List[Tuple[str, int]]   # (lowercase chunk text, index of its sentence)
 
-class ConversationalAgent:
-    """A wrapper class to maintain conversation state."""
-    def __init__(self):
-        self.client = None
-        self.conversation_history = []
-        self.current_csv_data = None
-        self.csv_summary = None
-        self.learned_patterns = {}
-        self.prompt_feedback = {}
-        self.current_mode = None  # 'initial' or 'summary'
-        self.prompt_generated = False
-        self.analysis_cache = {}  # Cache for analysis results - cleared on init
-        self.current_analysis_prompt = None  # Store the generated analysis prompt
-        self.issue_counts = {  # Track counts for specific categories
-            'Email Configuration': 0,
-            'DNS Settings': 0,
-            'Email Migration': 0,
-            'Email Security': 0
-        }
-        # Clear all caches on initialization
-        self.clear_all_caches()
+
+class NLPService:
+    """
+    Batched spaCy processing shared by the topic, phrase and similarity helpers.
+    
+    Texts go through nlp.pipe with a configurable batch size and process count,
+    and each task disables the pipeline components it does not need. Derived
+    features are kept in a bounded cache keyed by text so helpers that look at
+    the same summaries do not parse them twice.
+    """
+    # Components each task can run without
+    TASK_DISABLE = {
+        'features': ['ner', 'lemmatizer'],
+        'vectors': ['tok2vec', 'tagger', 'parser', 'senter', 'attribute_ruler', 'lemmatizer', 'ner'],
+    }
+    
+    def __init__(self, registry: ResourceRegistry, batch_size: Optional[int] = None, n_process: Optional[int] = None, cache_size: int = 50000):
+        self.registry = registry
+        self.batch_size = batch_size or int(os.getenv("LIGHTHOUSE_NLP_BATCH_SIZE", "256"))
+        self.n_process = n_process or int(os.getenv("LIGHTHOUSE_NLP_PROCESSES", "1"))
+        self.cache_size = cache_size
+        self._feature_cache: Dict[str, DocFeatures] = {}
         
-    def _extract_key_phrases(self, text: str) -> List[str]:
-        """Extract key phrases using spaCy."""
-        doc = nlp(text)
-        phrases = []
-        for chunk in doc.noun_chunks:
-            if len(chunk.text.split()) >= 2:  # Only phrases with 2+ words
-                phrases.append(chunk.text.lower())
-        return phrases
+    @property
+    def nlp(self):
+        """The spaCy model, loaded on first use."""
+        return self.registry.spacy_model()
         
-    def _analyze_sentiment(self, text: str) -> Dict[str, float]:
-        """Analyze sentiment using TextBlob."""
-        blob = TextBlob(text)
-        return {
-            'polarity': blob.sentiment.polarity,
-            'subjectivity': blob.sentiment.subjectivity
-        }
+    def _disabled(self, task: str) -> List[str]:
+        return [name for name in self.TASK_DISABLE[task] if name in self.nlp.pipe_names]
         
-    def _get_common_topics(self, texts: List[str], n: int = 10) -> List[Tuple[str, int]]:
-        """Extract common topics using CountVectorizer and NLP analysis."""
-        # First, analyze each text to identify key issues and pain points
-        issue_phrases = []
-        for text in texts:
-            doc = nlp(text)
-            
-            # Look for sentences containing issue indicators
-            for sent in doc.sents:
-                sent_text = sent.text.lower()
-                if any(word in sent_text for word in ['issue', 'problem', 'error', 'difficult', 'cant', "can't", 'fail', 'bug', 'broken', 'slow', 'confusing']):
-                    # Extract the key noun phrases and their context
-                    for chunk in doc.noun_chunks:
-                        if len(chunk.text.split()) >= 2:  # Only phrases with 2+ words
-                            issue_phrases.append(chunk.text.lower())
+    def pipe(self, texts: List[str], task: str):
+        """Stream Docs for the given task through a trimmed pipeline."""
+        n_process = self.n_process if len(texts) >= self.batch_size * 2 else 1
+        return self.nlp.pipe(texts, batch_size=self.batch_size, n_process=n_process, disable=self._disabled(task))
         
-        # Use CountVectorizer as a backup for any remaining text
-        vectorizer = CountVectorizer(
-            ngram_range=(2, 3),
-            stop_words='english',
-            min_df=2,
-            max_df=0.9
-        )
+    def features(self, texts: List[str]) -> List[DocFeatures]:
+        """Return sentence and noun-chunk features for each text, parsing only uncached texts."""
+        missing = list(dict.fromkeys(text for text in texts if text not in self._feature_cache))
+        if missing:
+            if len(self._feature_cache) + len(missing) > self.cache_size:
+                self._feature_cache.clear()
+            for text, doc in zip(missing, self.pipe(missing, 'features')):
+                self._feature_cache[text] = self._doc_features(doc)
+        return [self._feature_cache[text] for text in texts]
+        
+    @staticmethod
+    def _doc_features(doc) -> DocFeatures:
+        sentences = list(doc.sents)
+        sent_starts = [sent.start for sent in sentences]
+        noun_chunks = []
+        if doc.has_annotation("DEP"):
+            for chunk in doc.noun_chunks:
+                noun_chunks.append((chunk.text.lower(), bisect_right(sent_starts, chunk.start) - 1))
+        return DocFeatures([sent.text.lower() for sent in sentences], noun_chunks)
+        
+    def similarity(self, text1: str, text2: str) -> float:
+        """Vector similarity of two texts using a tokenizer-only pipeline."""
+        doc1, doc2 = self.pipe([text1, text2], 'vectors')
+        if not doc1 or not doc2:
+            return 0.0
+        return doc1.similarity(doc2)
+        
+    def clear_cache(self):
+        self._feature_cache.clear()
+
+
+nlp_service = NLPService(resources)
+
+
+def _init_feature_worker():
+    """Process-pool initializer: spaCy multiprocessing inside a pool worker would oversubscribe cores."""
+    nlp_service.n_process = 1
+
+
+def _sentiment_shard(texts: List[str]) -> np.ndarray:
+    """TextBlob polarity and subjectivity of each text, as an (n, 2) float array."""
+    scores = np.empty((len(texts), 2), dtype=np.float64)
+    for i, text in enumerate(texts):
+        sentiment = TextBlob(text).sentiment
+        scores[i, 0] = sentiment.polarity
+        scores[i, 1] = sentiment.subjectivity
+    return scores
+
+
+def _issue_phrase_list_shard(texts: List[str]) -> List[List[str]]:
+    """Issue noun phrases of each text, in input order (the spaCy model loads once per worker, on first use)."""
+    return [ConversationalAgent._issue_noun_chunks(NLPService._doc_features(doc)) for doc in nlp_service.pipe(texts, 'features')]
+
+
+class FeaturePool:
+    """
+    Shards CPU-bound feature extraction (TextBlob sentiment, spaCy issue phrases)
+    across a process pool and merges the shard results in order.
+    
+    Workers return compact results (a float array or phrase lists) rather than
+    parsed documents. The pool starts on first use and its workers keep their
+    models loaded between calls. With one worker everything runs in-process.
+    Settings default to the environment:
+        LIGHTHOUSE_FEATURE_WORKERS       worker processes (default 1, in-process)
+        LIGHTHOUSE_FEATURE_SHARD_ROWS    rows per task sent to a worker (default 2000)
+        LIGHTHOUSE_FEATURE_START_METHOD  multiprocessing start method (default spawn;
+                                         forking a process that runs threads is unsafe)
+    """
+    
+    def __init__(self, workers: Optional[int] = None, shard_rows: Optional[int] = None, start_method: Optional[str] = None):
+        self.workers = workers or int(os.getenv("LIGHTHOUSE_FEATURE_WORKERS", "1"))
+        self.shard_rows = shard_rows or int(os.getenv("LIGHTHOUSE_FEATURE_SHARD_ROWS", "2000"))
+        self.start_method = start_method or os.getenv("LIGHTHOUSE_FEATURE_START_METHOD", "spawn")
+        self._executor = None
+        self._lock = threading.Lock()
+        
+    @property
+    def parallel(self) -> bool:
+        return self.workers > 1
         
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(self.start_method),
+                    initializer=_init_feature_worker
+                )
+            return self._executor
+            
+    def _map(self, func, texts: List[str], stage: str, progress: Optional["ProgressReporter"] = None) -> list:
+        """Run func over shards of texts, returning shard results in order and reporting rows done."""
+        shards = [texts[i:i + self.shard_rows] for i in range(0, len(texts), self.shard_rows)]
+        if progress is not None:
+            progress.update(stage, 0, len(texts))
+        results = [None] * len(shards)
+        done = 0
+        if not self.parallel or len(shards) < 2:
+            for i, shard in enumerate(shards):
+                results[i] = func(shard)
+                done += len(shard)
+                if progress is not None:
+                    progress.update(stage, done, len(texts))
+            return results
+        
+        from concurrent.futures import as_completed
+        futures = {self._pool().submit(func, shard): i for i, shard in enumerate(shards)}
         try:
-            # Combine NLP-extracted phrases with vectorizer results
-            if issue_phrases:
-                phrase_counts = Counter(issue_phrases)
-                nlp_topics = [(phrase, count) for phrase, count in phrase_counts.most_common()]
-            else:
-                nlp_topics = []
-            
-            # Get additional topics from vectorizer
-            X = vectorizer.fit_transform(texts)
-            words = vectorizer.get_feature_names_out()
-            counts = X.sum(axis=0).A1
-            vec_topics = list(zip(words, counts))
-            
-            # Combine and sort all topics
-            all_topics = nlp_topics + vec_topics
-            return sorted(all_topics, key=lambda x: x[1], reverse=True)[:n]
-            
-        except ValueError:  # If no features were extracted
-            if issue_phrases:
-                phrase_counts = Counter(issue_phrases)
-                return phrase_counts.most_common(n)
-            return []
-            
-    def _analyze_text_stats(self, texts: List[str]) -> Dict[str, Any]:
-        """Analyze text statistics."""
-        word_counts = [len(text.split()) for text in texts]
-        sent_counts = [len(sent_tokenize(text)) for text in texts]
-        return {
-            'avg_words': np.mean(word_counts),
-            'std_words': np.std(word_counts),
-            'avg_sentences': np.mean(sent_counts),
-            'std_sentences': np.std(sent_counts),
-            'min_words': min(word_counts),
-            'max_words': max(word_counts)
+            for future in as_completed(futures):
+                i = futures[future]
+                results[i] = future.result()
+                done += len(shards[i])
+                if progress is not None:
+                    progress.update(stage, done, len(texts))
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+        return results
+        
+    def sentiment(self, texts: List[str], progress: Optional["ProgressReporter"] = None) -> np.ndarray:
+        """(n, 2) array of TextBlob polarity and subjectivity, in input order."""
+        shards = self._map(_sentiment_shard, texts, 'scoring', progress)
+        return np.concatenate(shards) if shards else np.empty((0, 2), dtype=np.float64)
+        
+    def issue_phrase_lists(self, texts: List[str], progress: Optional["ProgressReporter"] = None) -> List[List[str]]:
+        """Per-text 2+ word noun phrases inside sentences that mention an issue, in input order."""
+        return [phrases for shard in self._map(_issue_phrase_list_shard, texts, 'topics', progress) for phrases in shard]
+        
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
+
+
+feature_pool = FeaturePool()
+
+# Keyword families scanned by analyze_summaries and its report helpers. Each
+# family becomes one bit in the per-row hit mask built by _score_summaries, so
+# every report section can filter on a precomputed column instead of rescanning
+# the text.
+REPORT_FEATURES = ['checkout', 'navigation', 'mobile', 'search', 'payment', 'cart']
+NEGATIVE_TERMS = ['issue', 'problem', 'error', 'fail', 'bug', 'broken', 'pain point']
+PAIN_POINT_CATEGORIES = {
+    'Technical Issues': ['error', 'bug', 'crash', 'broken', 'not working'],
+    'User Interface': ['confusing', 'difficult to find', 'hard to use', 'unclear'],
+    'Performance': ['slow', 'lag', 'loading', 'timeout'],
+    'Functionality': ['missing feature', 'doesn\'t work', 'can\'t do'],
+    'Integration': ['sync', 'connect', 'integration', 'api'],
+    'Other': []
+}
+COMPETITORS = ['shopify', 'woocommerce', 'magento', 'bigcommerce', 'wix']
+EXPECTED_FEATURES = [
+    "Advanced search functionality",
+    "Bulk operations",
+    "Custom reporting tools",
+    "API documentation",
+    "Developer tools"
+]
+
+KEYWORD_FAMILIES = {
+    **{f'feature:{feature}': [feature] for feature in REPORT_FEATURES},
+    'service': ['support', 'help', 'service', 'agent'],
+    'performance': ['reliable', 'fast', 'stable', 'performance'],
+    'improvement': ['improved', 'better', 'update', 'new'],
+    'negative': NEGATIVE_TERMS,
+    **{f'pain:{category}': keywords for category, keywords in PAIN_POINT_CATEGORIES.items() if keywords},
+    'other_issue': ['issue', 'problem', 'complaint'],
+    **{f'expected:{feature}': [feature.lower()] for feature in EXPECTED_FEATURES},
+    'behavior:time': ['morning', 'afternoon', 'evening', 'night', 'weekend'],
+    'behavior:mobile': ['mobile', 'phone', 'tablet', 'app'],
+    'behavior:desktop': ['desktop', 'laptop', 'pc', 'computer'],
+    'behavior:feature': ['feature', 'function', 'tool', 'option'],
+    'trend:integration': ['integrate', 'connection', 'api', 'sync'],
+    'trend:mobile': ['mobile', 'responsive', 'app'],
+    'trend:problem': ['problem', 'issue', 'error'],
+    'trend:security': ['secure', 'security', 'privacy', 'protection'],
+    **{f'competitor:{competitor}': [competitor] for competitor in COMPETITORS},
+    'observation:seasonal': ['summer', 'winter', 'holiday', 'season', 'black friday', 'christmas'],
+    'observation:geo': ['region', 'country', 'location', 'timezone', 'international'],
+    'observation:browser': ['chrome', 'firefox', 'safari', 'edge', 'browser'],
+    'topic_issue': ['issue', 'problem', 'error', 'difficult', 'cant', "can't", 'fail', 'bug', 'broken', 'slow', 'confusing'],
+}
+
+
+class KeywordIndex:
+    """
+    Substring matcher for many keyword families in a single scan per text.
+    
+    All keywords are compiled into one trie-shaped regex inside a lookahead, so
+    each text is walked once regardless of how many families or keywords exist.
+    The longest keyword starting at each position is reported, and a hit on a
+    keyword also counts as a hit on every keyword it contains ("can't do" ->
+    "can't"), which keeps the plain `keyword in text` semantics.
+    """
+    def __init__(self, families: Dict[str, List[str]]):
+        if len(families) > 63:
+            raise ValueError("KeywordIndex supports at most 63 keyword families")
+        self.families = list(families)
+        self.bits = {family: 1 << bit for bit, family in enumerate(self.families)}
+        
+        keyword_masks = defaultdict(int)
+        for family, keywords in families.items():
+            for keyword in keywords:
+                keyword_masks[keyword.lower()] |= self.bits[family]
+        
+        # Fold the masks of contained keywords into each keyword
+        self._masks = {
+            keyword: np.bitwise_or.reduce([mask for other, mask in keyword_masks.items() if other in keyword]).item()
+            for keyword in keyword_masks
         }
+        self._pattern = re.compile(f"(?=({self._trie_pattern(keyword_masks)}))")
         
-    def _find_representative_samples(self, texts: List[str], n: int = 3) -> List[str]:
-        """Find representative samples based on length and content."""
-        if len(texts) <= n:
-            return texts
-            
-        # Get samples from different length categories
-        word_counts = [len(text.split()) for text in texts]
-        sorted_indices = np.argsort(word_counts)
+    @staticmethod
+    def _trie_pattern(keywords) -> str:
+        """Build a regex alternation shaped like a trie so only one branch is tried per character."""
+        trie = {}
+        for keyword in keywords:
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[''] = {}
+            
+        def build(node):
+            branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+            if not branches:
+                return ''
+            body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+            # Greedy optional suffix: the longest keyword at a position wins
+            return f'(?:{body})?' if '' in node else body
+            
+        return build(trie)
         
-        samples = []
-        step = len(texts) // n
-        for i in range(n):
-            idx = sorted_indices[i * step]
-            samples.append(texts[idx])
-            
-        return samples
-
-    def clear_all_caches(self):
-        """Clear all application caches."""
-        self.analysis_cache.clear()
-        self.learned_patterns.clear()
-        self.prompt_feedback.clear()
-        self.current_csv_data = None
-        self.csv_summary = None
-        self.current_mode = None
+    def scan(self, text_lower: str) -> int:
+        """Return the family bitmask for one lowercase text."""
+        mask = 0
+        for keyword in set(self._pattern.findall(text_lower)):
+            mask |= self._masks[keyword]
+        return mask
         
-        # Don't clear prompt-related state unless explicitly requested
-        if not self.prompt_generated:
-            self.current_analysis_prompt = None
-        self.prompt_generated = False
-            
-        print("All caches cleared.")
-
-    async def initialize(self):
-        """Initialize the GOCAAS client."""
-        # Set up API credentials from environment variables
-        api_key = os.getenv("GOCAAS_API_KEY")  # Put your *proxy* key in .env
-        api_base = os.getenv("GOCAAS_API_BASE", "https://caas-gocode-staging.caas-staging.staging.onkatana.net/v1")
-        assert api_key, "Missing GOCAAS_API_KEY env var"
+    def masks(self, texts_lower) -> np.ndarray:
+        """Return one family bitmask per lowercase text."""
+        return np.fromiter((self.scan(text) for text in texts_lower), dtype=np.int64, count=len(texts_lower))
         
-        print("Using API Key:", api_key)
-        print("Using API Base:", api_base)
+    def hit_sets(self, texts_lower) -> List[set]:
+        """Return the set of family names hit by each lowercase text."""
+        return [{family for family, bit in self.bits.items() if mask & bit} for mask in self.masks(texts_lower)]
         
-        # Configure GOCAAS client
-        self.client = OpenAI(
+    def count(self, family_mask: np.ndarray, *families: str) -> int:
+        """Count rows whose mask hits every one of the given families."""
+        required = 0
+        for family in families:
+            required |= self.bits[family]
+        return int(((family_mask & required) == required).sum())
+
+
+KEYWORD_INDEX = KeywordIndex(KEYWORD_FAMILIES)
+
+# Rows per chunk when parsing uploaded or on-disk CSVs
+CSV_CHUNK_ROWS = int(os.getenv("LIGHTHOUSE_CSV_CHUNK_ROWS", "10000"))
+# Metadata columns of the run_id exports kept alongside conversation_summary, with compact dtypes
+METADATA_COLUMNS = {
+    'css_score': 'Int8',
+    'nps_score': 'Int8',
+    'interaction_duration': 'Int32',  # Seconds
+    'routing_report_region_2': 'category',
+    'customer_type_name': 'category',
+    'handled_repeat_contact_platform': 'category',
+}
+CSV_COLUMNS = {'conversation_summary', *METADATA_COLUMNS}
+# Categorical metadata columns broken down in the report, with their labels
+CONTEXT_BREAKDOWNS = {
+    'routing_report_region_2': 'Region',
+    'customer_type_name': 'Customer Type',
+    'handled_repeat_contact_platform': 'Repeat Contact',
+}
+# Rows scored between progress updates (and cancellation checks) in analyze_summaries
+SCORE_PROGRESS_ROWS = 500
+# Bump when analyze_summaries output changes so cached reports are not reused
+ANALYSIS_VERSION = "5"
+
+LLM_MODEL = os.getenv("LIGHTHOUSE_LLM_MODEL", "gpt-3.5-turbo")
+LLM_TIMEOUT = float(os.getenv("LIGHTHOUSE_LLM_TIMEOUT", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LIGHTHOUSE_LLM_MAX_RETRIES", "3"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LIGHTHOUSE_LLM_MAX_CONNECTIONS", "100"))
+# Send SYSTEM_PROMPT.cache_key as prompt_cache_key (OpenAI prompt caching); off for proxies that reject it
+LLM_SEND_PROMPT_CACHE_KEY = os.getenv("LIGHTHOUSE_PROMPT_CACHE_KEY", "").lower() in ("1", "true", "yes")
+# Ask for a usage chunk at the end of streams, which reports cached prompt tokens
+LLM_STREAM_USAGE = os.getenv("LIGHTHOUSE_LLM_STREAM_USAGE", "").lower() in ("1", "true", "yes")
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+# On-disk caches (LLM results) live here
+CACHE_DIR = os.path.expanduser(os.getenv("LIGHTHOUSE_CACHE_DIR", "~/.cache/lighthouse"))
+
+# One pooled AsyncOpenAI client per (api_key, api_base), shared by every agent
+_llm_clients: Dict[Tuple[str, str], AsyncOpenAI] = {}
+
+
+def get_llm_client(api_key: str, api_base: str) -> AsyncOpenAI:
+    """Return the shared AsyncOpenAI client for these credentials, creating it on first use."""
+    key = (api_key, api_base)
+    if key not in _llm_clients:
+        logger.info(f"Using API base {api_base} with key ...{api_key[-4:]}")
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_CONNECTIONS
+            ),
+            timeout=LLM_TIMEOUT
+        )
+        _llm_clients[key] = AsyncOpenAI(
             api_key=api_key,
-            base_url=api_base
+            base_url=api_base,
+            http_client=http_client,
+            max_retries=0  # Retries are handled by ConversationalAgent._create_completion
         )
+    return _llm_clients[key]
 
-    async def run(self, message: str) -> str:
-        """Run the agent with a single message."""
-        return await self.chat(message)
 
+def retry_delay(error: Exception, attempt: int, base: float = 1.0, cap: float = 30.0) -> float:
+    """
+    Seconds to wait before retrying a failed LLM call.
+    Honors Retry-After / retry-after-ms headers on the response, otherwise uses
+    exponential backoff with full jitter.
+    """
+    response = getattr(error, 'response', None)
+    headers = response.headers if response is not None else {}
+    try:
+        if 'retry-after-ms' in headers:
+            return min(float(headers['retry-after-ms']) / 1000, cap)
+        if 'retry-after' in headers:
+            value = headers['retry-after']
+            try:
+                return min(float(value), cap)
+            except ValueError:
+                wait = parsedate_to_datetime(value).timestamp() - time.time()
+                return min(max(wait, 0.0), cap)
+    except (TypeError, ValueError):
+        pass
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
 
-    async def chat(self, message: str) -> str:
-        """
-        Chat with the model while maintaining conversation history and learning from interactions.
-        Args:
-            message: The user message
-        Returns:
-            The model's response
-        """
-        try:
-            # Add user message to history
-            self.conversation_history.append({"role": "user", "content": message})
-            
-            # Determine or update mode based on user input
-            if not self.current_mode:
-                if message.lower() in ['1', 'initial prompt']:
-                    self.current_mode = 'initial'
-                    self.prompt_generated = False
-                    return """Here is your complete analysis prompt:
 
-[transcript] You are tasked with analyzing and summarizing call transcripts (document above) from the customer service center of GoDaddy.com. Each conversation begins with one of the following identifiers: "System", "Bot", "Customer", "Consumer", or "Agent". "Customer" and "Consumer" are synonymous. "Agent" refers to a human support representative, while "Bot" is a chatbot. Some transcripts may contain low-quality speech-to-text conversions, so please interpret carefully and clarify where appropriate. Each turn starts with the role indicated above followed by ':', and ends with '|||'. Identifiable information like names and emails have been redacted as GD_REDACTED_NAME and GD_REDACTED_EMAIL.
+class LLMResultCache:
+    """
+    Persistent, content-addressed cache of chat completion results in SQLite.
+    
+    Keys are a SHA-256 of the model, the normalized messages and the request
+    parameters, so an identical request (the same prompt over the same batch of
+    rows, say) is answered from disk. Entries expire after a TTL and the least
+    recently used are evicted once the cache grows past its size limit.
+    Settings default to the environment:
+        LIGHTHOUSE_LLM_CACHE         set to 0/false/off to bypass the cache
+        LIGHTHOUSE_LLM_CACHE_PATH    database file (default <LIGHTHOUSE_CACHE_DIR>/llm_cache.sqlite)
+        LIGHTHOUSE_LLM_CACHE_TTL     seconds an entry stays valid (default 7 days)
+        LIGHTHOUSE_LLM_CACHE_MAX_MB  size limit before LRU eviction (default 256)
+    """
+    
+    def __init__(self, path: Optional[str] = None, ttl: Optional[float] = None, max_mb: Optional[float] = None,
+                 enabled: Optional[bool] = None):
+        self.path = path or os.getenv("LIGHTHOUSE_LLM_CACHE_PATH", os.path.join(CACHE_DIR, "llm_cache.sqlite"))
+        self.ttl = ttl if ttl is not None else float(os.getenv("LIGHTHOUSE_LLM_CACHE_TTL", str(7 * 24 * 3600)))
+        self.max_bytes = int((max_mb if max_mb is not None else float(os.getenv("LIGHTHOUSE_LLM_CACHE_MAX_MB", "256"))) * 1024 * 1024)
+        self.enabled = enabled if enabled is not None else os.getenv("LIGHTHOUSE_LLM_CACHE", "1").lower() not in ("0", "false", "off", "no")
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed)")
+        return self._conn
+        
+    @staticmethod
+    def make_key(model: str, messages: List[Dict[str, str]], params: Dict[str, Any]) -> str:
+        """Hash of the model, messages (role and whitespace-trimmed content) and parameters."""
+        normalized = [{'role': m.get('role'), 'content': (m.get('content') or '').strip()} for m in messages]
+        payload = json.dumps({'model': model, 'messages': normalized, 'params': params}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+        
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached value for key, or None if it is missing or expired."""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT value, created FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    conn.commit()
+                self.misses += 1
+                return None
+            conn.execute("UPDATE llm_cache SET accessed = ? WHERE key = ?", (now, key))
+            conn.commit()
+            self.hits += 1
+            return row[0]
+            
+    def put(self, key: str, value: str):
+        """Store value under key, then evict expired and least recently used entries over the size limit."""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value.encode('utf-8')), now, now)
+            )
+            self.evictions += conn.execute("DELETE FROM llm_cache WHERE created < ?", (now - self.ttl,)).rowcount
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+            if total > self.max_bytes:
+                # Drop the oldest entries until the cache is back under 90% of the limit
+                freed = 0
+                stale = []
+                for old_key, size in conn.execute("SELECT key, size FROM llm_cache ORDER BY accessed"):
+                    if total - freed <= self.max_bytes * 0.9:
+                        break
+                    stale.append((old_key,))
+                    freed += size
+                conn.executemany("DELETE FROM llm_cache WHERE key = ?", stale)
+                self.evictions += len(stale)
+            conn.commit()
+            
+    def clear(self):
+        """Delete every cached result and reset the counters."""
+        with self._lock:
+            if self._conn is not None or os.path.exists(self.path):
+                conn = self._connect()
+                conn.execute("DELETE FROM llm_cache")
+                conn.commit()
+            self.hits = self.misses = self.evictions = 0
+            
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, size = (0, 0)
+            if self._conn is not None or os.path.exists(self.path):
+                entries, size = self._connect().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+        return {
+            'enabled': self.enabled,
+            'entries': entries,
+            'mb': round(size / (1024 * 1024), 2),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
 
-1. Identify key pain points experienced by the customers related to domain issues in each call.
-2. Analyze how the bot and/or agent handled the issue(s) in the given call.
-3. Point out what went well and could be improved in terms of the given call and determine if escalating issues specific to domain management.
-4. Provide specific examples from the transcript to support your analysis.
 
-**Task instructions:**"""
-                elif message.lower() in ['2', 'summary of summaries', 'summary of summaries prompt']:
-                    self.current_mode = 'summary'
-                    self.prompt_generated = False
-                    return """Analyze customer call transcripts between customers and customer service guides regarding commerce website development issues. Provide a detailed breakdown of the following:
+llm_cache = LLMResultCache()
 
-Output Format:
-1. Executive Summary:
-   - Provide a concise overview of key findings and general sentiment.
 
-2. Quantitative Analysis:
-   - Count and percentage of specific feature mentions (list all features mentioned)
-   - Frequency distribution of all complaints by category
-   - Overall sentiment analysis with percentages (positive, neutral, negative) and identification of the most common sentiment mode
+class FeatureStore:
+    """
+    Persistent per-text features (sentiment scores, issue phrases) in SQLite.
+    
+    Keys are a SHA-256 of the extractor version and the summary text, so weekly
+    exports that repeat most of their summaries only compute features for new
+    texts, and upgrading TextBlob, the spaCy model or the issue keywords starts
+    a fresh set of keys. Once the store grows past its size limit the
+    oldest-written entries are dropped (reads do not refresh an entry). Settings default to the environment:
+        LIGHTHOUSE_FEATURE_STORE         set to 0/false/off to compute every feature
+        LIGHTHOUSE_FEATURE_STORE_PATH    database file (default <LIGHTHOUSE_CACHE_DIR>/features.sqlite)
+        LIGHTHOUSE_FEATURE_STORE_MAX_MB  size limit before the oldest-written entries are dropped (default 512)
+    """
+    # Bump when an extractor's output changes without a package upgrade
+    EXTRACTOR_REVISIONS = {'sentiment': 1, 'phrases': 1}
+    # Keys per SELECT ... IN (...) statement
+    LOOKUP_BATCH = 500
+    
+    def __init__(self, path: Optional[str] = None, max_mb: Optional[float] = None, enabled: Optional[bool] = None):
+        self.path = path or os.getenv("LIGHTHOUSE_FEATURE_STORE_PATH", os.path.join(CACHE_DIR, "features.sqlite"))
+        self.max_bytes = int((max_mb if max_mb is not None else float(os.getenv("LIGHTHOUSE_FEATURE_STORE_MAX_MB", "512"))) * 1024 * 1024)
+        self.enabled = enabled if enabled is not None else os.getenv("LIGHTHOUSE_FEATURE_STORE", "1").lower() not in ("0", "false", "off", "no")
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._versions: Dict[str, str] = {}
+        
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS features ("
+                "key BLOB PRIMARY KEY, value BLOB NOT NULL, created REAL NOT NULL) WITHOUT ROWID"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS features_created ON features (created)")
+        return self._conn
+        
+    @staticmethod
+    def _package_version(name: str) -> str:
+        from importlib import metadata
+        try:
+            return metadata.version(name)
+        except metadata.PackageNotFoundError:
+            return "none"
+            
+    def extractor_version(self, extractor: str) -> str:
+        """Version string of everything the extractor's output depends on (read from package metadata, not by loading models)."""
+        if extractor not in self._versions:
+            parts = [f"{extractor}-{self.EXTRACTOR_REVISIONS[extractor]}"]
+            if extractor == 'sentiment':
+                parts.append(f"textblob-{self._package_version('textblob')}")
+            else:
+                parts.append(f"{resources.model_name}-{self._package_version(resources.model_name)}")
+                parts.append(f"spacy-{self._package_version('spacy')}")
+                parts.append(hashlib.sha256(json.dumps(KEYWORD_FAMILIES['topic_issue']).encode('utf-8')).hexdigest()[:12])
+            self._versions[extractor] = ":".join(parts)
+        return self._versions[extractor]
+        
+    @staticmethod
+    def _encode(extractor: str, value) -> bytes:
+        if extractor == 'sentiment':
+            return struct.pack('<dd', float(value[0]), float(value[1]))
+        return json.dumps(value).encode('utf-8')
+        
+    @staticmethod
+    def _decode(extractor: str, value: bytes):
+        if extractor == 'sentiment':
+            return struct.unpack('<dd', value)
+        return json.loads(value)
+        
+    def features(self, extractor: str, texts: List[str], compute) -> list:
+        """
+        Per-text features, reading stored values and computing only texts the store has not seen.
+        Args:
+            extractor: 'sentiment' (polarity, subjectivity) or 'phrases' (issue noun phrases)
+            texts: Texts to look up; repeated texts are looked up and computed once
+            compute: Callable mapping a list of texts to one feature value per text
+        Returns:
+            list: One feature value per input text, in input order
+        """
+        if not self.enabled or not texts:
+            return list(compute(texts))
+        version = self.extractor_version(extractor).encode('utf-8') + b"\0"
+        unique = list(dict.fromkeys(texts))
+        keys = [hashlib.sha256(version + text.encode('utf-8')).digest() for text in unique]
+        with self._lock:
+            conn = self._connect()
+            stored = {}
+            for start in range(0, len(keys), self.LOOKUP_BATCH):
+                batch = keys[start:start + self.LOOKUP_BATCH]
+                stored.update(conn.execute(
+                    f"SELECT key, value FROM features WHERE key IN ({','.join('?' * len(batch))})", batch
+                ).fetchall())
+            missing = [i for i, key in enumerate(keys) if key not in stored]
+            self.hits += len(unique) - len(missing)
+            self.misses += len(missing)
+            
+        values = [None] * len(unique)
+        for i, key in enumerate(keys):
+            if key in stored:
+                values[i] = self._decode(extractor, stored[key])
+        if missing:
+            computed = compute([unique[i] for i in missing])
+            rows = []
+            for i, value in zip(missing, computed):
+                values[i] = value
+                rows.append((keys[i], self._encode(extractor, value)))
+            self._put_many(rows)
+        by_text = dict(zip(unique, values))
+        return [by_text[text] for text in texts]
+        
+    @staticmethod
+    def _used_bytes(conn: sqlite3.Connection) -> int:
+        """Database pages in use (freed pages are reused, not returned to the file system)."""
+        pages = conn.execute("PRAGMA page_count").fetchone()[0] - conn.execute("PRAGMA freelist_count").fetchone()[0]
+        return pages * conn.execute("PRAGMA page_size").fetchone()[0]
+        
+    def _put_many(self, rows: List[Tuple[bytes, bytes]]):
+        """Insert rows, then drop the oldest-written tenth of the entries while the store is over its size limit."""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.executemany("INSERT OR REPLACE INTO features (key, value, created) VALUES (?, ?, ?)",
+                             [(key, value, now) for key, value in rows])
+            conn.commit()
+            while True:
+                entries = conn.execute("SELECT COUNT(*) FROM features").fetchone()[0]
+                if self._used_bytes(conn) <= self.max_bytes or entries == 0:
+                    break
+                self.evictions += conn.execute(
+                    "DELETE FROM features WHERE key IN (SELECT key FROM features ORDER BY created LIMIT ?)",
+                    (max(entries // 10, 1),)
+                ).rowcount
+                conn.commit()
+                
+    def clear(self):
+        """Delete every stored feature and reset the counters."""
+        with self._lock:
+            if self._conn is not None or os.path.exists(self.path):
+                conn = self._connect()
+                conn.execute("DELETE FROM features")
+                conn.commit()
+            self.hits = self.misses = self.evictions = 0
+            
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, size = (0, 0)
+            if self._conn is not None or os.path.exists(self.path):
+                conn = self._connect()
+                entries = conn.execute("SELECT COUNT(*) FROM features").fetchone()[0]
+                size = self._used_bytes(conn)
+        return {
+            'enabled': self.enabled,
+            'entries': entries,
+            'mb': round(size / (1024 * 1024), 2),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
 
-3. What's Working Well:
-   - Identify positive aspects of the commerce website mentioned by customers
-   - Highlight features receiving praise or positive feedback
-   - Note any compliments about recent improvements
 
-4. Categories of Pain Points:
-   - Categorize all identified issues into logical groupings (e.g., checkout problems, navigation issues, mobile compatibility, etc.)
-   - Include an "Other" category for issues that don't fit neatly into the main categories
-   - For each category (including "Other"), provide representative examples from the transcripts
+feature_store = FeatureStore()
+
+
+async def _replay_stream(completion: ChatCompletion):
+    """Yield a cached completion as a single stream chunk."""
+    yield ChatCompletionChunk(
+        id=completion.id,
+        object='chat.completion.chunk',
+        created=completion.created,
+        model=completion.model,
+        choices=[{'index': 0, 'delta': {'role': 'assistant', 'content': completion.choices[0].message.content}, 'finish_reason': 'stop'}]
+    )
+
+
+async def _record_stream(stream, model: str, key: str):
+    """Pass stream chunks through and cache the assembled completion once the stream finishes."""
+    parts = []
+    finish_reason = None
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            parts.append(chunk.choices[0].delta.content)
+        if chunk.choices and chunk.choices[0].finish_reason:
+            finish_reason = chunk.choices[0].finish_reason
+        yield chunk
+    if finish_reason == 'length':
+        return  # Truncated at max_tokens; it would replay as a complete answer
+    completion = ChatCompletion(
+        id='chatcmpl-cached',
+        object='chat.completion',
+        created=int(time.time()),
+        model=model,
+        choices=[{'index': 0, 'message': {'role': 'assistant', 'content': ''.join(parts)}, 'finish_reason': 'stop'}]
+    )
+    await asyncio.to_thread(llm_cache.put, key, completion.model_dump_json())
+
+
+def is_retryable(error: Exception) -> bool:
+    """Timeouts, connection errors, rate limits and 5xx responses are worth retrying."""
+    if isinstance(error, (APITimeoutError, APIConnectionError, asyncio.TimeoutError)):
+        return True
+    return isinstance(error, APIStatusError) and error.status_code in RETRYABLE_STATUS_CODES
+
+
+@lru_cache(maxsize=1)
+def _token_encoder():
+    """tiktoken encoder for LLM_MODEL, or None when tiktoken (or its BPE files) is unavailable."""
+    try:
+        import tiktoken
+        try:
+            return tiktoken.encoding_for_model(LLM_MODEL)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
 
-5. Top 3 Issues:
-   - Identify and detail the three most frequently mentioned problems
-   - For each top issue, include:
-     * Number of mentions and percentage of total complaints
-     * Specific customer quotes illustrating the problem
-     * Impact on customer experience and business outcomes
 
-6. Top 3 Recommendations:
-   - For each of the top 3 issues, provide very specific, actionable recommendations
-   - Include overall strategic recommendations for improving the commerce website experience
+def count_tokens(text: str) -> int:
+    """Token count for text; approximated as ~4 characters per token without tiktoken."""
+    encoder = _token_encoder()
+    if encoder is None:
+        return (len(text) + 3) // 4
+    return len(encoder.encode(text))
 
-7. Additional Insights:
-   - Note any patterns in customer behavior or expectations
-   - Identify emerging trends or concerns not captured in the main categories
-   - Highlight any competitive comparisons mentioned by customers
 
-8. Not Found:
-   - List any important commerce website elements or features specifically looked for but were not mentioned in the transcripts
+def count_message_tokens(messages: List[Dict[str, str]]) -> int:
+    """Token count for a chat message list, including the per-message framing overhead."""
+    return sum(count_tokens(message.get('content') or '') + 4 for message in messages) + 2
 
-9. Other Observations:
-   - Include any relevant findings that don't fit into the above categories
-   - Note any unusual or unexpected patterns in the customer interactions
 
-Ensure all recommendations are specific, actionable, and directly address the identified issues. Support your analysis with direct quotes or examples from the transcripts whenever possible.
+class SystemPromptTemplate:
+    """
+    Versioned system prompt, built once at import.
+    
+    The same message dict is sent first on every call, so the request prefix is
+    byte-identical across calls and sessions and can be served from the
+    provider's prompt cache. Its token count is computed once here.
+    """
+    def __init__(self, version: str, text: str):
+        self.version = version
+        self.text = text
+        self.sha = hashlib.sha256(text.encode('utf-8')).hexdigest()[:12]
+        self.message = {"role": "system", "content": text}
+        self._token_count = None
+        
+    @property
+    def token_count(self) -> int:
+        if self._token_count is None:
+            self._token_count = count_message_tokens([self.message]) - 2
+        return self._token_count
+        
+    @property
+    def cache_key(self) -> str:
+        """Stable key identifying this prompt prefix to providers that accept one."""
+        return f"lighthouse-system-{self.version}-{self.sha}"
 
-Would you like to customize any part of this prompt before we proceed with the analysis?"""
-                elif not any(mode in message.lower() for mode in ['1', '2', 'initial prompt', 'summary of summaries']):
-                    return """Would you like to create:
-1. An initial prompt for analyzing individual transcripts, or
-2. A summary of summaries prompt for analyzing multiple transcript summaries?
 
-Please type '1' or 'initial prompt' for option 1, or '2' or 'summary of summaries' for option 2."""
-            
-            # Create messages array for the API call
-            messages = [
-                {"role": "system", "content": """You are an expert LLM Prompt Engineer specializing in conversation analysis. Your responses should be:
+SYSTEM_PROMPT = SystemPromptTemplate(version="1", text="""You are an expert LLM Prompt Engineer specializing in conversation analysis. Your responses should be:
 1. Clear and focused - one question at a time
 2. Well-formatted with proper spacing and sections
 3. Patient - wait for the user's answer before proceeding
@@ -533,126 +1144,1534 @@ Analysis Instructions:
 - Highlight priority areas
 - Note data limitations
 
-When creating the prompt:
-1. First ask about the specific domain/topic they want to analyze
-2. Ask about any specific metrics or patterns they want to track
-3. Confirm if they want to modify any sections of the structure
-4. Present the complete prompt using this exact structure
-5. After the prompt is finalized, ask them to provide their CSV file
+When creating the prompt:
+1. First ask about the specific domain/topic they want to analyze
+2. Ask about any specific metrics or patterns they want to track
+3. Confirm if they want to modify any sections of the structure
+4. Present the complete prompt using this exact structure
+5. After the prompt is finalized, ask them to provide their CSV file
+
+**When generating your output, always use the following detailed format:**
+
+### Quantitative Analysis
+- Provide a table listing each specific topic or issue mentioned, with:
+  - The number of mentions
+  - Percentage of total summaries
+  - Example quotes for each topic/issue
+- For each issue, break down into sub-issues or related topics, and provide counts for each.
+- List all GoDaddy products mentioned, with:
+  - Number of mentions
+  - Percentage of total summaries
+  - Context in which each product was discussed (e.g., problem, praise, question)
+- Include summary statistics (e.g., average number of issues per summary, most/least common topics).
+
+### Top 3 [Topic] Issues
+For each of the top 3 issues:
+- Frequency (count and percentage)
+- Key pain points (bulleted list)
+- Sub-issues or related challenges
+- Root causes if identifiable
+- Customer emotions or sentiment expressed (with supporting quotes)
+- Representative quotes (at least 3-5 per issue, with attribution if possible)
+- Affected products or services
+- Any relevant metadata (e.g., channel, region, call duration, customer type)
+
+### Specific Recommendations
+For each top issue:
+- 3-5 actionable recommendations, each with a clear rationale
+- Prioritize recommendations by potential impact and ease of implementation
+- Suggest metrics to track the effectiveness of each recommendation
+
+### What's Working Well
+- List positive patterns, successful features, and effective processes
+- Include direct positive customer quotes and specific examples
+- Highlight any improvements over time if visible in the data
+
+### Additional Insights
+- List any other valuable observations, with supporting data or quotes
+- Identify emerging trends or outlier cases
+- Note any unexpected findings
+
+### Not Found
+- List important elements that were specifically looked for but not found
+- Note any gaps in the data or analysis
+
+### Uncertainties
+- List any areas where the data is unclear or ambiguous
+- Suggest what additional information would help clarify these uncertainties
+
+### Formatting Requirements
+- Use clear section headers and bullet points
+- Include tables for quantitative data where appropriate
+- Use bold or italics to highlight key findings
+- Ensure the output is easy to scan and actionable
+
+**Instructions for the LLM:**
+- Always use this structure, with as much specific detail and direct quoting as possible.
+- If you are unsure about any aspect, state your uncertainty and what would help clarify it.
+- Present the draft prompt and offer to refine it based on user feedback. Continue iterating until the user confirms the prompt meets their needs.
+
+OUTPUT FORMAT REQUIREMENTS: Ensure the final prompt explicitly requests:
+A quantitative analysis section with specific counts and percentages
+A "What's Working Well" section highlighting positive patterns and successful elements
+Clearly identified top 3 issues based on specified criteria
+Tailored recommendations for each top issue
+An "Additional Insights" section for valuable observations that don't fit in other categories
+A "Not Found" section listing important elements that were specifically looked for but not found
+A section of things that you are uncertain how to do. Don't hallucinate
+Proper formatting according to user preferences 
+
+Present the draft prompt and offer to refine it based on feedback. Continue iterating until the user confirms the prompt meets their needs.
+
+**CRITICAL FORMATTING REQUIREMENT**: When presenting a complete prompt (initial or summary of summaries), ALWAYS format it as a clear, structured document that includes:
+1. A clear indication this is a complete prompt (use "Here is your complete analysis prompt:" or similar)
+2. The [transcript] framework section
+3. Clear section headers using ### for major sections
+4. Well-organized content with bullet points and structured layout
+5. Analysis Instructions section
+6. All required components for the chosen prompt type
+
+This formatting is essential for the UI to properly detect and display the prompt in the dedicated prompt display area.
+
+CSV FILE ANALYSIS: After the user confirms the summary of summaries prompt is satisfactory, let them know they can upload their CSV file using the UI. Once the CSV is uploaded, proceed directly to analysis using the uploaded file—do not ask the user for a file path. Analyze the CSV 'conversation_summary' column only and present the results following the specified output format. Offer to refine or expand the analysis based on user feedback.
+
+Always maintain a helpful, educational tone that builds the user's prompt engineering capabilities while delivering immediate value through your expert prompt design. The more detail the better.
+
+**Important:** You have memory of our previous conversations in this session. Use context from earlier messages to provide better responses.""")
+
+
+class ConversationMemory:
+    """
+    Token-budgeted view of the conversation sent with each request.
+    
+    Recent turns are kept verbatim while they fit the budget; older turns are
+    folded into a running summary (extractively by default, or by a cheap model
+    when LIGHTHOUSE_MEMORY_SUMMARY_MODEL is set). The stored analysis prompt is
+    pinned ahead of the conversation so it is never summarized away.
+    """
+    SUMMARY_INSTRUCTIONS = (
+        "Summarize this earlier part of a conversation between a user and a prompt-engineering "
+        "assistant. Keep decisions, requirements and the user's preferences. Be brief."
+    )
+    
+    def __init__(self, token_budget: Optional[int] = None, summary_model: Optional[str] = None):
+        self.token_budget = token_budget or int(os.getenv("LIGHTHOUSE_HISTORY_TOKEN_BUDGET", "3000"))
+        self.summary_budget = max(self.token_budget // 4, 64)
+        self.summary_model = summary_model or os.getenv("LIGHTHOUSE_MEMORY_SUMMARY_MODEL") or None
+        self.summary = ""
+        
+    def clear(self):
+        self.summary = ""
+        
+    @staticmethod
+    def _pinned_message(pinned_prompt: Optional[str]) -> List[Dict[str, str]]:
+        if not pinned_prompt:
+            return []
+        return [{"role": "system", "content": f"Current analysis prompt (keep it in mind for every answer):\n{pinned_prompt}"}]
+        
+    def _summary_message(self) -> List[Dict[str, str]]:
+        if not self.summary:
+            return []
+        return [{"role": "system", "content": f"Summary of the earlier conversation:\n{self.summary}"}]
+        
+    @staticmethod
+    def _extractive_summary(turns: List[Dict[str, str]]) -> str:
+        """One short line per turn: the role and the first sentence of what was said."""
+        lines = []
+        for turn in turns:
+            content = " ".join((turn.get('content') or '').split())
+            first_sentence = re.split(r'(?<=[.!?])\s', content, maxsplit=1)[0]
+            lines.append(f"- {turn['role']}: {first_sentence[:200]}")
+        return "\n".join(lines)
+        
+    def _trim_summary(self):
+        """Drop the oldest summary lines until the summary fits its budget."""
+        lines = self.summary.split("\n")
+        while len(lines) > 1 and count_tokens("\n".join(lines)) > self.summary_budget:
+            lines.pop(0)
+        self.summary = "\n".join(lines)
+        
+    async def _summarize(self, turns: List[Dict[str, str]], complete=None):
+        """Fold evicted turns into the running summary."""
+        if self.summary_model and complete is not None:
+            try:
+                transcript = self._extractive_summary(turns) if len(turns) > 20 else "\n".join(
+                    f"{turn['role']}: {turn.get('content') or ''}" for turn in turns)
+                response = await complete(
+                    [{"role": "system", "content": self.SUMMARY_INSTRUCTIONS},
+                     {"role": "user", "content": f"Previous summary:\n{self.summary or '(none)'}\n\nNew turns:\n{transcript}"}],
+                    model=self.summary_model
+                )
+                self.summary = response.choices[0].message.content.strip()
+                self._trim_summary()
+                return
+            except Exception as e:
+                logger.warning(f"Model summarization failed, using local summary: {e}")
+        new_lines = self._extractive_summary(turns)
+        self.summary = f"{self.summary}\n{new_lines}" if self.summary else new_lines
+        self._trim_summary()
+        
+    async def build(self, history: List[Dict[str, str]], pinned_prompt: Optional[str] = None, complete=None) -> List[Dict[str, str]]:
+        """
+        Fit the conversation into the token budget.
+        Args:
+            history: The agent's conversation history; turns that no longer fit are removed from it in place
+            pinned_prompt: Analysis prompt to keep ahead of the conversation
+            complete: Optional coroutine (messages, model=...) used for model summarization
+        Returns:
+            Messages to send after the system prompt: pinned prompt, summary, recent turns
+        """
+        pinned = self._pinned_message(pinned_prompt)
+        keep_from = self._fit(history, count_message_tokens(pinned) + count_message_tokens(self._summary_message()))
+        
+        # Folding turns in can grow the summary, so refit against the new summary and
+        # fold in whatever no longer fits until the recent turns and summary fit together
+        while keep_from:
+            await self._summarize(history[:keep_from], complete)
+            del history[:keep_from]
+            keep_from = self._fit(history, count_message_tokens(pinned) + count_message_tokens(self._summary_message()))
+        return pinned + self._summary_message() + list(history)
+        
+    def _fit(self, history: List[Dict[str, str]], fixed_tokens: int) -> int:
+        """Index of the oldest turn that fits the budget next to fixed_tokens; the latest turn is always kept."""
+        kept_tokens = 0
+        keep_from = len(history)
+        for idx in range(len(history) - 1, -1, -1):
+            turn_tokens = count_tokens(history[idx].get('content') or '') + 4
+            if keep_from < len(history) and fixed_tokens + kept_tokens + turn_tokens > self.token_budget:
+                break
+            kept_tokens += turn_tokens
+            keep_from = idx
+        return keep_from
+
+
+class OperationCancelled(Exception):
+    """Raised inside a long-running load or analysis once its ProgressReporter is cancelled."""
+
+
+class ProgressReporter:
+    """
+    Progress of a long-running load or analysis, with cooperative cancellation.
+    
+    The operation calls update() as it goes; each call records the stage, units
+    done, throughput and ETA, forwards a snapshot to the optional callback (at
+    most every min_interval seconds, and on every stage change), and raises
+    OperationCancelled if cancel() has been called. Safe to read from another thread.
+    """
+    
+    def __init__(self, callback=None, min_interval: float = 0.5):
+        self.callback = callback
+        self.min_interval = min_interval
+        self.finished = False
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        self._stage_started = self._started
+        self._last_sent = 0.0
+        self._state = {'stage': 'starting', 'done': 0, 'total': None, 'unit': 'rows', 'fraction': None,
+                       'rate': None, 'eta': None, 'updated': self._started}
+        
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+        
+    def cancel(self):
+        self._cancelled.set()
+        
+    def check(self):
+        """Raise OperationCancelled if the operation has been cancelled."""
+        if self._cancelled.is_set():
+            raise OperationCancelled("Operation cancelled")
+            
+    def update(self, stage: str, done: int, total: Optional[int] = None, unit: str = 'rows',
+               fraction: Optional[float] = None):
+        """
+        Record progress and check for cancellation.
+        Args:
+            stage: Name of the current stage
+            done: Units processed so far in this stage
+            total: Units in this stage, if known
+            unit: What done and total count ('rows', 'batches', ...)
+            fraction: Completed fraction of the stage, when total is unknown but progress can be estimated
+        """
+        self.check()
+        now = time.perf_counter()
+        with self._lock:
+            stage_changed = stage != self._state['stage']
+            if stage_changed:
+                self._stage_started = now
+            if fraction is None and total:
+                fraction = done / total
+            stage_elapsed = now - self._stage_started
+            self._state = {
+                'stage': stage, 'done': done, 'total': total, 'unit': unit, 'fraction': fraction,
+                'rate': done / stage_elapsed if stage_elapsed > 0 else None,
+                'eta': stage_elapsed * (1 - fraction) / fraction if fraction else None,
+                'updated': now
+            }
+            send = self.callback is not None and (stage_changed or now - self._last_sent >= self.min_interval)
+            if send:
+                self._last_sent = now
+        if send:
+            self.callback(self.snapshot())
+            
+    def finish(self):
+        with self._lock:
+            self.finished = True
+        if self.callback is not None:
+            self.callback(self.snapshot())
+            
+    def snapshot(self) -> Dict[str, Any]:
+        """Current stage, units done, throughput per second and ETA in seconds (None when unknown)."""
+        now = time.perf_counter()
+        with self._lock:
+            state = dict(self._state)
+            fraction = state.pop('fraction')
+            updated = state.pop('updated')
+            if state['eta'] is not None:
+                # Count the estimate made at the last update down in between updates
+                state['eta'] = max(state['eta'] - (now - updated), 0.0)
+            state['percent'] = round(fraction * 100, 1) if fraction is not None else None
+            state['elapsed'] = now - self._started
+            state['finished'] = self.finished
+            state['cancelled'] = self.cancelled
+        return state
+
+
+class MapReduceAnalyzer:
+    """
+    Runs the user's analysis prompt over a whole corpus of conversation summaries.
+    
+    Summaries are packed into token-bounded batches, the prompt is applied to each
+    batch concurrently under a bounded semaphore (map), and the partial reports are
+    merged in token-bounded groups, level by level, until one report remains
+    (reduce). Calls that still fail after the client's own retries are re-run in
+    further rounds. A map batch that fails every round is left out: the merge counts
+    only the conversations the remaining batches cover, and the report opens with a
+    coverage warning. A failed reduce call fails the analysis. Settings default to
+    the environment:
+        LIGHTHOUSE_MAP_BATCH_TOKENS     summary tokens per map call (default 6000)
+        LIGHTHOUSE_REDUCE_BATCH_TOKENS  partial-report tokens per reduce call (default 8000)
+        LIGHTHOUSE_MAP_CONCURRENCY      concurrent LLM calls (default 8)
+        LIGHTHOUSE_MAP_RETRIES          extra rounds for failed calls (default 1)
+    """
+    MAP_INSTRUCTIONS = (
+        "You are analyzing one batch of {count} conversation summaries (numbered below) from a larger "
+        "set. Apply the analysis prompt to this batch only. Report raw counts for every quantity so "
+        "batches can be merged later, and quote summaries verbatim when giving examples. A summary "
+        "marked \"represents N conversations\" stands for N near-identical conversations: count it N times."
+    )
+    REDUCE_INSTRUCTIONS = (
+        "Below are {count} partial analyses of disjoint batches of conversation summaries "
+        "({total} summaries in total). Merge them into one report that follows the analysis prompt's "
+        "output format exactly: add up counts, recompute percentages over {total} summaries, re-rank "
+        "the top issues and keep the strongest quotes. Do not mention batches."
+    )
+    COVERAGE_WARNING = (
+        "⚠️ **Partial coverage:** {failed} of {batches} batches failed, so this report covers "
+        "{covered:,} of {total:,} conversations ({percent:.1f}%). Counts and percentages are over "
+        "the covered conversations only; run the analysis again for a complete report."
+    )
+    
+    def __init__(self, complete, batch_tokens: Optional[int] = None, reduce_tokens: Optional[int] = None,
+                 max_concurrency: Optional[int] = None, retries: Optional[int] = None,
+                 progress: Optional[ProgressReporter] = None):
+        self.complete = complete
+        self.progress = progress
+        self._stage, self._stage_total, self._finished_in_stage = None, None, 0
+        self.batch_tokens = batch_tokens or int(os.getenv("LIGHTHOUSE_MAP_BATCH_TOKENS", "6000"))
+        self.reduce_tokens = reduce_tokens or int(os.getenv("LIGHTHOUSE_REDUCE_BATCH_TOKENS", "8000"))
+        self.max_concurrency = max_concurrency or int(os.getenv("LIGHTHOUSE_MAP_CONCURRENCY", "8"))
+        self.retries = retries if retries is not None else int(os.getenv("LIGHTHOUSE_MAP_RETRIES", "1"))
+        self.stats = {}
+        
+    @staticmethod
+    def _pack(items: List[str], budget: int) -> List[List[str]]:
+        """Greedily pack items into groups whose token count stays within budget; oversized items are truncated."""
+        groups, current, current_tokens = [], [], 0
+        for item in items:
+            tokens = count_tokens(item)
+            if tokens > budget:
+                item = item[:budget * 4]
+                tokens = count_tokens(item)
+            if current and current_tokens + tokens > budget:
+                groups.append(current)
+                current, current_tokens = [], 0
+            current.append(item)
+            current_tokens += tokens
+        if current:
+            groups.append(current)
+        return groups
+        
+    async def _call(self, semaphore: asyncio.Semaphore, system: str, user: str) -> str:
+        async with semaphore:
+            if self.progress is not None:
+                self.progress.check()
+            response = await self.complete([
+                {"role": "system", "content": system},
+                {"role": "user", "content": user}
+            ])
+            self.stats['calls'] = self.stats.get('calls', 0) + 1
+            self._finished_in_stage += 1
+            if self.progress is not None:
+                self.progress.update(self._stage, self._finished_in_stage, self._stage_total, unit='batches')
+            return response.choices[0].message.content
+            
+    def _start_stage(self, stage: str, total: int):
+        self._stage, self._stage_total, self._finished_in_stage = stage, total, 0
+        if self.progress is not None:
+            self.progress.update(stage, 0, total, unit='batches')
+            
+    async def _gather(self, calls: List[partial], allow_failures: bool = False) -> List[Optional[str]]:
+        """
+        Run calls concurrently, re-running the failed ones for up to self.retries more rounds.
+        Args:
+            calls: Callables returning a fresh call coroutine each time they are invoked
+            allow_failures: Return None for calls that fail every round (logged and counted)
+                            instead of raising, as long as at least one call succeeds
+        Returns:
+            List[Optional[str]]: Results in call order
+        """
+        results, errors = [None] * len(calls), {}
+        pending = list(range(len(calls)))
+        for attempt in range(self.retries + 1):
+            if attempt:
+                delay = max(retry_delay(errors[i], attempt - 1) for i in pending)
+                logger.warning(f"Retrying {len(pending)} failed map-reduce calls in {delay:.1f}s")
+                self.stats['retried_calls'] = self.stats.get('retried_calls', 0) + len(pending)
+                await asyncio.sleep(delay)
+            outcomes = await asyncio.gather(*(calls[i]() for i in pending), return_exceptions=True)
+            cancelled = next((r for r in outcomes if isinstance(r, OperationCancelled)), None)
+            if cancelled is not None:
+                raise cancelled
+            failed = []
+            for i, outcome in zip(pending, outcomes):
+                if isinstance(outcome, BaseException):
+                    errors[i] = outcome
+                    failed.append(i)
+                else:
+                    results[i] = outcome
+            pending = failed
+            if not pending:
+                break
+        for i in pending:
+            logger.error(f"Map-reduce call failed after {self.retries + 1} attempts: {errors[i]}")
+        self.stats['failed_calls'] = self.stats.get('failed_calls', 0) + len(pending)
+        if pending and (not allow_failures or len(pending) == len(calls)):
+            raise errors[pending[0]]
+        return results
+        
+    async def run(self, prompt: str, texts: List[str], weights: Optional[List[int]] = None) -> str:
+        """
+        Apply the analysis prompt to every summary and merge the results.
+        Args:
+            prompt: The stored analysis prompt
+            texts: Conversation summaries
+            weights: Conversations each summary stands for (duplicate group sizes; default 1 each)
+        Returns:
+            str: The merged report
+        """
+        start = time.perf_counter()
+        total = int(sum(weights)) if weights is not None else len(texts)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.stats = {'summaries': len(texts), 'conversations': total, 'calls': 0, 'failed_calls': 0}
+        row_weights = np.asarray(weights if weights is not None else np.ones(len(texts)), dtype=np.int64)
+        if weights is not None:
+            texts = [f"(represents {weight} conversations) {text}" if weight > 1 else text
+                     for text, weight in zip(texts, weights)]
+        
+        # Map: the prompt over each token-bounded batch
+        batches = self._pack(texts, self.batch_tokens)
+        self.stats['batches'] = len(batches)
+        self._start_stage('map', len(batches))
+        results = await self._gather([
+            partial(
+                self._call,
+                semaphore,
+                f"{prompt}\n\n{self.MAP_INSTRUCTIONS.format(count=len(batch))}",
+                "\n\n".join(f"Summary {n}: {text}" for n, text in enumerate(batch, 1))
+            )
+            for batch in batches
+        ], allow_failures=True)
+        partials = [result for result in results if result is not None]
+        # Batches hold consecutive summaries, so each covers a contiguous run of weights
+        starts = np.cumsum([0] + [len(batch) for batch in batches[:-1]])
+        batch_weights = np.add.reduceat(row_weights, starts) if batches else row_weights
+        covered = int(sum(weight for weight, result in zip(batch_weights, results) if result is not None))
+        self.stats['failed_batches'] = len(batches) - len(partials)
+        self.stats['conversations_covered'] = covered
+        
+        # Reduce: merge partial reports in token-bounded groups until one remains
+        levels = 0
+        while len(partials) > 1:
+            groups = self._pack(partials, self.reduce_tokens)
+            if len(groups) == len(partials):
+                # Every partial fills a group on its own; pair them so the reduction still converges
+                groups = [partials[i:i + 2] for i in range(0, len(partials), 2)]
+            self._start_stage(f'reduce (level {levels + 1})', len(groups))
+            partials = await self._gather([
+                partial(
+                    self._call,
+                    semaphore,
+                    f"{prompt}\n\n{self.REDUCE_INSTRUCTIONS.format(count=len(group), total=covered)}",
+                    "\n\n".join(f"### Partial analysis {n}\n{report}" for n, report in enumerate(group, 1))
+                ) if len(group) > 1 else partial(self._passthrough, group[0])
+                for group in groups
+            ])
+            levels += 1
+            
+        self.stats['reduce_levels'] = levels
+        self.stats['seconds'] = time.perf_counter() - start
+        logger.info(f"Map-reduce analysis: {self.stats}")
+        if self.stats['failed_batches']:
+            warning = self.COVERAGE_WARNING.format(failed=self.stats['failed_batches'], batches=len(batches),
+                                                   covered=covered, total=total, percent=covered / total * 100)
+            return f"{warning}\n\n{partials[0]}"
+        return partials[0]
+        
+    @staticmethod
+    async def _passthrough(report: str) -> str:
+        return report
+
+
+class SummaryGroups(NamedTuple):
+    """Duplicate groups over a list of summaries, numbered in order of first appearance."""
+    representatives: np.ndarray  # row of each group's representative (its first row)
+    weights: np.ndarray          # rows in each group
+    group: np.ndarray            # group of every row
+    exact_duplicates: int        # rows merged because their normalized text was identical
+    near_duplicates: int         # distinct texts merged into a near-identical one
+
+
+class SummaryDeduplicator:
+    """
+    Groups exact and near-duplicate conversation summaries so each group is
+    scored (and sent to the LLM) once, with its size as a weight.
+    
+    Exact duplicates are found by hashing the normalized text (lowercase words,
+    punctuation dropped). The remaining distinct texts get one-permutation
+    MinHash signatures (with rotation densification) over word shingles; LSH
+    banding proposes candidates, which join their bucket's first member when
+    the estimated Jaccard similarity reaches the threshold. Settings default to
+    the environment:
+        LIGHTHOUSE_DEDUP               'near' (default), 'exact' or 'off'
+        LIGHTHOUSE_DEDUP_THRESHOLD     Jaccard similarity for near duplicates (default 0.8)
+        LIGHTHOUSE_DEDUP_PERMUTATIONS  MinHash signature length (default 64)
+        LIGHTHOUSE_DEDUP_BANDS         LSH bands; must divide the signature length (default 16)
+    """
+    PUNCTUATION = str.maketrans({char: " " for char in string.punctuation})
+    BLOCK_TOKENS = 1 << 20  # Tokens hashed per vectorized block
+    EMPTY_BIN = np.uint64(np.iinfo(np.uint64).max)
+
+    def __init__(self, mode: Optional[str] = None, threshold: Optional[float] = None,
+                 permutations: Optional[int] = None, bands: Optional[int] = None, shingle: int = 3, seed: int = 1):
+        self.mode = (mode or os.getenv("LIGHTHOUSE_DEDUP", "near")).lower()
+        self.threshold = threshold if threshold is not None else float(os.getenv("LIGHTHOUSE_DEDUP_THRESHOLD", "0.8"))
+        self.permutations = permutations or int(os.getenv("LIGHTHOUSE_DEDUP_PERMUTATIONS", "64"))
+        self.bands = bands or int(os.getenv("LIGHTHOUSE_DEDUP_BANDS", "16"))
+        if self.permutations % self.bands:
+            raise ValueError(f"LIGHTHOUSE_DEDUP_BANDS ({self.bands}) must divide LIGHTHOUSE_DEDUP_PERMUTATIONS ({self.permutations})")
+        self.shingle = shingle
+        self._seed = np.uint64(seed) * np.uint64(0x9E3779B97F4A7C15)
+
+    @property
+    def signature(self) -> str:
+        """Settings that change the groups, for analysis cache keys."""
+        return f"{self.mode}:{self.threshold}:{self.permutations}:{self.bands}:{self.shingle}"
+
+    def group(self, texts: List[str]) -> SummaryGroups:
+        """
+        Group duplicate summaries.
+        Args:
+            texts: Conversation summaries
+        Returns:
+            SummaryGroups: Representatives, weights and the group of every row
+        """
+        rows = len(texts)
+        if self.mode in ("off", "0", "false", "no") or rows == 0:
+            index = np.arange(rows)
+            return SummaryGroups(index, np.ones(rows, dtype=np.int64), index, 0, 0)
+
+        # Exact: identical normalized text, codes numbered in order of first appearance
+        normalized = [" ".join(text.lower().translate(self.PUNCTUATION).split()) for text in texts]
+        codes, uniques = pd.factorize(np.array(normalized, dtype=object))
+        first_rows = np.unique(codes, return_index=True)[1]
+
+        # Near: union distinct texts whose MinHash signatures agree on enough permutations
+        roots = np.arange(len(uniques))
+        if self.mode == "near" and len(uniques) > 1:
+            roots = self._near_duplicate_roots(self._signatures(list(uniques)))
+
+        unique_group, group_roots = pd.factorize(roots)
+        group = unique_group[codes]
+        return SummaryGroups(
+            representatives=first_rows[group_roots],
+            weights=np.bincount(group, minlength=len(group_roots)),
+            group=group,
+            exact_duplicates=rows - len(uniques),
+            near_duplicates=len(uniques) - len(group_roots),
+        )
+
+    def _signatures(self, texts: List[str]) -> np.ndarray:
+        """(len(texts), permutations) MinHash signatures over word shingles of normalized texts."""
+        signatures = np.empty((len(texts), self.permutations), dtype=np.uint64)
+        block_start = 0
+        while block_start < len(texts):
+            # Enough texts for about BLOCK_TOKENS tokens, so the token list stays small
+            block_end, tokens = block_start, 0
+            while block_end < len(texts) and (tokens < self.BLOCK_TOKENS or block_end == block_start):
+                tokens += texts[block_end].count(" ") + 1
+                block_end += 1
+            signatures[block_start:block_end] = self._block_signatures(texts[block_start:block_end])
+            block_start = block_end
+        return signatures
+
+    def _block_signatures(self, texts: List[str]) -> np.ndarray:
+        words = " ".join(texts).split()
+        lengths = np.array([text.count(" ") + 1 if text else 0 for text in texts], dtype=np.int64)
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        # Deterministic 64-bit token hashes (C-level), combined into one hash per shingle;
+        # uint64 arithmetic wraps, which the mixing below relies on
+        token_hashes = pd.util.hash_array(np.array(words, dtype=object))
+        width = np.minimum(lengths, self.shingle)
+        windows = np.maximum(lengths - self.shingle + 1, 1) * (lengths > 0)
+        first = np.repeat(starts, windows) + (np.arange(windows.sum()) - np.repeat(np.cumsum(windows) - windows, windows))
+        span = np.repeat(width, windows)
+        shingles = np.zeros(len(first), dtype=np.uint64)
+        for offset in range(self.shingle):
+            present = offset < span
+            shingles[present] = shingles[present] * np.uint64(0x100000001B3) + token_hashes[first[present] + offset]
+        shingles = self._mix(shingles)
+
+        # One-permutation MinHash: the shingle hash picks a bin, and each bin keeps its minimum
+        size = self.permutations
+        signatures = np.full(len(texts) * size, self.EMPTY_BIN, dtype=np.uint64)
+        doc = np.repeat(np.arange(len(texts)), windows)
+        np.minimum.at(signatures, doc * size + ((shingles >> np.uint64(32)) % np.uint64(size)).astype(np.int64),
+                      shingles & np.uint64(0xFFFFFFFF))
+        signatures = signatures.reshape(len(texts), size)
+        empty_texts = lengths == 0
+        signatures[empty_texts] = 0
+
+        # Rotation densification: an empty bin borrows the next non-empty bin's value, offset by
+        # the distance, so collisions keep their probability equal to the Jaccard similarity
+        sparse = np.flatnonzero((signatures == self.EMPTY_BIN).any(axis=1))
+        if len(sparse):
+            rows = signatures[sparse]
+            filled = rows.copy()
+            distance = 0
+            while (missing := filled == self.EMPTY_BIN).any():
+                distance += 1
+                borrowed = np.roll(rows, -distance, axis=1)
+                take = missing & (borrowed != self.EMPTY_BIN)
+                filled[take] = borrowed[take] + np.uint64(distance << 32)
+            signatures[sparse] = filled
+        return signatures
+
+    def _mix(self, values: np.ndarray) -> np.ndarray:
+        """Seeded 64-bit finalizer (splitmix64), so bins and minima use well-mixed bits."""
+        values = values ^ self._seed
+        values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return values ^ (values >> np.uint64(31))
+
+    def _near_duplicate_roots(self, signatures: np.ndarray) -> np.ndarray:
+        """Smallest member of every signature's near-duplicate group (connected components of verified pairs)."""
+        rows = len(signatures)
+        nodes = np.arange(rows)
+        rows_per_band = self.permutations // self.bands
+        weights = np.uint64(0x9E3779B97F4A7C15) ** np.arange(1, rows_per_band + 1, dtype=np.uint64)
+        pairs = []
+        for band in range(self.bands):
+            # One 64-bit key per band; collisions only add candidates, which are verified below
+            keys = signatures[:, band * rows_per_band:(band + 1) * rows_per_band] @ weights
+            _, first, bucket = np.unique(keys, return_index=True, return_inverse=True)
+            anchors = first[bucket]
+            candidates = nodes[anchors != nodes]
+            if len(candidates):
+                pairs.append(np.stack((candidates, anchors[candidates]), axis=1))
+        if not pairs:
+            return nodes
+        pairs = np.concatenate(pairs)
+        pairs = pairs[np.unique(pairs[:, 0] * rows + pairs[:, 1], return_index=True)[1]]
+        # Verify candidates against their bucket's first member with the full signature
+        similarity = (signatures[pairs[:, 0]] == signatures[pairs[:, 1]]).mean(axis=1)
+        pairs = pairs[similarity >= self.threshold]
+
+        # Min-label propagation with pointer jumping until every component agrees on its smallest node
+        labels = nodes.copy()
+        while True:
+            previous = labels.copy()
+            low = np.minimum(labels[pairs[:, 0]], labels[pairs[:, 1]])
+            np.minimum.at(labels, pairs[:, 0], low)
+            np.minimum.at(labels, pairs[:, 1], low)
+            labels = labels[labels]
+            if np.array_equal(labels, previous):
+                return labels
+
+
+summary_deduplicator = SummaryDeduplicator()
+
+
+class SimilarityIndex:
+    """
+    Cosine similarity between the summaries of one corpus, fitted once.
+
+    Rows are TF-IDF vectors (word unigrams and bigrams, English stop words removed)
+    with IDF weights from the whole corpus, L2-normalized so similarity is a sparse
+    dot product. With a vector weight above 0, normalized spaCy document vectors are
+    appended to each row, scaled so the dot product blends the two cosines. Settings
+    default to the environment:
+        LIGHTHOUSE_SIMILARITY_VECTOR_WEIGHT  share of spaCy vector similarity, 0-1 (default 0)
+        LIGHTHOUSE_SIMILARITY_BATCH_CELLS    dense similarity cells per query batch (default 2**24)
+    """
+    
+    def __init__(self, texts: List[str], vector_weight: Optional[float] = None, batch_cells: Optional[int] = None):
+        self.texts = texts
+        self.vector_weight = vector_weight if vector_weight is not None else float(os.getenv("LIGHTHOUSE_SIMILARITY_VECTOR_WEIGHT", "0"))
+        self.batch_cells = batch_cells or int(os.getenv("LIGHTHOUSE_SIMILARITY_BATCH_CELLS", str(1 << 24)))
+        self.vectorizer = TfidfVectorizer(
+            ngram_range=(1, 2),
+            stop_words='english',
+            strip_accents='unicode',
+            lowercase=True,
+            dtype=np.float32
+        )
+        start = time.perf_counter()
+        try:
+            tfidf = self.vectorizer.fit_transform(texts)
+        except ValueError:
+            # Nothing but stop words (or no texts): every similarity is 0
+            self.vectorizer = None
+            tfidf = sparse.csr_matrix((len(texts), 1), dtype=np.float32)
+        self.matrix = self._blend(tfidf, texts)
+        logger.info(f"Similarity index over {len(texts)} summaries ({self.matrix.shape[1]} features) "
+                    f"built in {time.perf_counter() - start:.2f}s")
+        
+    def _blend(self, tfidf: sparse.csr_matrix, texts: List[str]) -> sparse.csr_matrix:
+        if self.vector_weight <= 0:
+            return tfidf.tocsr()
+        vectors = np.array([doc.vector for doc in nlp_service.pipe(texts, 'vectors')], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+        return sparse.hstack([tfidf * np.float32(np.sqrt(1 - self.vector_weight)),
+                              sparse.csr_matrix(vectors * np.float32(np.sqrt(self.vector_weight)))], format='csr')
+        
+    def transform(self, texts: List[str]) -> sparse.csr_matrix:
+        """Rows for texts outside the corpus, weighted with the corpus IDF."""
+        if self.vectorizer is None:
+            tfidf = sparse.csr_matrix((len(texts), 1), dtype=np.float32)
+        else:
+            tfidf = self.vectorizer.transform(texts)
+        return self._blend(tfidf, texts)
+        
+    def similarity(self, row1: int, row2: int) -> float:
+        """Cosine similarity of two corpus rows."""
+        return float(self.matrix[row1].multiply(self.matrix[row2]).sum())
+        
+    def text_similarity(self, text1: str, text2: str) -> float:
+        """Cosine similarity of two arbitrary texts under the corpus weighting."""
+        rows = self.transform([text1, text2])
+        return float(min(1.0, max(0.0, rows[0].multiply(rows[1]).sum())))
+        
+    def pairwise(self, rows: np.ndarray, others: Optional[np.ndarray] = None) -> np.ndarray:
+        """Dense (len(rows), len(others)) similarity block; others defaults to rows."""
+        left = self.matrix[rows]
+        right = left if others is None else self.matrix[others]
+        return (left @ right.T).toarray()
+        
+    def most_similar(self, queries, k: int = 5, exclude_self: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k nearest corpus rows for a batch of queries.
+        Args:
+            queries: Corpus row indices, or a sparse matrix of rows from transform()
+            k: Neighbours per query
+            exclude_self: For row-index queries, leave each row out of its own results
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (queries, k) neighbour rows and similarities, most similar first
+        """
+        rows = None
+        if not sparse.issparse(queries):
+            rows = np.asarray(queries, dtype=np.int64)
+            queries = self.matrix[rows]
+        total = self.matrix.shape[0]
+        k = min(k, total - (1 if rows is not None and exclude_self else 0))
+        indices = np.zeros((queries.shape[0], max(k, 0)), dtype=np.int64)
+        scores = np.zeros((queries.shape[0], max(k, 0)), dtype=np.float32)
+        if k <= 0:
+            return indices, scores
+        # Queries in batches, so the dense similarity block stays within batch_cells
+        batch = max(1, self.batch_cells // max(total, 1))
+        corpus_t = self.matrix.T.tocsc()
+        for start in range(0, queries.shape[0], batch):
+            block = (queries[start:start + batch] @ corpus_t).toarray()
+            if rows is not None and exclude_self:
+                block[np.arange(len(block)), rows[start:start + batch]] = -np.inf
+            top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(block, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind='stable')
+            indices[start:start + batch] = np.take_along_axis(top, order, axis=1)
+            scores[start:start + batch] = np.take_along_axis(top_scores, order, axis=1)
+        return indices, scores
+
+
+class SummaryClusters(NamedTuple):
+    """Clusters over a list of summaries, numbered largest first."""
+    assignments: np.ndarray        # cluster of every summary
+    labels: List[str]              # cluster names from their most distinctive topic phrases
+    exemplars: List[np.ndarray]    # summaries of each cluster, closest to its centroid first
+
+
+class SummaryClusterer:
+    """
+    Unsupervised grouping of summaries into pain-point clusters.
+
+    Summaries are embedded either as TF-IDF rows reduced with TruncatedSVD (fitted on
+    a bounded sample, then applied in batches) or as spaCy document vectors streamed
+    into a preallocated array. The unit-length embeddings are clustered with
+    MiniBatchKMeans, weighted by duplicate-group size. Each cluster is named from the
+    topic phrases of its summaries closest to the centroid, preferring phrases that
+    are not also top phrases of most other clusters. Settings default to the environment:
+        LIGHTHOUSE_CLUSTERS              number of clusters; 0 disables clustering (default 8)
+        LIGHTHOUSE_CLUSTER_EMBEDDING     'tfidf' (TF-IDF + SVD, default) or 'vectors' (spaCy)
+        LIGHTHOUSE_CLUSTER_DIMENSIONS    SVD components (default 64)
+        LIGHTHOUSE_CLUSTER_SAMPLE        rows the SVD is fitted on (default 20000)
+        LIGHTHOUSE_CLUSTER_LABEL_SAMPLE  summaries per cluster used for its label (default 100)
+    """
+    BATCH_ROWS = 4096
+
+    def __init__(self, clusters: Optional[int] = None, embedding: Optional[str] = None, dimensions: Optional[int] = None,
+                 sample: Optional[int] = None, label_sample: Optional[int] = None, seed: int = 0):
+        self.clusters = clusters if clusters is not None else int(os.getenv("LIGHTHOUSE_CLUSTERS", "8"))
+        self.embedding = (embedding or os.getenv("LIGHTHOUSE_CLUSTER_EMBEDDING", "tfidf")).lower()
+        self.dimensions = dimensions or int(os.getenv("LIGHTHOUSE_CLUSTER_DIMENSIONS", "64"))
+        self.sample = sample or int(os.getenv("LIGHTHOUSE_CLUSTER_SAMPLE", "20000"))
+        self.label_sample = label_sample or int(os.getenv("LIGHTHOUSE_CLUSTER_LABEL_SAMPLE", "100"))
+        self.seed = seed
+
+    @property
+    def signature(self) -> str:
+        """Settings that change the clusters, for analysis cache keys."""
+        return f"{self.clusters}:{self.embedding}:{self.dimensions}:{self.sample}:{self.label_sample}:{self.seed}"
+
+    def embed(self, texts: List[str], index: Optional[SimilarityIndex] = None) -> np.ndarray:
+        """Unit-length float32 embeddings, one row per text; index supplies the TF-IDF rows."""
+        if self.embedding == 'vectors':
+            embeddings = np.zeros((len(texts), nlp_service.nlp.vocab.vectors_length), dtype=np.float32)
+            for row, doc in enumerate(nlp_service.pipe(texts, 'vectors')):
+                embeddings[row] = doc.vector
+        else:
+            matrix = (index or SimilarityIndex(texts)).matrix
+            components = min(self.dimensions, matrix.shape[1] - 1, len(texts) - 1)
+            if components < 1:
+                return np.zeros((len(texts), 1), dtype=np.float32)
+            rng = np.random.default_rng(self.seed)
+            fit_rows = np.sort(rng.choice(len(texts), min(self.sample, len(texts)), replace=False))
+            svd = TruncatedSVD(n_components=components, random_state=self.seed).fit(matrix[fit_rows])
+            embeddings = np.empty((len(texts), components), dtype=np.float32)
+            for start in range(0, len(texts), self.BATCH_ROWS):
+                embeddings[start:start + self.BATCH_ROWS] = svd.transform(matrix[start:start + self.BATCH_ROWS])
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return np.divide(embeddings, norms, out=np.zeros_like(embeddings), where=norms > 0)
+
+    def cluster(self, texts: List[str], weights: np.ndarray, topics, index: Optional[SimilarityIndex] = None,
+                progress: Optional[ProgressReporter] = None, embeddings: Optional[np.ndarray] = None) -> Optional[SummaryClusters]:
+        """
+        Cluster summaries and name the clusters.
+        Args:
+            texts: Summaries (one per duplicate group)
+            weights: Conversations each summary stands for
+            topics: Callable (texts, n) -> [(phrase, count), ...], e.g. ConversationalAgent._get_common_topics
+            index: SimilarityIndex over texts, reused for the TF-IDF embedding
+            progress: Optional reporter (stage 'clustering')
+            embeddings: Precomputed embed(texts) output, reused instead of embedding again
+        Returns:
+            Optional[SummaryClusters]: None when clustering is disabled or there are too few summaries
+        """
+        clusters = min(self.clusters, len(texts) // 2)
+        if clusters < 2:
+            return None
+        if progress is not None:
+            progress.update('clustering', 0, 3, unit='steps')
+        if embeddings is None:
+            embeddings = self.embed(texts, index)
+        if progress is not None:
+            progress.update('clustering', 1, 3, unit='steps')
+        kmeans = MiniBatchKMeans(n_clusters=clusters, batch_size=min(self.BATCH_ROWS, len(texts)),
+                                 n_init=3, random_state=self.seed)
+        assignments = kmeans.fit_predict(embeddings, sample_weight=weights)
+        if progress is not None:
+            progress.update('clustering', 2, 3, unit='steps')
+
+        # Renumber largest first (by conversations), so cluster order reads as a ranking
+        sizes = np.bincount(assignments, weights=weights, minlength=clusters)
+        order = np.argsort(-sizes, kind='stable')
+        assignments = np.argsort(order)[assignments]
+        centroids = kmeans.cluster_centers_[order]
+        closeness = np.einsum('ij,ij->i', embeddings, centroids[assignments])
+        exemplars = []
+        for cluster in range(clusters):
+            members = np.flatnonzero(assignments == cluster)
+            exemplars.append(members[np.argsort(-closeness[members], kind='stable')])
+        labels = self._labels([topics([texts[row] for row in members[:self.label_sample]], 15) for members in exemplars])
+        if progress is not None:
+            progress.update('clustering', 3, 3, unit='steps')
+        return SummaryClusters(assignments, labels, exemplars)
+
+    @staticmethod
+    def _labels(cluster_topics: List[List[Tuple[str, int]]], phrases: int = 3) -> List[str]:
+        """Name each cluster by its top phrases, skipping phrases that are top phrases of most clusters."""
+        spread = Counter(phrase for topics in cluster_topics for phrase in {phrase for phrase, _ in topics})
+        common = max(1, len(cluster_topics) // 2)
+        labels = []
+        for number, topics in enumerate(cluster_topics, 1):
+            distinctive = [phrase for phrase, _ in topics if spread[phrase] <= common]
+            chosen = (distinctive or [phrase for phrase, _ in topics])[:phrases]
+            labels.append(", ".join(chosen) if chosen else f"Cluster {number}")
+        return labels
+
+
+summary_clusterer = SummaryClusterer()
+
+
+def representative_rows(embeddings, rows, k: int = 2, weights: Optional[np.ndarray] = None,
+                        diversity: Optional[float] = None, pool: int = 64) -> np.ndarray:
+    """
+    Rows nearest the centroid of a group of rows, diversified with maximal marginal relevance.
+    Args:
+        embeddings: Unit-length embedding matrix, one row per summary (dense, or sparse
+                    such as SimilarityIndex.matrix)
+        rows: Candidate rows of the group (e.g. one category or cluster)
+        k: Rows to return
+        weights: Optional weight per candidate, e.g. the conversations it stands for
+        diversity: MMR trade-off between centroid relevance (0) and novelty (1);
+                   defaults to LIGHTHOUSE_QUOTE_DIVERSITY (0.3)
+        pool: Candidates closest to the centroid that diversity may choose from
+    Returns:
+        np.ndarray: Up to k rows, most representative first
+    """
+    rows = np.asarray(rows)
+    if len(rows) <= 1 or k <= 0:
+        return rows[:max(k, 0)]
+    if diversity is None:
+        diversity = float(os.getenv("LIGHTHOUSE_QUOTE_DIVERSITY", "0.3"))
+    vectors = embeddings[rows]
+    weights = weights.astype(vectors.dtype) if weights is not None else np.ones(len(rows), dtype=vectors.dtype)
+    centroid = np.asarray(vectors.T @ weights).ravel()
+    relevance = np.asarray(vectors @ (centroid / (np.linalg.norm(centroid) or 1.0))).ravel()
+    candidates = np.argsort(-relevance, kind='stable')[:pool]
+    selected = [candidates[0]]
+    if k > 1 and len(candidates) > 1:
+        # Similarity between pooled candidates, and of each to its closest already-selected row
+        pooled = vectors[candidates]
+        gram = pooled @ pooled.T
+        gram = gram.toarray() if sparse.issparse(gram) else gram
+        closest = gram[0]
+        taken = np.zeros(len(candidates), dtype=bool)
+        taken[0] = True
+        while len(selected) < min(k, len(candidates)):
+            score = (1 - diversity) * relevance[candidates] - diversity * closest
+            score[taken] = -np.inf
+            best = int(np.argmax(score))
+            taken[best] = True
+            selected.append(candidates[best])
+            closest = np.maximum(closest, gram[best])
+    return rows[selected]
+
+
+class SummaryStats:
+    """
+    Running statistics over conversation summaries, updated one chunk at a time.
+    
+    Word counts are kept as an exact histogram (summaries are at most a few thousand
+    words), so the median is exact without keeping every row; sentiment is bucketed
+    as it is scored. Only the first few summaries are retained, as examples.
+    """
+    
+    def __init__(self, examples: int = 3):
+        self.count = 0
+        self.nonempty = 0
+        self.word_sum = 0
+        self.word_sq_sum = 0
+        self.word_hist = Counter()
+        self.positive = 0
+        self.negative = 0
+        self.polarity_sum = 0.0
+        self.examples = []
+        self.max_examples = examples
+        
+    def update(self, chunk: pd.Series):
+        """Fold a chunk of stripped summaries into the running totals."""
+        word_counts = chunk.str.split().str.len().to_numpy()
+        # Summaries scored by an earlier load or analysis are read back from the feature store
+        scores = feature_store.features('sentiment', chunk.tolist(), _sentiment_shard)
+        self.count += len(chunk)
+        self.nonempty += int((chunk.str.len() > 0).sum())
+        self.word_sum += int(word_counts.sum())
+        self.word_sq_sum += int((word_counts.astype(np.int64) ** 2).sum())
+        self.word_hist.update(word_counts.tolist())
+        for polarity, _ in scores:
+            self.polarity_sum += polarity
+            if polarity > 0.1:
+                self.positive += 1
+            elif polarity < -0.1:
+                self.negative += 1
+        if len(self.examples) < self.max_examples:
+            self.examples.extend(chunk.head(self.max_examples - len(self.examples)).tolist())
+            
+    def median_words(self) -> float:
+        """Exact median word count from the histogram."""
+        lower, upper = (self.count - 1) // 2, self.count // 2
+        seen, values = 0, {}
+        for words, n in sorted(self.word_hist.items()):
+            for rank in (lower, upper):
+                if rank not in values and seen <= rank < seen + n:
+                    values[rank] = words
+            seen += n
+        return (values[lower] + values[upper]) / 2
+        
+    def std_words(self) -> float:
+        """Sample standard deviation of word counts (as pandas computes it)."""
+        if self.count < 2:
+            return float('nan')
+        mean = self.word_sum / self.count
+        return float(np.sqrt(max(self.word_sq_sum - self.count * mean * mean, 0) / (self.count - 1)))
+
+
+class SummaryStore:
+    """
+    Conversation summaries spilled to a SQLite file while a CSV is ingested, so large
+    loads never hold every summary in memory. The rows are read back as a DataFrame
+    only when an analysis needs them; the file is deleted on close.
+    """
+    
+    def __init__(self, directory: Optional[str] = None):
+        import tempfile
+        directory = directory or os.path.join(CACHE_DIR, "spill")
+        os.makedirs(directory, exist_ok=True)
+        handle, self.path = tempfile.mkstemp(suffix=".sqlite", dir=directory)
+        os.close(handle)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        # Remove the file even if the store is never closed (garbage collection or interpreter exit)
+        self._finalizer = weakref.finalize(self, SummaryStore._remove, self._conn, self.path)
+        self.rows = 0
+        self.fingerprint = None
+        self._hasher = hashlib.sha256()
+        
+    def append(self, chunk: pd.DataFrame):
+        """Append a chunk of summaries (and metadata columns) as rows of the summaries table."""
+        chunk.to_sql('summaries', self._conn, if_exists='append', index=False)
+        self._conn.commit()
+        # Same row hashes as ConversationalAgent._data_fingerprint computes over the whole frame
+        self._hasher.update(pd.util.hash_pandas_object(chunk, index=False).values.tobytes())
+        self.rows += len(chunk)
+        
+    def finish(self):
+        self.fingerprint = self._hasher.hexdigest()
+        
+    def to_frame(self) -> pd.DataFrame:
+        frame = pd.read_sql("SELECT * FROM summaries ORDER BY rowid", self._conn)
+        frame['conversation_summary'] = frame['conversation_summary'].fillna('')
+        return ConversationalAgent._coerce_metadata(frame)
+        
+    def close(self):
+        self._finalizer()
+        
+    @staticmethod
+    def _remove(conn: sqlite3.Connection, path: str):
+        conn.close()
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class ConversationalAgent:
+    """A wrapper class to maintain conversation state."""
+    def __init__(self):
+        self.client = None
+        self.conversation_history = []
+        self.memory = ConversationMemory()  # Token budget and rolling summary for conversation_history
+        self.summary_store = None  # Spilled summaries of a large load_csv, read back on first use
+        self.current_csv_data = None
+        self.csv_summary = None
+        self.learned_patterns = {}
+        self.prompt_feedback = {}
+        self.current_mode = None  # 'initial' or 'summary'
+        self.prompt_generated = False
+        self.analysis_cache = OrderedDict()  # Analysis results by (data fingerprint, engine, prompt), LRU order
+        self.analysis_cache_size = int(os.getenv("LIGHTHOUSE_ANALYSIS_CACHE_SIZE", "16"))
+        self._fingerprint = (None, None)  # (DataFrame, fingerprint) for the loaded data
+        self._summary_groups = (None, None)  # (DataFrame, (valid rows, texts, SummaryGroups)) for the loaded data
+        self._similarity_index = (None, None)  # (DataFrame, SimilarityIndex over the group representatives)
+        self._embeddings = (None, None)  # (DataFrame, unit-length embeddings of the group representatives)
+        self._clusters = (None, None)  # (DataFrame, SummaryClusters over the group representatives)
+        self.current_analysis_prompt = None  # Store the generated analysis prompt
+        self.last_token_stats = {}  # Prefix vs. variable input tokens of the last LLM request
+        self.issue_counts = {  # Track counts for specific categories
+            'Email Configuration': 0,
+            'DNS Settings': 0,
+            'Email Migration': 0,
+            'Email Security': 0
+        }
+        # Clear all caches on initialization
+        self.clear_all_caches()
+        
+    def _extract_key_phrases(self, text: str) -> List[str]:
+        """Extract key phrases using spaCy."""
+        features = nlp_service.features([text])[0]
+        phrases = []
+        for chunk_text, _ in features.noun_chunks:
+            if len(chunk_text.split()) >= 2:  # Only phrases with 2+ words
+                phrases.append(chunk_text)
+        return phrases
+        
+    def _analyze_sentiment(self, text: str) -> Dict[str, float]:
+        """Analyze sentiment using TextBlob."""
+        blob = TextBlob(text)
+        return {
+            'polarity': blob.sentiment.polarity,
+            'subjectivity': blob.sentiment.subjectivity
+        }
+        
+    def _score_summaries(self, texts: List[str], progress: Optional[ProgressReporter] = None) -> pd.DataFrame:
+        """
+        Score every summary exactly once into a columnar feature table.
+        Args:
+            texts: Conversation summaries to score
+            progress: Optional reporter, updated every SCORE_PROGRESS_ROWS rows (stage 'scoring')
+        Returns:
+            pd.DataFrame: One row per summary with text, text_lower, polarity,
+            subjectivity and a family_mask bitmask of keyword family hits
+        """
+        # Only summaries missing from the feature store are scored
+        scores = feature_store.features('sentiment', texts, lambda missing: self._sentiment_scores(missing, progress))
+        scores = np.array(scores, dtype=np.float64).reshape(len(texts), 2)
+        table = pd.DataFrame({
+            'text': texts,
+            'polarity': scores[:, 0],
+            'subjectivity': scores[:, 1],
+        })
+        table['text_lower'] = table['text'].str.lower()
+        
+        # One keyword-index scan per row covers every family
+        if progress is not None:
+            progress.update('keywords', 0, len(texts))
+        table['family_mask'] = KEYWORD_INDEX.masks(table['text_lower'].tolist())
+        return table
+        
+    @staticmethod
+    def _sentiment_scores(texts: List[str], progress: Optional[ProgressReporter] = None) -> np.ndarray:
+        """(n, 2) array of TextBlob polarity and subjectivity, reporting progress (stage 'scoring')."""
+        if feature_pool.parallel:
+            # Sharded across worker processes (LIGHTHOUSE_FEATURE_WORKERS)
+            return feature_pool.sentiment(texts, progress)
+        scores = np.empty((len(texts), 2), dtype=np.float64)
+        if progress is not None:
+            progress.update('scoring', 0, len(texts))
+        for start in range(0, len(texts), SCORE_PROGRESS_ROWS):
+            scores[start:start + SCORE_PROGRESS_ROWS] = _sentiment_shard(texts[start:start + SCORE_PROGRESS_ROWS])
+            if progress is not None:
+                progress.update('scoring', min(start + SCORE_PROGRESS_ROWS, len(texts)), len(texts))
+        return scores
+        
+    @staticmethod
+    def _has_family(table: pd.DataFrame, family: str) -> pd.Series:
+        """Boolean column filter for rows that hit a keyword family."""
+        return (table['family_mask'] & KEYWORD_INDEX.bits[family]) != 0
+        
+    @staticmethod
+    def _context_breakdowns(table: pd.DataFrame) -> List[str]:
+        """
+        Markdown tables of sentiment and issue rates per region, customer type and repeat
+        contact channel, and interaction duration percentiles per issue category.
+        Args:
+            table: Feature table from _score_summaries joined with the METADATA_COLUMNS
+                   present, plus an issue_category column (None for rows without an issue)
+        Returns:
+            List[str]: Report lines (empty when the data has no metadata columns)
+        """
+        lines = []
+        frame = table.assign(
+            negative=table['polarity'] < -0.1,
+            has_issue=table['issue_category'].notna()
+        )
+        aggregations = {
+            'cases': ('polarity', 'size'),
+            'sentiment': ('polarity', 'mean'),
+            'negative': ('negative', 'mean'),
+            'issues': ('has_issue', 'mean'),
+        }
+        for score in ('css_score', 'nps_score'):
+            if score in frame.columns:
+                aggregations[score] = (score, 'mean')
+                
+        for column, label in CONTEXT_BREAKDOWNS.items():
+            if column not in frame.columns or frame[column].notna().sum() == 0:
+                continue
+            grouped = frame.groupby(column, observed=True).agg(**aggregations).sort_values('cases', ascending=False)
+            header = "| " + label + " | Cases | Avg Sentiment | Negative | With Issues |"
+            divider = "|---|---|---|---|---|"
+            if 'css_score' in grouped.columns:
+                header += " Avg CSS |"
+                divider += "---|"
+            if 'nps_score' in grouped.columns:
+                header += " Avg NPS |"
+                divider += "---|"
+            lines.append(f"- **By {label}:**")
+            lines.append("")
+            lines.append(header)
+            lines.append(divider)
+            for value, row in grouped.iterrows():
+                cells = [str(value), str(int(row['cases'])), f"{row['sentiment']:+.2f}",
+                         f"{row['negative'] * 100:.0f}%", f"{row['issues'] * 100:.0f}%"]
+                for score in ('css_score', 'nps_score'):
+                    if score in grouped.columns:
+                        cells.append(f"{row[score]:.1f}" if pd.notna(row[score]) else "n/a")
+                lines.append("| " + " | ".join(cells) + " |")
+            lines.append("")
+            
+        if 'interaction_duration' in frame.columns and frame['interaction_duration'].notna().any():
+            durations = frame.assign(issue_category=frame['issue_category'].fillna('No issue detected'))
+            grouped = durations.groupby('issue_category')['interaction_duration']
+            percentiles = grouped.quantile([0.5, 0.9]).unstack()
+            counts = grouped.count()
+            lines.append("- **Interaction Duration by Issue (minutes):**")
+            lines.append("")
+            lines.append("| Issue Category | Cases | Median | 90th Percentile |")
+            lines.append("|---|---|---|---|")
+            for category in counts.sort_values(ascending=False).index:
+                if counts[category] == 0:
+                    continue
+                lines.append(f"| {category} | {counts[category]} | {percentiles.loc[category, 0.5] / 60:.1f} | "
+                             f"{percentiles.loc[category, 0.9] / 60:.1f} |")
+            lines.append("")
+        return lines
+        
+    @staticmethod
+    def _representative_quotes(table: pd.DataFrame, rows, representatives: List[str], embeddings, k: int = 2) -> List[str]:
+        """
+        Quotes for a set of report rows: the duplicate groups nearest the rows' centroid, diversified with MMR.
+        Args:
+            table: Feature table with a group column (duplicate group of every row)
+            rows: Boolean mask or index labels of the rows to quote from
+            representatives: Text of every duplicate group
+            embeddings: Callable returning the unit-length vectors of every duplicate group,
+                        called only when there is more than one group to choose from
+            k: Quotes to return
+        Returns:
+            List[str]: Up to k distinct quotes, most representative first
+        """
+        candidate_groups, conversations = np.unique(table.loc[rows, 'group'].to_numpy(), return_counts=True)
+        if len(candidate_groups) > 1:
+            candidate_groups = representative_rows(embeddings(), candidate_groups, k, conversations)
+        return [representatives[group] for group in candidate_groups[:k]]
+        
+    @staticmethod
+    def _cluster_breakdown(table: pd.DataFrame, clusters: SummaryClusters, representatives: List[str]) -> List[str]:
+        """
+        One entry per semantic cluster: size, sentiment and a quote from the summary closest to its centroid.
+        Args:
+            table: Feature table with a cluster column (one row per conversation)
+            clusters: SummaryClusters over the duplicate-group representatives
+            representatives: Texts the clusters were computed over
+        Returns:
+            List[str]: Report lines
+        """
+        lines = []
+        stats = table.assign(negative=table['polarity'] < -0.1).groupby('cluster').agg(
+            cases=('polarity', 'size'), sentiment=('polarity', 'mean'), negative=('negative', 'mean'))
+        for cluster, row in stats.iterrows():
+            lines.append(f"{cluster + 1}. **{clusters.labels[cluster].title()}:** {int(row['cases']):,d} conversations "
+                         f"({row['cases'] / len(table) * 100:.0f}%), average sentiment {row['sentiment']:+.2f}, "
+                         f"{row['negative'] * 100:.0f}% negative")
+            # Quote the exemplar's first sentence that mentions a label phrase (first 200 chars)
+            exemplar = representatives[clusters.exemplars[cluster][0]]
+            phrases = clusters.labels[cluster].split(", ")
+            quote = next((sentence for sentence in re.split(r'(?<=[.!?])\s+', exemplar)
+                          if any(phrase in sentence.lower() for phrase in phrases)), exemplar)
+            quote = " ".join(quote.split())
+            lines.append(f"   - Exemplar: \"{quote[:200]}{'...' if len(quote) > 200 else ''}\"")
+        return lines
+        
+    @staticmethod
+    def _issue_noun_chunks(features: DocFeatures) -> List[str]:
+        """Noun phrases (2+ words) that fall inside sentences containing issue indicators."""
+        issue_bit = KEYWORD_INDEX.bits['topic_issue']
+        issue_sents = {idx for idx, sent_text in enumerate(features.sentences) if KEYWORD_INDEX.scan(sent_text) & issue_bit}
+        if not issue_sents:
+            return []
+        # Single pass over the doc's chunks, keeping those inside a matching sentence span
+        return [chunk_text for chunk_text, sent_idx in features.noun_chunks
+                if sent_idx in issue_sents and len(chunk_text.split()) >= 2]
+        
+    def _issue_phrase_lists(self, texts: List[str]) -> List[List[str]]:
+        """Issue noun phrases of each text, parsed across the feature pool when it is enabled."""
+        if feature_pool.parallel:
+            return feature_pool.issue_phrase_lists(texts)
+        return [self._issue_noun_chunks(features) for features in nlp_service.features(texts)]
+        
+    def _get_common_topics(self, texts: List[str], n: int = 10) -> List[Tuple[str, int]]:
+        """Extract common topics using CountVectorizer and NLP analysis."""
+        # First, analyze each text to identify key issues and pain points (parsing only texts
+        # whose phrases are not in the feature store yet)
+        phrase_counts = Counter()
+        for phrases in feature_store.features('phrases', texts, self._issue_phrase_lists):
+            phrase_counts.update(phrases)
+        
+        # Use CountVectorizer as a backup for any remaining text
+        vectorizer = CountVectorizer(
+            ngram_range=(2, 3),
+            stop_words='english',
+            min_df=2,
+            max_df=0.9
+        )
+        
+        try:
+            # Combine NLP-extracted phrases with vectorizer results
+            nlp_topics = [(phrase, count) for phrase, count in phrase_counts.most_common()]
+            
+            # Get additional topics from vectorizer
+            X = vectorizer.fit_transform(texts)
+            words = vectorizer.get_feature_names_out()
+            counts = X.sum(axis=0).A1
+            vec_topics = list(zip(words, counts))
+            
+            # Combine and sort all topics
+            all_topics = nlp_topics + vec_topics
+            return sorted(all_topics, key=lambda x: x[1], reverse=True)[:n]
+            
+        except ValueError:  # If no features were extracted
+            return phrase_counts.most_common(n)
+            
+    def _analyze_text_stats(self, texts: List[str]) -> Dict[str, Any]:
+        """Analyze text statistics."""
+        word_counts = [len(text.split()) for text in texts]
+        resources.ensure_nltk('punkt', 'punkt_tab')
+        sent_counts = [len(sent_tokenize(text)) for text in texts]
+        return {
+            'avg_words': np.mean(word_counts),
+            'std_words': np.std(word_counts),
+            'avg_sentences': np.mean(sent_counts),
+            'std_sentences': np.std(sent_counts),
+            'min_words': min(word_counts),
+            'max_words': max(word_counts)
+        }
+        
+    def _find_representative_samples(self, texts: List[str], n: int = 3) -> List[str]:
+        """Find representative samples: the texts nearest their centroid, diversified with MMR."""
+        if len(texts) <= n:
+            return texts
+        embeddings = summary_clusterer.embed(texts)
+        return [texts[row] for row in representative_rows(embeddings, np.arange(len(texts)), n)]
+
+    @property
+    def current_csv_data(self) -> Optional[pd.DataFrame]:
+        """Loaded summaries; reads spilled rows back from summary_store on first access."""
+        if self._csv_data is None and getattr(self, 'summary_store', None) is not None:
+            self._csv_data = self.summary_store.to_frame()
+            # Keep the store's fingerprint, so analyses cached before the read-back still match
+            self._fingerprint = (self._csv_data, self.summary_store.fingerprint)
+        return self._csv_data
+        
+    def _has_loaded_data(self) -> bool:
+        """Whether summaries are loaded, in memory or spilled, without reading spilled rows back."""
+        return self._csv_data is not None or getattr(self, 'summary_store', None) is not None
+        
+    @current_csv_data.setter
+    def current_csv_data(self, data: Optional[pd.DataFrame]):
+        # New data (or None) replaces any spilled store
+        store = getattr(self, 'summary_store', None)
+        if store is not None:
+            store.close()
+            self.summary_store = None
+        self._csv_data = data
+        # State derived from the previous data must not keep it alive
+        self._fingerprint = (None, None)
+        self._summary_groups = (None, None)
+        self._similarity_index = (None, None)
+        self._embeddings = (None, None)
+        self._clusters = (None, None)
+        
+    def loaded_data_bytes(self) -> int:
+        """Memory held by loaded summaries (0 while they are spilled to disk)."""
+        if self._csv_data is None:
+            return 0
+        return int(self._csv_data.memory_usage(deep=True).sum())
+        
+    def clear_all_caches(self):
+        """Clear all application caches."""
+        self.analysis_cache.clear()
+        self.learned_patterns.clear()
+        self.prompt_feedback.clear()
+        self.current_csv_data = None
+        self.csv_summary = None
+        self.current_mode = None
+        
+        # Don't clear prompt-related state unless explicitly requested
+        if not self.prompt_generated:
+            self.current_analysis_prompt = None
+        self.prompt_generated = False
+            
+        print("All caches cleared.")
+
+    async def initialize(self):
+        """Initialize the GOCAAS client."""
+        # Set up API credentials from environment variables
+        api_key = os.getenv("GOCAAS_API_KEY")  # Put your *proxy* key in .env
+        api_base = os.getenv("GOCAAS_API_BASE", "https://caas-gocode-staging.caas-staging.staging.onkatana.net/v1")
+        assert api_key, "Missing GOCAAS_API_KEY env var"
+        
+        # Share one pooled async client across agents using the same credentials
+        self.client = get_llm_client(api_key, api_base)
+
+    async def run(self, message: str) -> str:
+        """Run the agent with a single message."""
+        return await self.chat(message)
 
-**When generating your output, always use the following detailed format:**
 
-### Quantitative Analysis
-- Provide a table listing each specific topic or issue mentioned, with:
-  - The number of mentions
-  - Percentage of total summaries
-  - Example quotes for each topic/issue
-- For each issue, break down into sub-issues or related topics, and provide counts for each.
-- List all GoDaddy products mentioned, with:
-  - Number of mentions
-  - Percentage of total summaries
-  - Context in which each product was discussed (e.g., problem, praise, question)
-- Include summary statistics (e.g., average number of issues per summary, most/least common topics).
+    async def chat(self, message: str) -> str:
+        """
+        Chat with the model while maintaining conversation history and learning from interactions.
+        Args:
+            message: The user message
+        Returns:
+            The model's response
+        """
+        response = ""
+        async for event in self.chat_stream(message):
+            if event.get('done'):
+                response = event['response']
+        return response
+        
+    @staticmethod
+    def _reply_events(response: str, is_prompt: bool = False, prompt: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Events for a reply that is produced in one piece rather than streamed."""
+        return [{'delta': response}, {'done': True, 'response': response, 'is_prompt': is_prompt, 'prompt': prompt}]
+        
+    async def chat_stream(self, message: str):
+        """
+        Stream a chat turn as it is generated.
+        Args:
+            message: The user message
+        Yields:
+            {'delta': str} for each piece of generated text, then a final
+            {'done': True, 'response': str, 'is_prompt': bool, 'prompt': str or None}.
+            When the reply is a complete prompt, the final response is the formatted
+            prompt and may differ from the concatenated deltas.
+        """
+        try:
+            # Add user message to history
+            self.conversation_history.append({"role": "user", "content": message})
+            
+            # Determine or update mode based on user input
+            if not self.current_mode:
+                if message.lower() in ['1', 'initial prompt']:
+                    self.current_mode = 'initial'
+                    self.prompt_generated = False
+                    for event in self._reply_events("""Here is your complete analysis prompt:
 
-### Top 3 [Topic] Issues
-For each of the top 3 issues:
-- Frequency (count and percentage)
-- Key pain points (bulleted list)
-- Sub-issues or related challenges
-- Root causes if identifiable
-- Customer emotions or sentiment expressed (with supporting quotes)
-- Representative quotes (at least 3-5 per issue, with attribution if possible)
-- Affected products or services
-- Any relevant metadata (e.g., channel, region, call duration, customer type)
+[transcript] You are tasked with analyzing and summarizing call transcripts (document above) from the customer service center of GoDaddy.com. Each conversation begins with one of the following identifiers: "System", "Bot", "Customer", "Consumer", or "Agent". "Customer" and "Consumer" are synonymous. "Agent" refers to a human support representative, while "Bot" is a chatbot. Some transcripts may contain low-quality speech-to-text conversions, so please interpret carefully and clarify where appropriate. Each turn starts with the role indicated above followed by ':', and ends with '|||'. Identifiable information like names and emails have been redacted as GD_REDACTED_NAME and GD_REDACTED_EMAIL.
 
-### Specific Recommendations
-For each top issue:
-- 3-5 actionable recommendations, each with a clear rationale
-- Prioritize recommendations by potential impact and ease of implementation
-- Suggest metrics to track the effectiveness of each recommendation
+1. Identify key pain points experienced by the customers related to domain issues in each call.
+2. Analyze how the bot and/or agent handled the issue(s) in the given call.
+3. Point out what went well and could be improved in terms of the given call and determine if escalating issues specific to domain management.
+4. Provide specific examples from the transcript to support your analysis.
 
-### What's Working Well
-- List positive patterns, successful features, and effective processes
-- Include direct positive customer quotes and specific examples
-- Highlight any improvements over time if visible in the data
+**Task instructions:**"""):
+                        yield event
+                    return
+                elif message.lower() in ['2', 'summary of summaries', 'summary of summaries prompt']:
+                    self.current_mode = 'summary'
+                    self.prompt_generated = False
+                    for event in self._reply_events("""Analyze customer call transcripts between customers and customer service guides regarding commerce website development issues. Provide a detailed breakdown of the following:
 
-### Additional Insights
-- List any other valuable observations, with supporting data or quotes
-- Identify emerging trends or outlier cases
-- Note any unexpected findings
+Output Format:
+1. Executive Summary:
+   - Provide a concise overview of key findings and general sentiment.
 
-### Not Found
-- List important elements that were specifically looked for but not found
-- Note any gaps in the data or analysis
+2. Quantitative Analysis:
+   - Count and percentage of specific feature mentions (list all features mentioned)
+   - Frequency distribution of all complaints by category
+   - Overall sentiment analysis with percentages (positive, neutral, negative) and identification of the most common sentiment mode
 
-### Uncertainties
-- List any areas where the data is unclear or ambiguous
-- Suggest what additional information would help clarify these uncertainties
+3. What's Working Well:
+   - Identify positive aspects of the commerce website mentioned by customers
+   - Highlight features receiving praise or positive feedback
+   - Note any compliments about recent improvements
 
-### Formatting Requirements
-- Use clear section headers and bullet points
-- Include tables for quantitative data where appropriate
-- Use bold or italics to highlight key findings
-- Ensure the output is easy to scan and actionable
+4. Categories of Pain Points:
+   - Categorize all identified issues into logical groupings (e.g., checkout problems, navigation issues, mobile compatibility, etc.)
+   - Include an "Other" category for issues that don't fit neatly into the main categories
+   - For each category (including "Other"), provide representative examples from the transcripts
 
-**Instructions for the LLM:**
-- Always use this structure, with as much specific detail and direct quoting as possible.
-- If you are unsure about any aspect, state your uncertainty and what would help clarify it.
-- Present the draft prompt and offer to refine it based on user feedback. Continue iterating until the user confirms the prompt meets their needs.
+5. Top 3 Issues:
+   - Identify and detail the three most frequently mentioned problems
+   - For each top issue, include:
+     * Number of mentions and percentage of total complaints
+     * Specific customer quotes illustrating the problem
+     * Impact on customer experience and business outcomes
 
-OUTPUT FORMAT REQUIREMENTS: Ensure the final prompt explicitly requests:
-A quantitative analysis section with specific counts and percentages
-A "What's Working Well" section highlighting positive patterns and successful elements
-Clearly identified top 3 issues based on specified criteria
-Tailored recommendations for each top issue
-An "Additional Insights" section for valuable observations that don't fit in other categories
-A "Not Found" section listing important elements that were specifically looked for but not found
-A section of things that you are uncertain how to do. Don't hallucinate
-Proper formatting according to user preferences 
+6. Top 3 Recommendations:
+   - For each of the top 3 issues, provide very specific, actionable recommendations
+   - Include overall strategic recommendations for improving the commerce website experience
 
-Present the draft prompt and offer to refine it based on feedback. Continue iterating until the user confirms the prompt meets their needs.
+7. Additional Insights:
+   - Note any patterns in customer behavior or expectations
+   - Identify emerging trends or concerns not captured in the main categories
+   - Highlight any competitive comparisons mentioned by customers
 
-**CRITICAL FORMATTING REQUIREMENT**: When presenting a complete prompt (initial or summary of summaries), ALWAYS format it as a clear, structured document that includes:
-1. A clear indication this is a complete prompt (use "Here is your complete analysis prompt:" or similar)
-2. The [transcript] framework section
-3. Clear section headers using ### for major sections
-4. Well-organized content with bullet points and structured layout
-5. Analysis Instructions section
-6. All required components for the chosen prompt type
+8. Not Found:
+   - List any important commerce website elements or features specifically looked for but were not mentioned in the transcripts
 
-This formatting is essential for the UI to properly detect and display the prompt in the dedicated prompt display area.
+9. Other Observations:
+   - Include any relevant findings that don't fit into the above categories
+   - Note any unusual or unexpected patterns in the customer interactions
 
-CSV FILE ANALYSIS: After the user confirms the summary of summaries prompt is satisfactory, let them know they can upload their CSV file using the UI. Once the CSV is uploaded, proceed directly to analysis using the uploaded file—do not ask the user for a file path. Analyze the CSV 'conversation_summary' column only and present the results following the specified output format. Offer to refine or expand the analysis based on user feedback.
+Ensure all recommendations are specific, actionable, and directly address the identified issues. Support your analysis with direct quotes or examples from the transcripts whenever possible.
 
-Always maintain a helpful, educational tone that builds the user's prompt engineering capabilities while delivering immediate value through your expert prompt design. The more detail the better.
+Would you like to customize any part of this prompt before we proceed with the analysis?"""):
+                        yield event
+                    return
+                elif not any(mode in message.lower() for mode in ['1', '2', 'initial prompt', 'summary of summaries']):
+                    for event in self._reply_events("""Would you like to create:
+1. An initial prompt for analyzing individual transcripts, or
+2. A summary of summaries prompt for analyzing multiple transcript summaries?
 
-**Important:** You have memory of our previous conversations in this session. Use context from earlier messages to provide better responses."""}
-            ]
-            messages.extend(self.conversation_history[-10:])  # Include last 10 messages
+Please type '1' or 'initial prompt' for option 1, or '2' or 'summary of summaries' for option 2."""):
+                        yield event
+                    return
             
-            # Call the API with retry logic (OpenAI client is synchronous)
-            max_retries = 3
-            retry_count = 0
-            while retry_count < max_retries:
-                try:
-                    response = self.client.chat.completions.create(
-                        model="gpt-3.5-turbo",
-                        messages=messages,
-                        timeout=60  # 60 seconds timeout
-                    )
-                    break  # Success, exit the retry loop
-                except Exception as e:
-                    retry_count += 1
-                    if retry_count == max_retries:
-                        if "timeout" in str(e).lower():
-                            raise Exception("The request timed out. Please try again. If the problem persists, try breaking your question into smaller parts.")
-                        else:
-                            raise e
-                    print(f"Request failed, retrying ({retry_count}/{max_retries})... Error: {str(e)}")
-                    await asyncio.sleep(1)  # Wait a second before retrying
+            # Create messages array for the API call
+            messages = [SYSTEM_PROMPT.message]
+            # Pinned analysis prompt, summary of older turns, then recent turns within the token budget
+            messages.extend(await self.memory.build(
+                self.conversation_history,
+                pinned_prompt=self.current_analysis_prompt,
+                complete=self._create_completion
+            ))
+            self._record_token_stats(messages)
+            
+            # Call the API (awaited, with backoff and Retry-After handling) and relay tokens as they arrive
+            params = {}
+            if LLM_SEND_PROMPT_CACHE_KEY:
+                params['extra_body'] = {'prompt_cache_key': SYSTEM_PROMPT.cache_key}
+            if LLM_STREAM_USAGE:
+                params['stream_options'] = {'include_usage': True}
+            stream = await self._create_completion(messages, stream=True, **params)
+            parts = []
+            async for chunk in stream:
+                if getattr(chunk, 'usage', None):
+                    self._record_usage(chunk.usage)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    yield {'delta': delta}
             
             # Extract and store response
-            assistant_response = response.choices[0].message.content
+            assistant_response = "".join(parts)
             self.conversation_history.append({"role": "assistant", "content": assistant_response})
             
             # Handle prompt generation and modifications
@@ -666,7 +2685,9 @@ Always maintain a helpful, educational tone that builds the user's prompt engine
             is_prompt_modification = any(keyword in message.lower() for keyword in 
                 ['change', 'modify', 'update', 'customize', 'edit'] + ['prompt'])
                 
-            if is_complete_prompt or (self.prompt_generated and is_prompt_modification):
+            extracted_prompt = None
+            is_prompt = is_complete_prompt or (self.prompt_generated and is_prompt_modification)
+            if is_prompt:
                 # Store the complete response first
                 self.conversation_history[-1]["content"] = assistant_response
                 
@@ -682,26 +2703,100 @@ Always maintain a helpful, educational tone that builds the user's prompt engine
                 # Return the formatted version for display
                 assistant_response = formatted_response
             
-            # Keep conversation history manageable (last 20 messages)
-            if len(self.conversation_history) > 20:
-                self.conversation_history = self.conversation_history[-20:]
-                
-            return assistant_response
+            yield {'done': True, 'response': assistant_response, 'is_prompt': is_prompt, 'prompt': extracted_prompt}
             
         except asyncio.TimeoutError:
             error_msg = "The request timed out. Please try again. If the problem persists, try breaking your question into smaller parts."
             print(f"Error in chat with model: {error_msg}")
-            return error_msg
+            yield {'done': True, 'response': error_msg, 'is_prompt': False, 'prompt': None}
         except Exception as e:
             error_msg = str(e)
             print(f"Error in chat with model: {error_msg}")
             if "timeout" in error_msg.lower():
-                return "The request took too long to complete. Please try again or break your question into smaller parts."
-            return f"I encountered an error. Please try again. Error details: {error_msg}"
-
+                error_msg = "The request took too long to complete. Please try again or break your question into smaller parts."
+            else:
+                error_msg = f"I encountered an error. Please try again. Error details: {error_msg}"
+            yield {'done': True, 'response': error_msg, 'is_prompt': False, 'prompt': None}
+
+    def _record_token_stats(self, messages: List[Dict[str, str]]):
+        """Log how many input tokens are the static system prefix vs. the per-call conversation."""
+        prefix_tokens = SYSTEM_PROMPT.token_count
+        variable_tokens = count_message_tokens(messages[1:])
+        self.last_token_stats = {
+            'prompt_version': SYSTEM_PROMPT.version,
+            'prefix_tokens': prefix_tokens,
+            'variable_tokens': variable_tokens,
+            'total_tokens': prefix_tokens + variable_tokens
+        }
+        logger.info(
+            f"LLM request tokens: prefix {prefix_tokens} (system prompt v{SYSTEM_PROMPT.version}), "
+            f"variable {variable_tokens}, total {prefix_tokens + variable_tokens}"
+        )
+        
+    def _record_usage(self, usage):
+        """Attach provider-reported usage (including cached prompt tokens) to the last request's stats."""
+        details = getattr(usage, 'prompt_tokens_details', None)
+        self.last_token_stats['provider_prompt_tokens'] = usage.prompt_tokens
+        self.last_token_stats['cached_tokens'] = getattr(details, 'cached_tokens', 0) or 0
+        logger.info(f"LLM usage: {usage.prompt_tokens} prompt tokens, {self.last_token_stats['cached_tokens']} served from cache")
+        
+    async def _create_completion(self, messages: List[Dict[str, str]], model: Optional[str] = None,
+                                 use_cache: bool = True, **params):
+        """
+        Await a chat completion, retrying transient failures. Identical requests are
+        answered from llm_cache unless use_cache is False or the cache is disabled.
+        Args:
+            messages: Messages to send
+            model: Model to use instead of LLM_MODEL
+            use_cache: Read and write the persistent LLM result cache
+            **params: Extra parameters for chat.completions.create
+        Returns:
+            The completion response
+        """
+        model = model or LLM_MODEL
+        stream = params.get('stream', False)
+        key = None
+        if use_cache and llm_cache.enabled:
+            # Streaming and non-streaming requests share entries; stream_options only affects usage reporting
+            key = llm_cache.make_key(model, messages, {k: v for k, v in params.items() if k not in ('stream', 'stream_options')})
+            # SQLite reads and writes run in worker threads, so concurrent requests on the loop
+            # never wait on disk I/O or the cache's write lock
+            cached = await asyncio.to_thread(llm_cache.get, key)
+            if cached is not None:
+                completion = ChatCompletion.model_validate_json(cached)
+                return _replay_stream(completion) if stream else completion
+        
+        response = await self._request_completion(messages, model, **params)
+        if key is not None:
+            if stream:
+                return _record_stream(response, model, key)
+            if response.choices[0].finish_reason != 'length':
+                await asyncio.to_thread(llm_cache.put, key, response.model_dump_json())
+        return response
+        
+    async def _request_completion(self, messages: List[Dict[str, str]], model: str, **params):
+        """Call the API, retrying timeouts, connection errors, rate limits and 5xx responses."""
+        for attempt in range(LLM_MAX_RETRIES):
+            try:
+                return await self.client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    timeout=LLM_TIMEOUT,
+                    **params
+                )
+            except Exception as e:
+                if attempt == LLM_MAX_RETRIES - 1 or not is_retryable(e):
+                    if isinstance(e, (APITimeoutError, asyncio.TimeoutError)) or "timeout" in str(e).lower():
+                        raise Exception("The request timed out. Please try again. If the problem persists, try breaking your question into smaller parts.")
+                    raise
+                delay = retry_delay(e, attempt)
+                print(f"Request failed, retrying ({attempt + 1}/{LLM_MAX_RETRIES}) in {delay:.1f}s... Error: {str(e)}")
+                await asyncio.sleep(delay)
+                
     def clear_history(self):
         """Clear the conversation history."""
         self.conversation_history = []
+        self.memory.clear()
         self.prompt_generated = False
         print("Conversation history cleared.")
     
@@ -714,7 +2809,12 @@ Always maintain a helpful, educational tone that builds the user's prompt engine
             nltk.data.clear_cache()
         except:
             pass
-        # Clear spaCy model cache if possible
+        # Clear parsed-document features and the spaCy model cache if possible
+        nlp_service.clear_cache()
+        # Purge persisted LLM results so the next requests hit the API
+        llm_cache.clear()
+        # And the stored per-summary features, so they are recomputed on the next analysis
+        feature_store.clear()
         try:
             import spacy
             spacy.util.registry.reset()
@@ -755,45 +2855,105 @@ Always maintain a helpful, educational tone that builds the user's prompt engine
                     insights.append(f"- Using '{pattern}' has been successful {count} times")
         return "\n".join(insights) if insights else ""
 
-    def load_csv_from_buffer(self, csv_buffer, filename: str = "") -> bool:
+    @staticmethod
+    def _coerce_metadata(frame: pd.DataFrame) -> pd.DataFrame:
+        """Cast the METADATA_COLUMNS present in frame to their compact dtypes (unparseable and out-of-range values become missing)."""
+        for column, dtype in METADATA_COLUMNS.items():
+            if column not in frame.columns:
+                continue
+            if dtype == 'category':
+                values = frame[column]
+                if not isinstance(values.dtype, pd.CategoricalDtype):
+                    values = values.astype(object).where(values.notna()).str.strip()
+                frame[column] = values.astype('category')
+            else:
+                values = pd.to_numeric(frame[column], errors='coerce').round()
+                limits = np.iinfo(pd.api.types.pandas_dtype(dtype).numpy_dtype)
+                frame[column] = values.where(values.between(limits.min, limits.max)).astype(dtype)
+        return frame
+        
+    @staticmethod
+    def _read_summary_chunks(source, chunksize: int = CSV_CHUNK_ROWS, progress: Optional[ProgressReporter] = None):
+        """
+        Yield conversation_summary and the METADATA_COLUMNS of a CSV in chunks, parsing the header once.
+        Args:
+            source: Path, or text or binary file-like object (an upload stream, for example)
+            chunksize: Rows per chunk
+            progress: Reporter updated after each chunk (stage 'loading'), with an ETA from the bytes read
+        Yields:
+            pd.DataFrame: Lower-cased column names; stripped summaries (missing values as empty
+            strings) and whichever metadata columns the file has, in their compact dtypes
         """
-        Load and process a CSV from a StringIO buffer, optimized to only read conversation_summary column.
+        if isinstance(source, (str, os.PathLike)):
+            source = open(source, 'rb')
+            owned = True
+        else:
+            owned = False
+        size = None
+        try:
+            position = source.tell()
+            source.seek(0, os.SEEK_END)
+            size = source.tell() - position
+            source.seek(position)
+        except (AttributeError, OSError, ValueError):
+            position = None
+        reader = pd.read_csv(
+            source,
+            usecols=lambda col: col.strip().lower() in CSV_COLUMNS,  # Only parse the columns we use
+            dtype=str,
+            encoding='utf-8',
+            on_bad_lines='skip',  # Skip bad lines instead of warning
+            chunksize=chunksize
+        )
+        rows = 0
+        try:
+            with reader:
+                for chunk in reader:
+                    chunk.columns = [col.strip().lower() for col in chunk.columns]
+                    if 'conversation_summary' not in chunk.columns:
+                        raise ValueError("CSV file must contain a 'conversation_summary' column. Please check your file format.")
+                    rows += len(chunk)
+                    if progress is not None:
+                        # The parser reads ahead, so the stream position slightly overstates progress
+                        fraction = min((source.tell() - position) / size, 1.0) if size else None
+                        progress.update('loading', rows, fraction=fraction)
+                    chunk['conversation_summary'] = chunk['conversation_summary'].fillna('').str.strip()
+                    yield ConversationalAgent._coerce_metadata(chunk)
+        finally:
+            if owned:
+                source.close()
+                
+    @staticmethod
+    def _metadata_summary_lines(loaded_columns) -> List[str]:
+        """One line naming the metadata columns loaded with the summaries, if any."""
+        columns = [column for column in METADATA_COLUMNS if column in loaded_columns]
+        if not columns:
+            return []
+        return [f"- Metadata columns loaded: {', '.join(columns)}"]
+        
+    def load_csv_from_buffer(self, csv_buffer, filename: str = "", progress: Optional[ProgressReporter] = None) -> bool:
+        """
+        Load and process a CSV from a file-like object, reading only the conversation_summary column.
+        The CSV is parsed in chunks straight from the stream, so the file is never held as one string.
         Args:
-            csv_buffer: StringIO object containing CSV data
+            csv_buffer: Text or binary file-like object (or path) containing CSV data
             filename: Optional filename for logging
+            progress: Optional reporter for progress and cancellation (raises OperationCancelled)
         Returns:
             bool: True if successful, False otherwise
         """
         try:
-            # First check if the column exists using a small chunk
-            header = pd.read_csv(csv_buffer, nrows=0)
-            if 'conversation_summary' not in [col.lower() for col in header.columns]:
-                logger.error("CSV must contain a 'conversation_summary' column")
-                return False
-            
-            # Reset buffer position
-            csv_buffer.seek(0)
-            
-            # Find the conversation_summary column (case-insensitive)
-            conv_summary_col = next(col for col in header.columns if col.lower() == 'conversation_summary')
-            
-            # Read only the conversation_summary column with optimized settings
-            df = pd.read_csv(
-                csv_buffer,
-                usecols=[conv_summary_col],  # Only read the conversation_summary column
-                dtype=str,  # Read as string
-                encoding='utf-8',
-                on_bad_lines='skip',  # Skip bad lines instead of warning
-                memory_map=True,  # Use memory mapping for large files
-                low_memory=True  # Use less memory
-            )
+            chunks = list(self._read_summary_chunks(csv_buffer, progress=progress))
+            if chunks:
+                # Categories can differ between chunks, so re-apply the compact dtypes after combining them
+                df = self._coerce_metadata(pd.concat(chunks, ignore_index=True))
+            else:
+                df = pd.DataFrame({'conversation_summary': pd.Series([], dtype=object)})
             
             logger.info(f"Loaded {len(df)} conversation summaries")
             
-            # Store and clean the data
-            self.current_csv_data = df.copy()
-            self.current_csv_data.columns = ['conversation_summary']  # Normalize column name
-            self.current_csv_data['conversation_summary'] = self.current_csv_data['conversation_summary'].fillna('').str.strip()
+            # Store the data (already cleaned per chunk)
+            self.current_csv_data = df
             
             # Generate summary focused on conversation summaries
             summary = []
@@ -809,6 +2969,7 @@ Always maintain a helpful, educational tone that builds the user's prompt engine
                     f"\n📊 Summary Overview:",
                     f"- Total conversation summaries: {total_summaries}",
                     f"- Average summary length: {int(avg_length)} characters",
+                    *self._metadata_summary_lines(self.current_csv_data.columns),
                     f"\n📝 Sample Summary:",
                     f"{first_summary[:200]}{'...' if len(first_summary) > 200 else ''}",  # Show first 200 chars
                     f"\n👉 {total_summaries - 1} more summaries available for analysis"
@@ -822,89 +2983,96 @@ Always maintain a helpful, educational tone that builds the user's prompt engine
             self.csv_summary = "\n".join(summary)
             return True
             
+        except OperationCancelled:
+            logger.info(f"Loading {filename or 'CSV'} was cancelled")
+            raise
+        except ValueError as e:
+            logger.error(str(e))
+            return False
         except Exception as e:
             logger.error(f"Error loading CSV from buffer: {str(e)}")
             logger.error(traceback.format_exc())
             return False
 
-    def load_csv(self, file_path: str) -> bool:
+    def load_csv(self, file_path: str, spill: Optional[bool] = None, progress: Optional[ProgressReporter] = None) -> bool:
         """
         Load and process a CSV file, optimized to only read the 'conversation_summary' column.
+        The file is read in chunks and each chunk updates running statistics, so the summary
+        never needs the whole column plus per-row intermediates in memory.
         Args:
             file_path: Path to the CSV file
+            spill: Write summaries to an on-disk SummaryStore instead of keeping them in memory
+                   (defaults to LIGHTHOUSE_CSV_SPILL)
+            progress: Optional reporter for progress and cancellation (raises OperationCancelled)
         Returns:
             bool: True if successful, False otherwise
         """
+        if spill is None:
+            spill = os.getenv("LIGHTHOUSE_CSV_SPILL", "").lower() in ("1", "true", "yes")
+        store = None
         try:
-            # First check if conversation_summary column exists using a small chunk
-            header = pd.read_csv(file_path, nrows=0)
-            conv_col = next((col for col in header.columns if col.lower() == 'conversation_summary'), None)
-            if not conv_col:
-                raise ValueError("CSV file must contain a 'conversation_summary' column. Please check your file format.")
-            
-            # Read only the conversation_summary column with optimized settings
-            df = pd.read_csv(
-                file_path,
-                usecols=[conv_col],  # Only read the conversation_summary column
-                dtype=str,  # Read as string
-                encoding='utf-8',
-                on_bad_lines='skip',  # Skip bad lines instead of warning
-                memory_map=True,  # Use memory mapping for large files
-                low_memory=True,  # Use less memory
-                chunksize=10000  # Process in chunks for very large files
-            )
-            
-            # Combine chunks if chunked reading was used
-            if hasattr(df, '__iter__'):  # Check if we got an iterator (chunked reading)
-                df = pd.concat(df, ignore_index=True)
-            
-            # Validate and clean data
-            df[conv_col] = df[conv_col].fillna('').astype(str).str.strip()
-            if df[conv_col].str.len().eq(0).all():
+            stats = SummaryStats()
+            chunks = []
+            store = SummaryStore() if spill else None
+            columns = []
+            for chunk in self._read_summary_chunks(file_path, progress=progress):
+                columns = chunk.columns
+                stats.update(chunk['conversation_summary'])
+                if store is not None:
+                    store.append(chunk)
+                else:
+                    chunks.append(chunk)
+            if stats.count == 0:
+                raise pd.errors.EmptyDataError("No rows")
+            if stats.nonempty == 0:
                 raise ValueError("The conversation_summary column contains no valid data")
             
-            # Store the data with normalized column name
-            self.current_csv_data = df.copy()
-            self.current_csv_data.columns = ['conversation_summary']  # Normalize column name
+            # Store the data with normalized column name (or keep it on disk until an analysis needs it)
+            if store is not None:
+                store.finish()
+                self.current_csv_data = None
+                self.summary_store = store
+                store = None
+            else:
+                self.current_csv_data = self._coerce_metadata(pd.concat(chunks, ignore_index=True))
             
             # Generate summary focused on conversation data
             summary = []
             summary.append("Processing 'conversation_summary' column")
-            summary.append(f"Number of conversation summaries: {len(self.current_csv_data)}")
+            summary.append(f"Number of conversation summaries: {stats.count}")
             
             # Quick initial summary without expensive operations
             summary.append(f"\nQuick Summary:")
-            summary.append(f"- Total entries: {len(self.current_csv_data)}")
-            
-            # Calculate comprehensive statistics
-            word_counts = self.current_csv_data['conversation_summary'].str.split().str.len()
-            sentiment_scores = [TextBlob(text).sentiment.polarity for text in self.current_csv_data['conversation_summary']]
+            summary.append(f"- Total entries: {stats.count}")
+            summary.extend(self._metadata_summary_lines(columns))
             
-            summary.append(f"\n📊 Complete Statistics (all {len(self.current_csv_data)} entries):")
+            # Statistics accumulated chunk by chunk
+            summary.append(f"\n📊 Complete Statistics (all {stats.count} entries):")
             summary.append(f"\nText Length Analysis:")
-            summary.append(f"- Average words per summary: {word_counts.mean():.1f}")
-            summary.append(f"- Median words per summary: {word_counts.median():.1f}")
-            summary.append(f"- Shortest summary: {word_counts.min()} words")
-            summary.append(f"- Longest summary: {word_counts.max()} words")
-            summary.append(f"- Standard deviation: {word_counts.std():.1f} words")
+            summary.append(f"- Average words per summary: {stats.word_sum / stats.count:.1f}")
+            summary.append(f"- Median words per summary: {stats.median_words():.1f}")
+            summary.append(f"- Shortest summary: {min(stats.word_hist)} words")
+            summary.append(f"- Longest summary: {max(stats.word_hist)} words")
+            summary.append(f"- Standard deviation: {stats.std_words():.1f} words")
             
             summary.append(f"\nSentiment Overview:")
-            positive = sum(1 for s in sentiment_scores if s > 0.1)
-            negative = sum(1 for s in sentiment_scores if s < -0.1)
-            neutral = len(sentiment_scores) - positive - negative
-            summary.append(f"- Positive summaries: {positive} ({(positive/len(sentiment_scores)*100):.1f}%)")
-            summary.append(f"- Neutral summaries: {neutral} ({(neutral/len(sentiment_scores)*100):.1f}%)")
-            summary.append(f"- Negative summaries: {negative} ({(negative/len(sentiment_scores)*100):.1f}%)")
-            summary.append(f"- Average sentiment: {sum(sentiment_scores)/len(sentiment_scores):.2f} [-1 to +1 scale]")
+            neutral = stats.count - stats.positive - stats.negative
+            summary.append(f"- Positive summaries: {stats.positive} ({(stats.positive/stats.count*100):.1f}%)")
+            summary.append(f"- Neutral summaries: {neutral} ({(neutral/stats.count*100):.1f}%)")
+            summary.append(f"- Negative summaries: {stats.negative} ({(stats.negative/stats.count*100):.1f}%)")
+            summary.append(f"- Average sentiment: {stats.polarity_sum/stats.count:.2f} [-1 to +1 scale]")
             
             # Show first 3 examples with full text
             summary.append("\nExample Summaries:")
-            for idx, text in enumerate(self.current_csv_data['conversation_summary'].head(3), 1):
+            for idx, text in enumerate(stats.examples, 1):
                 summary.append(f"\n{idx}. {text}")  # Show complete text
             
             self.csv_summary = "\n".join(summary)
             return True
             
+        except OperationCancelled:
+            print(f"Loading {file_path} was cancelled")
+            raise
         except pd.errors.EmptyDataError:
             error_msg = "The CSV file is empty. Please check the file content."
             print(f"Error loading CSV file: {error_msg}")
@@ -926,6 +3094,9 @@ Always maintain a helpful, educational tone that builds the user's prompt engine
             print("Traceback:", traceback.format_exc())
             self._reset_state()
             return False
+        finally:
+            if store is not None:  # Not handed over to the agent (the load failed)
+                store.close()
 
     def _reset_state(self):
         """Reset the agent's state related to CSV processing."""
@@ -943,17 +3114,148 @@ Always maintain a helpful, educational tone that builds the user's prompt engine
             return "No CSV file has been loaded yet."
         return self.csv_summary
 
-    def analyze_summaries(self) -> str:
+    def _data_fingerprint(self) -> str:
+        """Stable content hash of the loaded summaries and metadata, computed once per loaded DataFrame."""
+        if self._csv_data is None and self.summary_store is not None:
+            return self.summary_store.fingerprint
+        data, fingerprint = self._fingerprint
+        if data is not self.current_csv_data:
+            row_hashes = pd.util.hash_pandas_object(self.current_csv_data, index=False)
+            fingerprint = hashlib.sha256(row_hashes.values.tobytes()).hexdigest()
+            self._fingerprint = (self.current_csv_data, fingerprint)
+        return fingerprint
+        
+    def _deduplicated_summaries(self, progress: Optional[ProgressReporter] = None) -> Tuple[np.ndarray, List[str], SummaryGroups]:
+        """
+        Summaries of the loaded data grouped into exact and near duplicates, computed once per loaded DataFrame.
+        Args:
+            progress: Optional reporter (stage 'deduplicating')
+        Returns:
+            Tuple: Boolean mask of rows with a summary, their texts, and the SummaryGroups over those texts
+        """
+        data, cached = self._summary_groups
+        if data is self.current_csv_data and cached is not None:
+            return cached
+        series = self.current_csv_data['conversation_summary']
+        valid = series.map(lambda text: isinstance(text, str)).to_numpy(dtype=bool)
+        texts = series[valid].tolist()
+        if progress is not None:
+            progress.update('deduplicating', 0, len(texts))
+        groups = summary_deduplicator.group(texts)
+        logger.info(f"Deduplicated {len(texts)} summaries into {len(groups.weights)} groups "
+                    f"({groups.exact_duplicates} exact and {groups.near_duplicates} near duplicates)")
+        self._summary_groups = (self.current_csv_data, (valid, texts, groups))
+        return valid, texts, groups
+        
+    def _corpus_similarity_index(self) -> SimilarityIndex:
+        """SimilarityIndex over one representative per duplicate group (row i is group i), built once per loaded DataFrame."""
+        data, index = self._similarity_index
+        if data is self.current_csv_data and index is not None:
+            return index
+        _, texts, groups = self._deduplicated_summaries()
+        index = SimilarityIndex([texts[idx] for idx in groups.representatives])
+        self._similarity_index = (self.current_csv_data, index)
+        return index
+        
+    def _summary_embeddings(self) -> np.ndarray:
+        """Unit-length embeddings of one representative per duplicate group (row i is group i), computed once per loaded DataFrame."""
+        data, embeddings = self._embeddings
+        if data is self.current_csv_data and embeddings is not None:
+            return embeddings
+        _, texts, groups = self._deduplicated_summaries()
+        index = self._corpus_similarity_index() if summary_clusterer.embedding != 'vectors' else None
+        embeddings = summary_clusterer.embed([texts[idx] for idx in groups.representatives], index)
+        self._embeddings = (self.current_csv_data, embeddings)
+        return embeddings
+        
+    def _quote_vectors(self):
+        """
+        Vectors report quotes are chosen by (row i is group i): the clustering embeddings when
+        clustering is enabled, otherwise the corpus TF-IDF rows, so no SVD is fitted just for quotes.
+        """
+        if summary_clusterer.clusters >= 2:
+            return self._summary_embeddings()
+        return self._corpus_similarity_index().matrix
+        
+    def _summary_clusters(self, progress: Optional[ProgressReporter] = None) -> Optional[SummaryClusters]:
+        """SummaryClusters over one representative per duplicate group, computed once per loaded DataFrame (None if disabled)."""
+        data, clusters = self._clusters
+        if data is self.current_csv_data and data is not None:
+            return clusters
+        clusters = None
+        if summary_clusterer.clusters >= 2:
+            _, texts, groups = self._deduplicated_summaries(progress)
+            clusters = summary_clusterer.cluster([texts[idx] for idx in groups.representatives], groups.weights,
+                                                 self._get_common_topics, progress=progress,
+                                                 embeddings=self._summary_embeddings())
+        self._clusters = (self.current_csv_data, clusters)
+        return clusters
+        
+    def find_similar_summaries(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
+        """
+        Loaded summaries most similar to a query text.
+        Args:
+            query: Free text, e.g. a summary or a description of an issue
+            k: Number of summaries to return
+        Returns:
+            List[Dict[str, Any]]: summary, similarity and the number of conversations it stands for
+            (its duplicate group size), most similar first
+        """
+        if self.current_csv_data is None or 'conversation_summary' not in self.current_csv_data.columns:
+            return []
+        index = self._corpus_similarity_index()
+        _, _, groups = self._deduplicated_summaries()
+        neighbours, scores = index.most_similar(index.transform([query]), k=k)
+        return [
+            {'summary': index.texts[row], 'similarity': round(float(score), 4), 'conversations': int(groups.weights[row])}
+            for row, score in zip(neighbours[0], scores[0]) if score > 0
+        ]
+        
+    def _analysis_key(self, engine: str, prompt: str = "") -> Tuple[str, str, str]:
+        """Cache key for an analysis of the loaded data: data fingerprint, engine version and prompt hash."""
+        return (self._data_fingerprint(), engine, hashlib.sha256(prompt.encode('utf-8')).hexdigest())
+        
+    def _prompt_analysis_key(self, prompt: str) -> Tuple[str, str, str]:
+        """Cache key of analyze_with_prompt for the loaded data, model, dedup settings and prompt."""
+        return self._analysis_key(f"llm:{LLM_MODEL}:dedup-{summary_deduplicator.signature}", prompt)
+        
+    def _summary_analysis_key(self) -> Tuple[str, str, str]:
+        """Cache key of analyze_summaries for the loaded data and current dedup and clustering settings."""
+        return self._analysis_key(f"keyword-v{ANALYSIS_VERSION}:dedup-{summary_deduplicator.signature}"
+                                  f":clusters-{summary_clusterer.signature}")
+        
+    def _cached_analysis(self, key: Tuple[str, str, str]) -> Optional[str]:
+        result = self.analysis_cache.get(key)
+        if result is not None:
+            self.analysis_cache.move_to_end(key)
+            logger.info("Returning cached analysis for unchanged data")
+        return result
+        
+    def _store_analysis(self, key: Tuple[str, str, str], result: str):
+        self.analysis_cache[key] = result
+        self.analysis_cache.move_to_end(key)
+        while len(self.analysis_cache) > self.analysis_cache_size:
+            self.analysis_cache.popitem(last=False)
+            
+    def analyze_summaries(self, progress: Optional[ProgressReporter] = None) -> str:
         """
         Analyze conversation summaries following the exact structure from the generated prompt.
+        Args:
+            progress: Optional reporter for progress and cancellation (raises OperationCancelled)
         Returns:
             str: Detailed analysis results
         """
         # Validate CSV data
-        if self.current_csv_data is None:
+        if not self._has_loaded_data():
             logger.error("No CSV data loaded")
             return "No CSV file has been loaded yet."
             
+        # Checked before spilled rows are read back: the key only needs the data fingerprint
+        cache_key = self._summary_analysis_key()
+        cached = self._cached_analysis(cache_key)
+        if cached is not None:
+            return cached
+            
         if 'conversation_summary' not in self.current_csv_data.columns:
             logger.error("Missing conversation_summary column")
             return "CSV file must contain a 'conversation_summary' column."
@@ -963,309 +3265,90 @@ Always maintain a helpful, educational tone that builds the user's prompt engine
             return "The loaded CSV file contains no data."
             
         try:
-            # Initialize variables
-            analysis = []
-            series = self.current_csv_data['conversation_summary']
-            texts = series.dropna().tolist()
-            total_cases = len(texts)
-            
-            # Initialize counters
-            feature_mentions = defaultdict(int)
-            sentiment_scores = []
-            positive_aspects = defaultdict(list)
-            issues = defaultdict(list)
-            
-            # Process each text
-            for text in texts:
-                if not isinstance(text, str):
-                    continue
-                
-                # Analyze sentiment
-                sentiment = TextBlob(text).sentiment.polarity
-                sentiment_scores.append(sentiment)
+            valid, texts, groups = self._deduplicated_summaries(progress)
+            metadata = self.current_csv_data.loc[valid, [c for c in METADATA_COLUMNS if c in self.current_csv_data.columns]]
+            
+            # Single scoring pass over one representative per duplicate group; every row then takes
+            # its group's scores, so all counts below are weighted by group size
+            representatives = [texts[idx] for idx in groups.representatives]
+            table = self._score_summaries(representatives, progress).iloc[groups.group].reset_index(drop=True)
+            table = table.join(metadata.reset_index(drop=True))
+            table['group'] = groups.group
+            
+            def quotes(rows, k: int = 2) -> List[str]:
+                return self._representative_quotes(table, rows, representatives, self._quote_vectors, k)
                 
-                # Process text
-                text_lower = text.lower()
-                
-                # Track features and sentiment
-                for feature in ['checkout', 'navigation', 'mobile', 'search', 'payment', 'cart']:
-                    if feature in text_lower:
-                        feature_mentions[feature] += 1
-                if sentiment > 0.1:
-                            positive_aspects[feature].append(text)
-                elif sentiment < -0.1:
-                            issues[f"{feature} issues"].append(text)
+            clusters = self._summary_clusters(progress)
+            if clusters is not None:
+                table['cluster'] = clusters.assignments[groups.group]
+            if progress is not None:
+                progress.update('report', 0, unit='sections')
+            total_cases = len(table)
+            polarity = table['polarity']
+            
+            # Track features and sentiment per feature
+            feature_mentions = {}
+            positive_aspects = {}
+            issues = {}
+            for feature in REPORT_FEATURES:
+                mentions = self._has_family(table, f'feature:{feature}')
+                count = int(mentions.sum())
+                if count:
+                    feature_mentions[feature] = count
+                positive_rows = table[mentions & (polarity > 0.1)]
+                negative_rows = table[mentions & (polarity < -0.1)]
+                if len(positive_rows):
+                    positive_aspects[feature] = positive_rows
+                if len(negative_rows):
+                    issues[f"{feature} issues"] = negative_rows
             
             # Calculate sentiment stats
-            positive = sum(1 for s in sentiment_scores if s > 0.1)
-            negative = sum(1 for s in sentiment_scores if s < -0.1)
-            neutral = len(sentiment_scores) - positive - negative
+            positive = int((polarity > 0.1).sum())
+            negative = int((polarity < -0.1).sum())
+            neutral = total_cases - positive - negative
             sentiment_mode = "Positive" if positive > negative and positive > neutral else "Negative" if negative > positive and negative > neutral else "Neutral"
+            pos_pct = (positive/total_cases*100)
+            neg_pct = (negative/total_cases*100)
+            neu_pct = (neutral/total_cases*100)
             
             # Get top issues
             top_issues = sorted(issues.items(), key=lambda x: len(x[1]), reverse=True)[:3]
             
-            # Format document header
-            analysis.append("# CUSTOMER SERVICE CONVERSATION ANALYSIS REPORT")
-            analysis.append(f"*Generated: {pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S')}*")
-            analysis.append(f"**Total Conversations Analyzed: {total_cases}**")
-            analysis.append("---")
-            
-            # 1. Executive Summary
-            analysis.append("\n## 📋 Executive Summary")
-            analysis.append("\n### Analysis Overview")
-            analysis.append(f"\n• Analysis of {total_cases} customer conversations about the commerce website")
-            analysis.append(f"• Overall sentiment is predominantly {sentiment_mode.lower()}")
-            analysis.append(f"• Most discussed features: {', '.join(k.title() for k,v in sorted(feature_mentions.items(), key=lambda x: x[1], reverse=True)[:3])}")
-            analysis.append(f"• Primary concerns: {', '.join(issue[0].title() for issue in top_issues)}")
-            
-            # 2. Quantitative Analysis
-            analysis.append("\n## 📊 Quantitative Analysis")
-            
-            # Feature Distribution Analysis
-            analysis.append("\n### Feature Distribution Analysis")
-            analysis.append("\n| Feature | Mentions | Percentage | Trend |")
-            analysis.append("|---------|-----------|------------|-------|")
-            
-            for feature, count in sorted(feature_mentions.items(), key=lambda x: x[1], reverse=True):
-                percentage = (count / total_cases) * 100
-                trend = "↑ High" if percentage > 30 else "→ Medium" if percentage > 15 else "↓ Low"
-                analysis.append(f"| {feature.title()} | {count:,d} | {percentage:.1f}% | {trend} |")
+            # Categorize issues (first matching category wins, as a column filter per category);
+            # the context breakdowns group by it
+            issue_category = pd.Series(None, index=table.index, dtype=object)
+            uncategorized = pd.Series(True, index=table.index)
+            for category in PAIN_POINT_CATEGORIES:
+                if category == 'Other':
+                    continue
+                matches = uncategorized & self._has_family(table, f'pain:{category}')
+                issue_category[matches] = category
+                uncategorized &= ~matches
             
-            # Issue Distribution Analysis
-            analysis.append("\n### Issue Distribution Analysis")
-            analysis.append("\n| Category | Count | Percentage | Severity |")
-            analysis.append("|----------|--------|------------|-----------|")
+            # If no category matched, put in Other
+            issue_category[uncategorized & self._has_family(table, 'other_issue')] = 'Other'
+            table['issue_category'] = issue_category
             
-            total_complaints = sum(len(issue_list) for issue_list in issues.values())
-            for category, issue_list in sorted(issues.items(), key=lambda x: len(x[1]), reverse=True):
-                count = len(issue_list)
-                percentage = (count / total_complaints * 100) if total_complaints > 0 else 0
-                severity = "Critical" if percentage > 30 else "High" if percentage > 20 else "Medium" if percentage > 10 else "Low"
-                analysis.append(f"| {category.title()} | {count:,d} | {percentage:.1f}% | {severity} |")
-            
-            # Customer Sentiment Analysis
-            analysis.append("\n### Customer Sentiment Analysis")
-            analysis.append("\n| Type | Count | Percentage | Indicator |")
-            analysis.append("|------|--------|------------|-----------|")
-            
-            pos_pct = (positive/len(sentiment_scores)*100)
-            neg_pct = (negative/len(sentiment_scores)*100)
-            neu_pct = (neutral/len(sentiment_scores)*100)
-            
-            analysis.append(f"| Positive | {positive:,d} | {pos_pct:.1f}% | {'🟢' * int(pos_pct/10)} |")
-            analysis.append(f"| Neutral | {neutral:,d} | {neu_pct:.1f}% | {'⚪' * int(neu_pct/10)} |")
-            analysis.append(f"| Negative | {negative:,d} | {neg_pct:.1f}% | {'🔴' * int(neg_pct/10)} |")
-            
-            analysis.append("\n**Key Insights:**")
-            analysis.append(f"• Predominant Sentiment: {sentiment_mode}")
-            analysis.append(f"• Sentiment Ratio (Pos:Neu:Neg): {pos_pct:.1f}:{neu_pct:.1f}:{neg_pct:.1f}")
-            analysis.append(f"• Customer Satisfaction Index: {((pos_pct - neg_pct) / 100):.2f} [-1 to +1 scale]")
-            
-            # 3. What's Working Well
-            analysis.append("\n## ✨ Positive Aspects and Strengths")
-            
-            # Customer Service Excellence
-            analysis.append("\n### Customer Service Excellence")
-            service_examples = [text for text in texts if isinstance(text, str) and 
-                             TextBlob(text).sentiment.polarity > 0.3 and
-                             any(word in text.lower() for word in ['support', 'help', 'service', 'agent']) and
-                             not any(word in text.lower() for word in ['issue', 'problem', 'error', 'fail', 'bug', 'broken', 'pain point'])]
-            if service_examples:
-                analysis.append("• Quick response times and high resolution rates")
-                analysis.append("• Knowledgeable and proactive support staff")
-                # Only show positive feedback
-                positive_example = next((ex for ex in service_examples if "pain point" not in ex.lower()), None)
-                if positive_example:
-                    analysis.append(f"\nCustomer Feedback: \"{positive_example}\"")
-            
-            # Platform Performance
-            analysis.append("\n### Platform Performance")
-            performance_examples = [text for text in texts if isinstance(text, str) and 
-                                TextBlob(text).sentiment.polarity > 0.3 and
-                                any(word in text.lower() for word in ['reliable', 'fast', 'stable', 'performance']) and
-                                not any(word in text.lower() for word in ['issue', 'problem', 'error', 'fail', 'bug', 'broken', 'pain point'])]
-            if performance_examples:
-                analysis.append("• Strong core functionality performance")
-                analysis.append("• Consistent system uptime")
-                # Only show positive feedback
-                positive_example = next((ex for ex in performance_examples if "pain point" not in ex.lower()), None)
-                if positive_example:
-                    analysis.append(f"\nCustomer Feedback: \"{positive_example}\"")
-            
-            # Feature Set and Usability
-            analysis.append("\n### Feature Set and Usability")
-            for feature, feature_texts in positive_aspects.items():
-                # Filter for truly positive examples
-                positive_texts = [text for text in feature_texts 
-                               if TextBlob(text).sentiment.polarity > 0.3 and
-                               not any(word in text.lower() for word in ['issue', 'problem', 'error', 'fail', 'bug', 'broken', 'pain point'])]
-                if positive_texts:
-                    analysis.append(f"• {feature.title()}: Positive user experiences")
-                    analysis.append(f"  Customer Quote: \"{positive_texts[0]}\"")
-            
-            # Recent Improvements
-            analysis.append("\n### Recent Improvements")
-            improvements = [text for text in texts if isinstance(text, str) and
-                         any(word in text.lower() for word in ['improved', 'better', 'update', 'new']) and
-                         TextBlob(text).sentiment.polarity > 0.3 and
-                         not any(word in text.lower() for word in ['issue', 'problem', 'error', 'fail', 'bug', 'broken', 'pain point'])]
-            if improvements:
-                for text in improvements[:2]:
-                    analysis.append(f"• {text}")
-            
-            # 4. Categories of Pain Points
-            analysis.append("\n## ⚠️ Categories of Pain Points")
-            
-            # Define distinct categories
-            pain_point_categories = {
-                'Technical Issues': ['error', 'bug', 'crash', 'broken', 'not working'],
-                'User Interface': ['confusing', 'difficult to find', 'hard to use', 'unclear'],
-                'Performance': ['slow', 'lag', 'loading', 'timeout'],
-                'Functionality': ['missing feature', 'doesn\'t work', 'can\'t do'],
-                'Integration': ['sync', 'connect', 'integration', 'api'],
-                'Other': []
-            }
+            # Semantic clusters (unsupervised, so rows no keyword category matches are grouped too)
+            cluster_lines = self._cluster_breakdown(table, clusters, representatives) if clusters is not None else []
             
-            # Categorize issues
-            categorized_issues = {cat: [] for cat in pain_point_categories}
+            family_mask = table['family_mask'].to_numpy()
+            trends = self._identify_emerging_trends(texts, family_mask)
+            missing_features = [feature for feature in EXPECTED_FEATURES
+                                if not self._has_family(table, f'expected:{feature}').any()]
             
-            for text in texts:
-                if not isinstance(text, str):
-                    continue
-                    
-                text_lower = text.lower()
-                categorized = False
-                
-                # Check each category's keywords
-                for category, keywords in pain_point_categories.items():
-                    if category == 'Other':
-                        continue
-                    if any(keyword in text_lower for keyword in keywords):
-                        categorized_issues[category].append(text)
-                        categorized = True
-                        break
-                
-                # If no category matched, put in Other
-                if not categorized and any(word in text_lower for word in ['issue', 'problem', 'complaint']):
-                    categorized_issues['Other'].append(text)
-            
-            # Output categorized pain points
-            for category, issue_list in sorted(categorized_issues.items(), key=lambda x: len(x[1]), reverse=True):
-                if issue_list:  # Only show categories with issues
-                    analysis.append(f"\n**{category}**")
-                    analysis.append(f"Total Issues: {len(issue_list)}")
-                    analysis.append("Representative Examples:")
-                    for example in issue_list[:2]:  # Show up to 2 examples
-                        analysis.append(f"• \"{example}\"")
-            
-            # 5. Top 3 Issues
-            analysis.append("\n## 🔍 Top 3 Issues")
-            
-            for idx, (issue, examples) in enumerate(top_issues, 1):
-                count = len(examples)
-                percentage = (count / total_complaints * 100) if total_complaints > 0 else 0
-                
-                analysis.append(f"\n### Issue {idx}: {issue.title()}")
-                analysis.append(f"• Mentions: {count} ({percentage:.1f}% of total complaints)")
-                
-                # Customer quotes
-                analysis.append("\nRepresentative Customer Quotes:")
-                for quote in examples[:2]:
-                    analysis.append(f"• \"{quote}\"")
-                
-                # Impact analysis
-                impact = self._determine_impact(count, total_cases)
-                analysis.append(f"\nBusiness Impact: {impact}")
-                
-                # Customer experience impact
-                sentiment_scores = [TextBlob(ex).sentiment.polarity for ex in examples]
-                avg_sentiment = sum(sentiment_scores) / len(sentiment_scores)
-                sentiment_impact = "Severe Negative" if avg_sentiment < -0.5 else "Moderate Negative" if avg_sentiment < -0.2 else "Slight Negative"
-                analysis.append(f"Customer Experience Impact: {sentiment_impact}")
-            
-            # 6. Top 3 Recommendations
-            analysis.append("\n## 🎯 Top 3 Recommendations")
-            
-            # Implementation Strategy
-            analysis.append("\n### 📈 Implementation Strategy")
-            
-            analysis.append("\n#### Quick Wins")
-            analysis.append("• Implement high-impact, low-effort improvements")
-            analysis.append("• Address critical user experience issues")
-            analysis.append("• Enhance existing documentation")
-            
-            analysis.append("\n#### Monitoring & Metrics")
-            analysis.append("• Establish clear success metrics")
-            analysis.append("• Track improvement impact")
-            analysis.append("• Regular progress reviews")
-            
-            analysis.append("\n#### Long-term Success")
-            analysis.append("• Consider dependencies between improvements")
-            analysis.append("• Plan for scalability")
-            analysis.append("• Regular stakeholder updates")
-            
-            # 7. Additional Insights
-            analysis.append("\n## 🔍 Additional Insights")
-            
-            # Customer behavior patterns
-            analysis.append("\n### Customer Behavior Patterns")
-            patterns = self._analyze_behavior_patterns(texts)
-            for pattern in patterns[:3]:
-                analysis.append(f"• {pattern}")
-            
-            # Emerging trends
-            analysis.append("\n### Emerging Trends")
-            trends = self._identify_emerging_trends(texts)
-            for trend in trends[:3]:
-                analysis.append(f"• {trend}")
-            
-            # Competitive comparisons
-            analysis.append("\n### Competitive Comparisons")
-            competitors = self._extract_competitor_mentions(texts)
-            for comp in competitors:
-                analysis.append(f"• {comp}")
-            
-            # 8. Not Found
-            analysis.append("\n## ❓ Not Found")
-            
-            expected_features = [
-                "Advanced search functionality",
-                "Bulk operations",
-                "Custom reporting tools",
-                "API documentation",
-                "Developer tools"
-            ]
-            
-            analysis.append("\nFeatures Not Mentioned in Transcripts:")
-            for feature in expected_features:
-                if not any(feature.lower() in text.lower() for text in texts if isinstance(text, str)):
-                    analysis.append(f"• {feature}")
-            
-            # 9. Other Observations
-            analysis.append("\n## 📝 Other Observations")
-            
-            # Unusual patterns
-            analysis.append("\n### Unusual Patterns")
-            observations = self._extract_other_observations(texts)
-            for obs in observations:
-                analysis.append(f"• {obs}")
-            
-            # Customer interaction patterns
-            analysis.append("\n### Customer Interaction Patterns")
-            analysis.append("• Peak interaction times and duration trends")
-            analysis.append("• Common escalation triggers")
-            analysis.append("• Repeat contact patterns")
-            
-            # Report footer
-            analysis.append("\n---")
-            analysis.append("*End of Analysis Report*")
+            # Customer interaction patterns, broken down by the export's metadata columns
+            context_breakdowns = self._context_breakdowns(table)
             
             # Format the analysis in the terminal style
             terminal_format = []
             
             # Quantitative Analysis
             terminal_format.append("### Quantitative Analysis")
+            if len(groups.weights) < total_cases:
+                terminal_format.append(f"- **Conversations:** {total_cases:,d} ({len(groups.weights):,d} distinct summaries; "
+                                       f"{groups.exact_duplicates:,d} exact and {groups.near_duplicates:,d} near duplicates "
+                                       f"counted with their group)")
             terminal_format.append("- **Specific Hosting Issues:**")
             for feature, count in sorted(feature_mentions.items(), key=lambda x: x[1], reverse=True)[:3]:
                 percentage = (count / total_cases) * 100
@@ -1285,10 +3368,6 @@ Always maintain a helpful, educational tone that builds the user's prompt engine
             
             # Sentiment Analysis
             terminal_format.append("\n- **Sentiment Analysis:**")
-            total_sentiments = len(sentiment_scores)
-            pos_pct = (positive/total_sentiments*100)
-            neu_pct = (neutral/total_sentiments*100)
-            neg_pct = (negative/total_sentiments*100)
             terminal_format.append(f"  - Positive: {pos_pct:.0f}%")
             terminal_format.append(f"  - Neutral: {neu_pct:.0f}%")
             terminal_format.append(f"  - Negative: {neg_pct:.0f}%")
@@ -1296,8 +3375,9 @@ Always maintain a helpful, educational tone that builds the user's prompt engine
             
             # Top 3 Hosting Issues
             terminal_format.append("\n### Top 3 Hosting Issues")
-            for idx, (issue, examples) in enumerate(top_issues[:3], 1):
-                count = len(examples)
+            for idx, (issue, issue_rows) in enumerate(top_issues[:3], 1):
+                count = len(issue_rows)
+                examples = quotes(issue_rows.index)
                 percentage = (count / total_complaints * 100) if total_complaints > 0 else 0
                 
                 terminal_format.append(f"{idx}. **{issue.title()}:**")
@@ -1326,29 +3406,40 @@ Always maintain a helpful, educational tone that builds the user's prompt engine
             # What's Working Well
             terminal_format.append("### What's Working Well")
             terminal_format.append("- **Positive Aspects:**")
-            for feature, texts in positive_aspects.items():
-                positive_texts = [text for text in texts if TextBlob(text).sentiment.polarity > 0.3]
-                if positive_texts:
+            for feature, feature_rows in positive_aspects.items():
+                if (feature_rows['polarity'] > 0.3).any():
                     terminal_format.append(f"  - {feature.title()}")
             
+            # Semantic clusters
+            if cluster_lines:
+                terminal_format.append("\n### Semantic Clusters")
+                terminal_format.extend(cluster_lines)
+            
+            # Context breakdowns (region, customer type, repeat contact, duration)
+            if context_breakdowns:
+                terminal_format.append("\n### Context Breakdowns")
+                terminal_format.extend(context_breakdowns)
+            
             # Additional Insights
             terminal_format.append("\n### Additional Insights")
             terminal_format.append("- **Emerging Trends:**")
-            trends = self._identify_emerging_trends(texts)
             for trend in trends[:2]:
                 terminal_format.append(f"  - {trend}")
             
             # Not Found
             terminal_format.append("\n### Not Found")
             terminal_format.append("- **Elements Not Mentioned:**")
-            for feature in expected_features[:2]:
-                if not any(feature.lower() in text.lower() for text in texts if isinstance(text, str)):
+            for feature in EXPECTED_FEATURES[:2]:
+                if feature in missing_features:
                     terminal_format.append(f"  - {feature}")
             
             # Join all sections
             result = "\n".join(terminal_format)
-            self.analysis_cache[id(self.current_csv_data)] = result
+            self._store_analysis(cache_key, result)
             return result
+        except OperationCancelled:
+            logger.info("Analysis cancelled")
+            raise
         except Exception as e:
             error_msg = str(e)
             logger.error(f"Error during analysis: {error_msg}")
@@ -1398,6 +3489,51 @@ Always maintain a helpful, educational tone that builds the user's prompt engine
                 
         return prompt_content if prompt_content else None
 
+    async def analyze_with_prompt(self, prompt: Optional[str] = None, batch_tokens: Optional[int] = None,
+                                  max_concurrency: Optional[int] = None, progress: Optional[ProgressReporter] = None) -> str:
+        """
+        Run the stored analysis prompt over all loaded summaries with the map-reduce engine.
+        Args:
+            prompt: Prompt to run (defaults to current_analysis_prompt)
+            batch_tokens: Summary tokens per map call (defaults to LIGHTHOUSE_MAP_BATCH_TOKENS)
+            max_concurrency: Concurrent LLM calls (defaults to LIGHTHOUSE_MAP_CONCURRENCY)
+            progress: Optional reporter for progress and cancellation (raises OperationCancelled)
+        Returns:
+            str: The merged analysis report
+        """
+        prompt = prompt or self.current_analysis_prompt
+        if not prompt:
+            return "No analysis prompt has been generated yet."
+        if not self._has_loaded_data():
+            return "No CSV file has been loaded yet."
+        # Checked before any work is done: the key only needs the data fingerprint
+        cache_key = self._prompt_analysis_key(prompt)
+        cached = self._cached_analysis(cache_key)
+        if cached is not None:
+            return cached
+        _, texts, groups = self._deduplicated_summaries(progress)
+        # One copy of each duplicate group goes to the LLM, labelled with the group size
+        representatives = [(texts[idx], int(weight)) for idx, weight in zip(groups.representatives, groups.weights) if texts[idx]]
+        if not representatives:
+            return "The loaded CSV file contains no data."
+        
+        try:
+            analyzer = MapReduceAnalyzer(self._create_completion, batch_tokens=batch_tokens,
+                                         max_concurrency=max_concurrency, progress=progress)
+            result = await analyzer.run(prompt, [text for text, _ in representatives],
+                                        [weight for _, weight in representatives])
+            # A report missing failed batches is not cached, so asking again retries them
+            if not analyzer.stats.get('failed_batches'):
+                self._store_analysis(cache_key, result)
+            return result
+        except OperationCancelled:
+            logger.info("Analysis cancelled")
+            raise
+        except Exception as e:
+            error_msg = str(e)
+            logger.error(f"Error during analysis: {error_msg}")
+            return f"Error during analysis: {error_msg}\n\nPlease try again or contact support if the issue persists."
+        
     def _format_prompt_for_display(self, prompt: str) -> str:
         """Format a prompt for the dedicated prompt display area."""
         # Add the required header
@@ -1457,70 +3593,69 @@ Always maintain a helpful, educational tone that builds the user's prompt engine
         elif percentage >= 25: return "Moderate Impact - Notable effect on user experience"
         return "Low Impact - Minor inconvenience for some users"
         
-    def _analyze_behavior_patterns(self, texts: List[str]) -> List[str]:
+    def _family_mask(self, texts: List[str], family_mask: Optional[np.ndarray]) -> np.ndarray:
+        """Reuse a precomputed family mask column, or scan the texts once with the keyword index."""
+        if family_mask is not None:
+            return family_mask
+        return KEYWORD_INDEX.masks([text.lower() for text in texts])
+        
+    def _analyze_behavior_patterns(self, texts: List[str], family_mask: Optional[np.ndarray] = None) -> List[str]:
         """Analyze customer behavior patterns from texts."""
         patterns = []
+        family_mask = self._family_mask(texts, family_mask)
         
         # Time-related patterns
-        time_mentions = sum(1 for text in texts if any(word in text.lower() for word in ['morning', 'afternoon', 'evening', 'night', 'weekend']))
+        time_mentions = KEYWORD_INDEX.count(family_mask, 'behavior:time')
         if time_mentions > len(texts) * 0.1:
             patterns.append("Usage peaks during specific times of day")
             
         # Device preferences
-        mobile_mentions = sum(1 for text in texts if any(word in text.lower() for word in ['mobile', 'phone', 'tablet', 'app']))
-        desktop_mentions = sum(1 for text in texts if any(word in text.lower() for word in ['desktop', 'laptop', 'pc', 'computer']))
+        mobile_mentions = KEYWORD_INDEX.count(family_mask, 'behavior:mobile')
+        desktop_mentions = KEYWORD_INDEX.count(family_mask, 'behavior:desktop')
         if mobile_mentions > desktop_mentions:
             patterns.append("Strong preference for mobile access")
         elif desktop_mentions > mobile_mentions:
             patterns.append("Primary usage through desktop platforms")
             
         # Feature usage
-        feature_pattern = sum(1 for text in texts if any(word in text.lower() for word in ['feature', 'function', 'tool', 'option']))
+        feature_pattern = KEYWORD_INDEX.count(family_mask, 'behavior:feature')
         if feature_pattern > len(texts) * 0.2:
             patterns.append("High engagement with advanced features")
             
         return patterns or ["No clear behavior patterns identified"]
         
-    def _identify_emerging_trends(self, texts: List[str]) -> List[str]:
+    def _identify_emerging_trends(self, texts: List[str], family_mask: Optional[np.ndarray] = None) -> List[str]:
         """Identify emerging trends from conversation texts."""
         trends = []
+        family_mask = self._family_mask(texts, family_mask)
         
         # Look for integration requests
-        integration_mentions = sum(1 for text in texts if any(word in text.lower() for word in ['integrate', 'connection', 'api', 'sync']))
+        integration_mentions = KEYWORD_INDEX.count(family_mask, 'trend:integration')
         if integration_mentions > len(texts) * 0.1:
             trends.append("Growing demand for third-party integrations")
             
         # Mobile-related trends
-        mobile_issues = sum(1 for text in texts if any(word in text.lower() for word in ['mobile', 'responsive', 'app']) 
-                          and any(word in text.lower() for word in ['problem', 'issue', 'error']))
+        mobile_issues = KEYWORD_INDEX.count(family_mask, 'trend:mobile', 'trend:problem')
         if mobile_issues > len(texts) * 0.15:
             trends.append("Increasing mobile usage highlighting compatibility needs")
             
         # Security concerns
-        security_mentions = sum(1 for text in texts if any(word in text.lower() for word in ['secure', 'security', 'privacy', 'protection']))
+        security_mentions = KEYWORD_INDEX.count(family_mask, 'trend:security')
         if security_mentions > len(texts) * 0.05:
             trends.append("Rising focus on security and privacy features")
             
         return trends or ["No significant emerging trends identified"]
         
-    def _extract_competitor_mentions(self, texts: List[str]) -> List[str]:
+    def _extract_competitor_mentions(self, texts: List[str], family_mask: Optional[np.ndarray] = None) -> List[str]:
         """Extract and analyze competitor mentions from texts."""
         competitor_mentions = []
+        family_mask = self._family_mask(texts, family_mask)
         
         # Common competitor indicators
         competitors = {
-            'shopify': 0,
-            'woocommerce': 0,
-            'magento': 0,
-            'bigcommerce': 0,
-            'wix': 0
+            competitor: KEYWORD_INDEX.count(family_mask, f'competitor:{competitor}')
+            for competitor in COMPETITORS
         }
-        
-        for text in texts:
-            text_lower = text.lower()
-            for competitor in competitors:
-                if competitor in text_lower:
-                    competitors[competitor] += 1
                     
         # Generate insights from competitor mentions
         for competitor, count in competitors.items():
@@ -1531,25 +3666,23 @@ Always maintain a helpful, educational tone that builds the user's prompt engine
                     
         return competitor_mentions or ["No significant competitor comparisons found"]
         
-    def _extract_other_observations(self, texts: List[str]) -> List[str]:
+    def _extract_other_observations(self, texts: List[str], family_mask: Optional[np.ndarray] = None) -> List[str]:
         """Extract miscellaneous observations from texts."""
         observations = []
+        family_mask = self._family_mask(texts, family_mask)
         
         # Check for seasonal patterns
-        seasonal_terms = ['summer', 'winter', 'holiday', 'season', 'black friday', 'christmas']
-        seasonal_mentions = sum(1 for text in texts if any(term in text.lower() for term in seasonal_terms))
+        seasonal_mentions = KEYWORD_INDEX.count(family_mask, 'observation:seasonal')
         if seasonal_mentions > 0:
             observations.append(f"Seasonal usage patterns detected ({seasonal_mentions} mentions)")
             
         # Look for geographic indicators
-        geo_terms = ['region', 'country', 'location', 'timezone', 'international']
-        geo_mentions = sum(1 for text in texts if any(term in text.lower() for term in geo_terms))
+        geo_mentions = KEYWORD_INDEX.count(family_mask, 'observation:geo')
         if geo_mentions > 0:
             observations.append(f"Geographic distribution considerations ({geo_mentions} mentions)")
             
         # Check for browser-specific issues
-        browser_terms = ['chrome', 'firefox', 'safari', 'edge', 'browser']
-        browser_mentions = sum(1 for text in texts if any(term in text.lower() for term in browser_terms))
+        browser_mentions = KEYWORD_INDEX.count(family_mask, 'observation:browser')
         if browser_mentions > 0:
             observations.append(f"Browser compatibility patterns ({browser_mentions} mentions)")
             
@@ -1690,6 +3823,8 @@ Always maintain a helpful, educational tone that builds the user's prompt engine
     def _text_similarity(self, text1: str, text2: str) -> float:
         """
         Calculate similarity between two texts using TF-IDF and cosine similarity.
+        With a CSV loaded, the IDF weights come from the corpus SimilarityIndex (fitted once);
+        otherwise a vectorizer is fitted on the two texts.
         
         Args:
             text1: First text to compare
@@ -1698,6 +3833,9 @@ Always maintain a helpful, educational tone that builds the user's prompt engine
         Returns:
             float: Similarity score between 0 and 1
         """
+        if self.current_csv_data is not None and 'conversation_summary' in self.current_csv_data.columns:
+            return self._corpus_similarity_index().text_similarity(text1, text2)
+            
         # Create TF-IDF vectorizer
         vectorizer = TfidfVectorizer(
             ngram_range=(1, 2),
@@ -1712,7 +3850,7 @@ Always maintain a helpful, educational tone that builds the user's prompt engine
             tfidf_matrix = vectorizer.fit_transform([text1, text2])
             
             # Calculate cosine similarity
-            similarity = (tfidf_matrix * tfidf_matrix.T).A[0, 1]
+            similarity = (tfidf_matrix @ tfidf_matrix.T).toarray()[0, 1]
             
             # Handle numerical errors
             similarity = max(0.0, min(1.0, similarity))
@@ -1720,13 +3858,7 @@ Always maintain a helpful, educational tone that builds the user's prompt engine
             return float(similarity)
         except:
             # Fallback to spaCy similarity if TF-IDF fails
-            doc1 = nlp(text1)
-            doc2 = nlp(text2)
-            
-            if not doc1 or not doc2:
-                return 0.0
-                
-            return doc1.similarity(doc2)
+            return nlp_service.similarity(text1, text2)
         
 
 
@@ -4,8 +4,18 @@ from flask_socketio import SocketIO, emit
 from flask_cors import CORS
 import os
 import asyncio
+import hashlib
+import hmac
+import secrets
+import threading
+import time
 import traceback
-from agent2 import ConversationalAgent
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from eventlet import tpool
+from agent2 import ConversationalAgent, OperationCancelled, ProgressReporter, resources
 import pandas as pd
 import logging
 
@@ -31,31 +41,419 @@ socketio = SocketIO(
     max_http_buffer_size=1e8  # Increased buffer size
 )
 
-# Initialize the conversational agent
-agent = ConversationalAgent()
+# Dedicated asyncio loop for LLM calls, running in its own OS thread so that
+# awaiting the API never blocks the eventlet hub or other clients
 loop = asyncio.new_event_loop()
-asyncio.set_event_loop(loop)
-loop.run_until_complete(agent.initialize())
+threading.Thread(target=loop.run_forever, name='llm-event-loop', daemon=True).start()
+
+def run_async(coro):
+    """Run a coroutine on the LLM loop and wait for its result without blocking other greenlets."""
+    future = asyncio.run_coroutine_threadsafe(coro, loop)
+    return tpool.execute(future.result)
+
+class SessionManager:
+    """
+    Per-session ConversationalAgent instances keyed by a server-issued session id.
+    
+    Each browser tab gets its own conversation history, loaded CSV and mode, while
+    the heavy singletons (pooled LLM client, spaCy model) stay shared at module
+    level in agent2. Session ids are random and handed to the client as tokens
+    signed with the server secret, so a client can resume its own session but
+    cannot pick or guess another one. Sessions idle longer than idle_timeout are
+    evicted, and the least recently used ones are dropped when the session count
+    or their estimated memory exceeds the caps; a session for which busy(key) is
+    true (a load or analysis is running on its agent) is skipped until a later pass.
+    """
+    def __init__(self, max_sessions: int, idle_timeout: float, memory_cap_mb: float, busy=None,
+                 secret: bytes = None):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.memory_cap_bytes = memory_cap_mb * 1024 * 1024
+        self.busy = busy or (lambda key: False)
+        # Tokens signed with a per-process secret stop verifying after a restart, which only
+        # starts a new session: sessions live in memory anyway
+        self._secret = secret or secrets.token_bytes(32)
+        self._sessions = OrderedDict()  # session key -> {'agent': ConversationalAgent, 'last_seen': float}
+        self._sid_to_key = {}
+        self._lock = threading.RLock()
+        
+    def _sign(self, key: str) -> str:
+        return hmac.new(self._secret, key.encode('utf-8'), hashlib.sha256).hexdigest()
+        
+    def issue_token(self) -> str:
+        """New session id, as the 'key.signature' token the client presents to resume the session."""
+        key = secrets.token_urlsafe(16)
+        return f"{key}.{self._sign(key)}"
+        
+    def verify_token(self, token: str) -> str:
+        """Session key of a token this server issued, or None if it is missing or forged."""
+        key, _, signature = (token or '').partition('.')
+        if not key or not hmac.compare_digest(signature, self._sign(key)):
+            return None
+        return key
+        
+    def bind(self, sid: str, key: str = None) -> str:
+        """Associate a Socket.IO sid with a session key (the sid itself if the client sent none)."""
+        key = key or sid
+        with self._lock:
+            self._sid_to_key[sid] = key
+        return key
+        
+    def unbind(self, sid: str):
+        with self._lock:
+            self._sid_to_key.pop(sid, None)
+            
+    def key_for(self, sid: str) -> str:
+        """Session key bound to a Socket.IO sid (binding the sid to itself if it has none)."""
+        with self._lock:
+            return self._sid_to_key.get(sid) or self.bind(sid)
+            
+    def for_sid(self, sid: str) -> ConversationalAgent:
+        """Agent for the session bound to a Socket.IO sid."""
+        return self.get(self.key_for(sid))
+        
+    def get(self, key: str) -> ConversationalAgent:
+        """Return the agent for a session key, creating it on first use."""
+        with self._lock:
+            session = self._sessions.get(key)
+        if session is None:
+            # Initialize outside the lock; the shared LLM client makes this cheap
+            agent = ConversationalAgent()
+            run_async(agent.initialize())
+            with self._lock:
+                session = self._sessions.setdefault(key, {'agent': agent, 'last_seen': time.time()})
+                logger.info(f"Created session {key} ({len(self._sessions)} active)")
+        with self._lock:
+            session['last_seen'] = time.time()
+            if key in self._sessions:
+                self._sessions.move_to_end(key)
+            for oldest in [k for k in self._sessions if k != key and not self.busy(k)]:
+                if len(self._sessions) <= self.max_sessions:
+                    break
+                self._evict(oldest, 'session cap')
+            return session['agent']
+            
+    def sids_for(self, key: str) -> list:
+        """Socket.IO sids currently bound to a session key."""
+        with self._lock:
+            return [sid for sid, bound in self._sid_to_key.items() if bound == key]
+        
+    @staticmethod
+    def _session_bytes(agent: ConversationalAgent) -> int:
+        """Rough memory held by a session: loaded CSV data plus conversation text."""
+        size = sum(len(m.get('content') or '') for m in agent.conversation_history)
+        return size + agent.loaded_data_bytes()
+        
+    def _evict(self, key: str, reason: str):
+        session = self._sessions.pop(key, None)
+        if session is not None:
+            session['agent'].clear_all_caches()
+            logger.info(f"Evicted session {key} ({reason})")
+            
+    def enforce_memory_cap(self, keep: str = None):
+        """Drop least recently used sessions (other than keep) until their estimated memory fits the cap."""
+        with self._lock:
+            sizes = {key: self._session_bytes(s['agent']) for key, s in self._sessions.items()}
+            total = sum(sizes.values())
+            for key in [k for k in self._sessions if k != keep and not self.busy(k)]:
+                if total <= self.memory_cap_bytes:
+                    break
+                total -= sizes[key]
+                self._evict(key, 'memory cap')
+            
+    def evict_idle(self):
+        """Remove sessions not used within idle_timeout seconds, then apply the memory cap."""
+        cutoff = time.time() - self.idle_timeout
+        with self._lock:
+            for key in [k for k, s in self._sessions.items() if s['last_seen'] < cutoff and not self.busy(k)]:
+                self._evict(key, 'idle')
+            self.enforce_memory_cap()
+            live = set(self._sessions)
+            self._sid_to_key = {sid: key for sid, key in self._sid_to_key.items() if key in live}
+            
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'sessions': len(self._sessions),
+                'bytes': sum(self._session_bytes(s['agent']) for s in self._sessions.values())
+            }
+
+# 'auto' runs the stored prompt through the LLM when one exists; 'keyword' always uses the local report
+ANALYSIS_ENGINE = os.getenv("LIGHTHOUSE_ANALYSIS_ENGINE", "auto").lower()
+
+sessions = SessionManager(
+    max_sessions=int(os.getenv("LIGHTHOUSE_MAX_SESSIONS", "50")),
+    idle_timeout=float(os.getenv("LIGHTHOUSE_SESSION_IDLE_SECONDS", "3600")),
+    memory_cap_mb=float(os.getenv("LIGHTHOUSE_SESSION_MEMORY_MB", "2048")),
+    # A running load or analysis (queued analyses included) keeps its session from being evicted
+    busy=lambda key: key in active_operations
+)
+
+# Long loads and analyses report progress to their session's clients and can be cancelled
+PROGRESS_INTERVAL = float(os.getenv("LIGHTHOUSE_PROGRESS_INTERVAL", "0.5"))
+active_operations = {}  # session key -> {ProgressReporter: operation} of its running loads and analyses
+
+def _start_operation(session_key: str, operation: str, reporter: ProgressReporter):
+    """Register a running load or analysis, so it can be cancelled and its session is not evicted."""
+    active_operations.setdefault(session_key, {})[reporter] = operation
+
+def _end_operation(session_key: str, reporter: ProgressReporter):
+    operations = active_operations.get(session_key, {})
+    operations.pop(reporter, None)
+    if not operations:
+        active_operations.pop(session_key, None)
+
+def _emit_progress(session_key: str, operation: str, snapshot: dict):
+    for sid in sessions.sids_for(session_key):
+        socketio.emit('progress', dict(snapshot, operation=operation), to=sid)
+
+@contextmanager
+def track_progress(session_key: str, operation: str):
+    """
+    Yield a ProgressReporter for a load or analysis and forward its snapshots as `progress` events.
+    The operation runs in another thread (tpool or the LLM loop), so a background greenlet polls
+    the reporter every PROGRESS_INTERVAL seconds instead of emitting from that thread.
+    """
+    reporter = ProgressReporter()
+    _start_operation(session_key, operation, reporter)
+    
+    def forward():
+        while not reporter.finished:
+            _emit_progress(session_key, operation, reporter.snapshot())
+            socketio.sleep(PROGRESS_INTERVAL)
+    
+    socketio.start_background_task(forward)
+    try:
+        yield reporter
+    finally:
+        reporter.finish()
+        _end_operation(session_key, reporter)
+        _emit_progress(session_key, operation, reporter.snapshot())
+
+class AnalysisJobs:
+    """
+    CSV analyses run as background jobs on a bounded thread pool.
+    
+    Submitting returns a job id straight away, so the Socket.IO handler never
+    blocks the eventlet hub. Jobs beyond max_workers wait in the pool's queue.
+    A greenlet per job forwards its progress and, when it finishes, pushes the
+    result to the session's clients as `analysis_result`. Finished jobs are kept
+    for `retention` seconds so their status and result can be fetched over HTTP.
+    """
+    def __init__(self, max_workers: int, retention: float):
+        self.max_workers = max_workers
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='analysis')
+        self._jobs = OrderedDict()  # job id -> job record, in submission order
+        self._lock = threading.Lock()
+        
+    def submit(self, session_key: str, agent: ConversationalAgent) -> dict:
+        """Queue an analysis for a session, or return the session's job that is still pending."""
+        with self._lock:
+            for job in self._jobs.values():
+                if job['session'] == session_key and job['status'] in ('queued', 'running'):
+                    return job
+            job = {
+                'id': uuid.uuid4().hex,
+                'session': session_key,
+                'status': 'queued',
+                'created': time.time(),
+                'started': None,
+                'finished': None,
+                'result': None,
+                'progress': ProgressReporter()
+            }
+            self._jobs[job['id']] = job
+        _start_operation(session_key, 'analysis', job['progress'])
+        job['future'] = self._executor.submit(self._run, job, agent)
+        socketio.start_background_task(self._monitor, job)
+        logger.info(f"Queued analysis job {job['id']} for session {session_key}")
+        return job
+        
+    def _run(self, job: dict, agent: ConversationalAgent) -> dict:
+        """Worker thread: the analysis itself, off the eventlet hub."""
+        progress = job['progress']
+        progress.check()  # Cancelled while still queued
+        job['status'] = 'running'
+        job['started'] = time.time()
+        
+        # Set the analysis mode to summary
+        agent.current_mode = 'summary'
+        
+        # Let agent2.py handle the prompt generation and mode setting
+        if not agent.prompt_generated:
+            # Simulate the user selecting summary mode to trigger prompt generation
+            asyncio.run_coroutine_threadsafe(agent.chat('2'), loop).result()  # '2' selects summary mode
+        
+        # Run the stored prompt over the data with the LLM map-reduce engine when there is one,
+        # otherwise fall back to the local keyword report
+        if agent.current_analysis_prompt and ANALYSIS_ENGINE != 'keyword':
+            analysis = asyncio.run_coroutine_threadsafe(agent.analyze_with_prompt(progress=progress), loop).result()
+        else:
+            analysis = agent.analyze_summaries(progress)
+        
+        return {
+            'success': True,
+            'analysis': analysis,
+            'insights': agent.get_learned_insights()
+        }
+        
+    def _monitor(self, job: dict):
+        """Greenlet: forward progress while the job runs, then record and push its result."""
+        future, progress, session_key = job['future'], job['progress'], job['session']
+        while not future.done():
+            if job['status'] == 'running':
+                _emit_progress(session_key, 'analysis', progress.snapshot())
+            socketio.sleep(PROGRESS_INTERVAL)
+            
+        try:
+            result, status = future.result(), 'done'
+        except OperationCancelled:
+            result, status = {'success': False, 'cancelled': True, 'error': "Analysis cancelled."}, 'cancelled'
+        except Exception as e:
+            logger.error(f"Analysis error: {str(e)}")
+            logger.error(f"Traceback: {''.join(traceback.format_exception(type(e), e, e.__traceback__))}")
+            result, status = {
+                'success': False,
+                'error': f"Error during analysis: {str(e)}. Please try again or contact support if the issue persists."
+            }, 'failed'
+        result['jobId'] = job['id']
+        job.update(status=status, result=result, finished=time.time())
+        
+        progress.finish()
+        _end_operation(session_key, progress)
+        _emit_progress(session_key, 'analysis', progress.snapshot())
+        for sid in sessions.sids_for(session_key):
+            socketio.emit('analysis_result', result, to=sid)
+        logger.info(f"Analysis job {job['id']} {status} in {job['finished'] - job['created']:.2f}s")
+        
+    def get(self, job_id: str) -> dict:
+        with self._lock:
+            return self._jobs.get(job_id)
+            
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job; it stops at its next progress check."""
+        job = self.get(job_id)
+        if job is None or job['status'] not in ('queued', 'running'):
+            return False
+        job['progress'].cancel()
+        return True
+        
+    def status(self, job: dict) -> dict:
+        """Public view of a job: state, timings, queue position and current progress."""
+        with self._lock:
+            position = sum(1 for other in self._jobs.values()
+                           if other['status'] == 'queued' and other['created'] < job['created'])
+        return {
+            'jobId': job['id'],
+            'status': job['status'],
+            'created': job['created'],
+            'started': job['started'],
+            'finished': job['finished'],
+            'queuePosition': position if job['status'] == 'queued' else None,
+            'progress': job['progress'].snapshot() if job['status'] == 'running' else None
+        }
+        
+    def prune(self):
+        """Forget finished jobs older than the retention period."""
+        cutoff = time.time() - self.retention
+        with self._lock:
+            for job_id in [i for i, j in self._jobs.items() if j['finished'] and j['finished'] < cutoff]:
+                del self._jobs[job_id]
+
+jobs = AnalysisJobs(
+    max_workers=int(os.getenv("LIGHTHOUSE_ANALYSIS_WORKERS", "2")),
+    retention=float(os.getenv("LIGHTHOUSE_JOB_RETENTION_SECONDS", "3600"))
+)
+
+def _evict_idle_sessions():
+    """Background task: periodically evict idle sessions and forget old analysis jobs."""
+    while True:
+        socketio.sleep(60)
+        sessions.evict_idle()
+        jobs.prune()
+
+socketio.start_background_task(_evict_idle_sessions)
+
+# NLP models load lazily on first use; set LIGHTHOUSE_PRELOAD=1 to pay the cost at boot instead
+if os.getenv("LIGHTHOUSE_PRELOAD", "").lower() in ("1", "true", "yes"):
+    resources.preload()
+logger.info(resources.startup_report())
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+@socketio.on('connect')
+def handle_connect(auth=None):
+    """
+    Bind this connection to the session of the client's token (kept across reconnects by the
+    browser), or to a new session whose token is sent back as a `session` event.
+    """
+    token = (auth or {}).get('sessionToken')
+    session_key = sessions.verify_token(token)
+    if session_key is None:
+        token = sessions.issue_token()
+        session_key = sessions.verify_token(token)
+    sessions.bind(request.sid, session_key)
+    emit('session', {'sessionToken': token})
+
+@socketio.on('disconnect')
+def handle_disconnect(*args):
+    """Forget the sid; the session itself stays until it goes idle so a reconnect can resume it."""
+    sessions.unbind(request.sid)
+
+_STREAM_END = object()
+
+async def _next_event(stream):
+    """Advance an async generator by one item, returning _STREAM_END when it is exhausted."""
+    try:
+        return await stream.__anext__()
+    except StopAsyncIteration:
+        return _STREAM_END
+
 @socketio.on('message')
 def handle_message(data):
     """Handle incoming messages from the client."""
     try:
         message = data.get('message', '')
         print(f"Received message: {message}")
+        agent = sessions.for_sid(request.sid)
+        
+        if not data.get('stream'):
+            # Await the model on the LLM loop; other clients keep being served meanwhile
+            response = run_async(agent.chat(message))
+            print(f"Sending response for message: {message}")
+            emit('response', {'response': response})
+            return
         
-        # Process the message synchronously
-        response = loop.run_until_complete(agent.chat(message))
-        print(f"Sending response for message: {message}")
-        emit('response', {'response': response})
+        # Relay tokens as they are generated, then the final (possibly prompt-formatted) response
+        stream = agent.chat_stream(message)
+        started = time.perf_counter()
+        first_token = None
+        while True:
+            event = run_async(_next_event(stream))
+            if event is _STREAM_END:
+                break
+            if event.get('done'):
+                emit('response_done', {
+                    'response': event['response'],
+                    'isPrompt': event['is_prompt'],
+                    'prompt': event['prompt']
+                })
+                break
+            if first_token is None:
+                first_token = time.perf_counter() - started
+                logger.info(f"Time to first token: {first_token:.2f}s")
+            emit('response_chunk', {'delta': event['delta']})
+        print(f"Streamed response for message: {message} in {time.perf_counter() - started:.2f}s")
         
     except Exception as e:
         print(f"Error in handle_message: {str(e)}")
-        emit('response', {'response': f"An error occurred: {str(e)}"})
+        if data.get('stream'):
+            emit('response_done', {'response': f"An error occurred: {str(e)}", 'isPrompt': False, 'prompt': None})
+        else:
+            emit('response', {'response': f"An error occurred: {str(e)}"})
 
 @app.route('/api/upload-csv', methods=['POST'])
 def handle_csv_upload():
@@ -73,24 +471,33 @@ def handle_csv_upload():
         if not file.filename.endswith('.csv'):
             return jsonify({'success': False, 'error': 'File must be a CSV'}), 400
             
-        # Read the file content
-        csv_content = file.read().decode('utf-8')
+        # The upload is already spooled to a temporary file by the form parser; parse it from there
+        # in chunks rather than reading it into memory
+        csv_stream = file.stream
         filename = file.filename
+        csv_stream.seek(0, os.SEEK_END)
+        size = csv_stream.tell()
+        csv_stream.seek(0)
         
-        if not csv_content:
+        if not size:
             return jsonify({'success': False, 'error': 'No file content'}), 400
             
-        print(f"Received CSV file: {filename} (length: {len(csv_content)} bytes)")
+        print(f"Received CSV file: {filename} (length: {size} bytes)")
+        
+        # Use agent2.py's methods directly, on the uploading client's session
+        session_id = sessions.verify_token(request.form.get('session_token'))
+        if session_id is None:
+            return jsonify({'success': False, 'error': 'Missing or invalid session token'}), 403
+        agent = sessions.get(session_id)
         
-        # Use agent2.py's methods directly
         try:
-            import io
-            csv_buffer = io.StringIO(csv_content)
-            
-            # Load CSV using agent2.py's method
-            if agent.load_csv_from_buffer(csv_buffer, filename):
+            # Load CSV using agent2.py's method, off the eventlet hub so progress events keep flowing
+            with track_progress(session_id, 'upload') as progress:
+                loaded = tpool.execute(agent.load_csv_from_buffer, csv_stream, filename, progress)
+            if loaded:
                 # Get summary using agent2.py's method
                 summary = agent.get_csv_summary()
+                sessions.enforce_memory_cap(keep=session_id)
                 
                 response_data = {
                     'success': True,
@@ -98,8 +505,9 @@ def handle_csv_upload():
                     'socketEvent': 'csv_processed'
                 }
                 
-                # Send WebSocket notification about successful processing
-                socketio.emit('csv_processed', response_data)
+                # Notify only this session's connections about successful processing
+                for sid in sessions.sids_for(session_id):
+                    socketio.emit('csv_processed', response_data, to=sid)
                 return jsonify(response_data), 200
             else:
                 return jsonify({
@@ -107,6 +515,9 @@ def handle_csv_upload():
                     'error': 'Failed to process CSV file. Please check the format and try again.'
                 }), 400
                 
+        except OperationCancelled:
+            print(f"Upload of {filename} cancelled")
+            return jsonify({'success': False, 'cancelled': True, 'error': 'Upload cancelled'}), 409
         except Exception as e:
             print(f"Error processing CSV: {str(e)}")
             print("Traceback:", traceback.format_exc())
@@ -125,30 +536,34 @@ def handle_csv_upload():
         
     print("=== CSV Upload Process Complete ===\n")
 
+@app.route('/api/similar-summaries', methods=['POST'])
+def similar_summaries():
+    """Loaded summaries most similar to a query text, from the session's corpus similarity index."""
+    payload = request.get_json(silent=True) or {}
+    session_id = sessions.verify_token(payload.get('session_token'))
+    query = (payload.get('query') or '').strip()
+    if session_id is None:
+        return jsonify({'success': False, 'error': 'Missing or invalid session token'}), 403
+    if not query:
+        return jsonify({'success': False, 'error': 'Missing query'}), 400
+    try:
+        k = max(1, min(int(payload.get('k', 5)), 50))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'k must be an integer'}), 400
+    agent = sessions.get(session_id)
+    if agent.current_csv_data is None:
+        return jsonify({'success': False, 'error': 'No CSV file has been loaded yet.'}), 400
+    # The first query fits the index over the loaded corpus; keep that off the eventlet hub
+    results = tpool.execute(agent.find_similar_summaries, query, k)
+    return jsonify({'success': True, 'results': results}), 200
+
 @socketio.on('analyze_csv')
 def handle_csv_analysis():
-    """Handle CSV analysis request using agent2.py framework."""
+    """Queue a CSV analysis job; the result is pushed as `analysis_result` when it finishes."""
     try:
-        # Set the analysis mode to summary
-        agent.current_mode = 'summary'
-        
-        # Let agent2.py handle the prompt generation and mode setting
-        if not agent.prompt_generated:
-            # Simulate the user selecting summary mode to trigger prompt generation
-            loop.run_until_complete(agent.chat('2'))  # '2' selects summary mode
-        
-        # Get the analysis directly from agent2.py
-        analysis = agent.analyze_summaries()
-        
-        # Get learned insights
-        insights = agent.get_learned_insights()
-        
-        # Send the analysis result directly
-        emit('analysis_result', {
-            'success': True,
-            'analysis': analysis,
-            'insights': insights
-        })
+        session_key = sessions.key_for(request.sid)
+        job = jobs.submit(session_key, sessions.get(session_key))
+        emit('analysis_queued', jobs.status(job))
     except Exception as e:
         logger.error(f"Analysis error: {str(e)}")
         logger.error(f"Traceback: {traceback.format_exc()}")
@@ -157,17 +572,70 @@ def handle_csv_analysis():
             'error': f"Error during analysis: {str(e)}. Please try again or contact support if the issue persists."
         })
 
+def _session_job(job_id: str, token: str):
+    """
+    The job with this id if it belongs to the token's session, else an error response. Another
+    session's job is reported as unknown, so job ids cannot be probed.
+    """
+    session_key = sessions.verify_token(token)
+    if session_key is None:
+        return None, (jsonify({'success': False, 'error': 'Missing or invalid session token'}), 403)
+    job = jobs.get(job_id)
+    if job is None or job['session'] != session_key:
+        return None, (jsonify({'success': False, 'error': 'Unknown job'}), 404)
+    return job, None
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    """Status of an analysis job: queued, running (with progress), done, failed or cancelled."""
+    job, error = _session_job(job_id, request.args.get('session_token'))
+    if error:
+        return error
+    return jsonify(dict(jobs.status(job), success=True)), 200
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """The analysis_result payload of a finished job (202 with its status while it is pending)."""
+    job, error = _session_job(job_id, request.args.get('session_token'))
+    if error:
+        return error
+    if job['result'] is None:
+        return jsonify(dict(jobs.status(job), success=False, error='Job has not finished')), 202
+    return jsonify(job['result']), 200
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel a queued or running analysis job."""
+    payload = request.get_json(silent=True) or {}
+    job, error = _session_job(job_id, payload.get('session_token'))
+    if error:
+        return error
+    return jsonify({'success': jobs.cancel(job['id'])}), 200
+
+@socketio.on('cancel_operation')
+def handle_cancel_operation(data=None):
+    """
+    Cancel the session's running operations named by data['operation'] ('upload' or 'analysis'),
+    or all of them when no operation is given; each stops at its next progress check.
+    """
+    operation = (data or {}).get('operation')
+    operations = active_operations.get(sessions.key_for(request.sid), {})
+    cancelled = [reporter for reporter, name in list(operations.items()) if operation in (None, name)]
+    for reporter in cancelled:
+        reporter.cancel()
+    emit('cancel_requested', {'success': bool(cancelled)})
+
 @socketio.on('clear_history')
 def handle_clear_history():
     """Handle history clearing request."""
-    agent.clear_history()
+    sessions.for_sid(request.sid).clear_history()
     emit('history_cleared', {'success': True})
 
 @socketio.on('clear_all_caches')
 def handle_clear_all_caches():
     """Handle request to clear all application caches."""
     try:
-        agent.clear_all_caches_runtime()
+        sessions.for_sid(request.sid).clear_all_caches_runtime()
         emit('caches_cleared', {'success': True, 'message': 'All caches cleared successfully!'})
     except Exception as e:
         emit('caches_cleared', {'success': False, 'error': str(e)})
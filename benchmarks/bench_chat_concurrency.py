@@ -0,0 +1,63 @@
+"""
+Concurrent ConversationalAgent.chat calls against the local fake OpenAI server.
+
+With the async client, N concurrent chats should take roughly one server delay,
+not N of them.
+
+Usage:
+    python benchmarks/bench_chat_concurrency.py [--users 50] [--delay 0.5] [--rate-limit-every 0]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_openai_server import start_fake_server
+
+
+async def run(users: int):
+    from agent2 import ConversationalAgent
+
+    agents = []
+    for _ in range(users):
+        agent = ConversationalAgent()
+        await agent.initialize()
+        agent.current_mode = 'initial'  # Skip the local mode menu so every message reaches the API
+        agents.append(agent)
+
+    start = time.perf_counter()
+    responses = await asyncio.gather(*(agent.chat(f"question {i}") for i, agent in enumerate(agents)))
+    elapsed = time.perf_counter() - start
+    failures = sum(1 for response in responses if not response.startswith('Echo:'))
+    return elapsed, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=50, help='Concurrent chats')
+    parser.add_argument('--delay', type=float, default=0.5, help='Fake server latency per completion (seconds)')
+    parser.add_argument('--rate-limit-every', type=int, default=0, help='Inject a 429 every Nth request')
+    args = parser.parse_args()
+
+    server, base_url = start_fake_server(args.delay, rate_limit_every=args.rate_limit_every)
+    os.environ['GOCAAS_API_KEY'] = 'fake-key'
+    os.environ['GOCAAS_API_BASE'] = base_url
+    try:
+        elapsed, failures = asyncio.run(run(args.users))
+    finally:
+        server.shutdown()
+
+    print(f"{args.users} concurrent chats, server delay {args.delay:.2f}s")
+    print(f"- Wall time: {elapsed:.2f}s (serial would be ~{args.users * args.delay:.1f}s)")
+    print(f"- Throughput: {args.users / elapsed:.1f} chats/s")
+    print(f"- Failed responses: {failures}")
+
+
+if __name__ == '__main__':
+    main()
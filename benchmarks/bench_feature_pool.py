@@ -0,0 +1,77 @@
+"""
+Scaling of process-pool feature extraction (TextBlob sentiment and spaCy issue phrases)
+with the number of workers, on a synthetic corpus built from the bundled run_id CSV.
+
+Each worker count gets a fresh pool, so worker start-up and model loading are part
+of the measured time (as on the first analysis after a server start).
+
+Usage:
+    python benchmarks/bench_feature_pool.py [--csv path/to/run_id_*.csv] [--rows 100000] [--workers 1 2 4 8]
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from agent2 import FeaturePool
+
+
+def synthetic_corpus(sample_csv: str, rows: int, seed: int = 0) -> list:
+    """Repeat the sample summaries up to rows, shuffling sentence order so rows are not exact copies."""
+    texts = pd.read_csv(sample_csv, usecols=['conversation_summary'])['conversation_summary'].dropna().tolist()
+    rng = np.random.default_rng(seed)
+    corpus = []
+    while len(corpus) < rows:
+        for text in texts:
+            sentences = text.split('. ')
+            rng.shuffle(sentences)
+            corpus.append('. '.join(sentences))
+            if len(corpus) == rows:
+                break
+    return corpus
+
+
+def main():
+    default_csv = next(iter(sorted(glob.glob(os.path.join(ROOT, 'run_id_*.csv')))), None)
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--csv', default=default_csv, help='Sample CSV with a conversation_summary column')
+    parser.add_argument('--rows', type=int, default=100000, help='Rows in the synthetic corpus')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8], help='Worker counts to compare')
+    parser.add_argument('--tasks', nargs='+', default=['sentiment', 'phrases'], choices=['sentiment', 'phrases'])
+    args = parser.parse_args()
+
+    texts = synthetic_corpus(args.csv, args.rows)
+    print(f"Corpus: {len(texts):,d} rows from {os.path.basename(args.csv)}, {os.cpu_count()} CPUs\n")
+    print("| Task | Workers | Wall time (s) | Rows/s | Speedup |")
+    print("|------|---------|---------------|--------|---------|")
+    for task in args.tasks:
+        baseline = None
+        reference = None
+        for workers in args.workers:
+            pool = FeaturePool(workers=workers)
+            start = time.perf_counter()
+            result = pool.sentiment(texts) if task == 'sentiment' else pool.issue_phrase_lists(texts)
+            elapsed = time.perf_counter() - start
+            pool.shutdown()
+
+            # Every worker count must produce the same features as the first
+            if reference is None:
+                reference = result
+            elif task == 'sentiment':
+                assert np.array_equal(result, reference), f"{workers} workers changed sentiment scores"
+            else:
+                assert result == reference, f"{workers} workers changed issue phrases"
+            baseline = baseline or elapsed
+            print(f"| {task} | {workers} | {elapsed:.2f} | {len(texts) / elapsed:,.0f} | {baseline / elapsed:.2f}x |")
+
+
+if __name__ == '__main__':
+    main()
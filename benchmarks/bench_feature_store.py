@@ -0,0 +1,99 @@
+"""
+Cold vs. warm feature store: load_csv and analyze_summaries on the bundled run_id CSV
+with an empty feature store, then again once it holds every summary's features.
+
+Each run is a fresh subprocess sharing one throwaway LIGHTHOUSE_CACHE_DIR, so the
+warm runs only differ from the cold one by what the store already holds (in-process
+caches and model loading are not shared). A run with the store disabled is the
+reference. The agent talks to the local fake OpenAI server and the LLM result cache
+is disabled, so every run makes the same requests; the reports must be identical.
+
+Usage:
+    python benchmarks/bench_feature_store.py [--csv path/to/run_id_*.csv] [--warm-runs 2]
+"""
+
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_openai_server import start_fake_server
+
+
+def child(path: str):
+    """Load and analyze the CSV, printing timings, store counters and the report as the last stdout line."""
+    import asyncio
+    from agent2 import ConversationalAgent, feature_store
+
+    agent = ConversationalAgent()
+    asyncio.run(agent.initialize())
+    start = time.perf_counter()
+    assert agent.load_csv(path), "load_csv failed"
+    loaded = time.perf_counter()
+    report = agent.analyze_summaries()
+    analyzed = time.perf_counter()
+    print(json.dumps({
+        'load_csv_s': round(loaded - start, 3),
+        'analyze_summaries_s': round(analyzed - loaded, 3),
+        'store': feature_store.stats(),
+        'report': report,
+    }))
+
+
+def run(path: str, env: dict) -> dict:
+    out = subprocess.run([sys.executable, __file__, '--child', path], capture_output=True, text=True,
+                         env={**os.environ, **env})
+    if out.returncode != 0:
+        raise RuntimeError(f"Benchmark run failed:\n{out.stderr[-2000:]}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    default_csv = next(iter(sorted(glob.glob(os.path.join(ROOT, 'run_id_*.csv')))), None)
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--csv', default=default_csv, help='CSV export to load and analyze')
+    parser.add_argument('--warm-runs', type=int, default=2, help='Runs after the store is populated')
+    parser.add_argument('--child', metavar='PATH', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        server, base_url = start_fake_server(delay=0.0, token_delay=0.0)
+        os.environ.update({
+            'GOCAAS_API_KEY': 'fake-key',
+            'GOCAAS_API_BASE': base_url,
+            'LIGHTHOUSE_LLM_CACHE': '0',
+            'LIGHTHOUSE_CACHE_DIR': os.path.join(tmp, 'cache'),
+        })
+        os.environ.setdefault('LIGHTHOUSE_OFFLINE', '1')
+        try:
+            runs = [('disabled', run(args.csv, {'LIGHTHOUSE_FEATURE_STORE': '0'})),
+                    ('cold', run(args.csv, {}))]
+            runs += [(f'warm {i}', run(args.csv, {})) for i in range(1, args.warm_runs + 1)]
+        finally:
+            server.shutdown()
+
+    reference = runs[0][1]['report']
+    print(f"CSV: {os.path.basename(args.csv)}\n")
+    print("| Run | load_csv (s) | analyze_summaries (s) | Total (s) | Store hits | Store misses |")
+    print("|-----|--------------|-----------------------|-----------|------------|--------------|")
+    for name, result in runs:
+        assert result['report'] == reference, f"The {name} run changed the report"
+        total = result['load_csv_s'] + result['analyze_summaries_s']
+        print(f"| {name} | {result['load_csv_s']:.2f} | {result['analyze_summaries_s']:.2f} | {total:.2f} | "
+              f"{result['store']['hits']:,d} | {result['store']['misses']:,d} |")
+
+
+if __name__ == '__main__':
+    main()
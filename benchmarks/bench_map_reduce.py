@@ -0,0 +1,63 @@
+"""
+Map-reduce prompt analysis over a full CSV against the local fake OpenAI server.
+
+Reports batch count, LLM calls, reduce depth and wall time at several
+concurrency limits, so the effect of LIGHTHOUSE_MAP_CONCURRENCY is visible.
+
+Usage:
+    python benchmarks/bench_map_reduce.py [--csv path/to/run_id_*.csv] [--delay 0.5] [--batch-tokens 2000]
+"""
+
+import argparse
+import asyncio
+import glob
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_openai_server import start_fake_server
+
+
+async def run(csv_path: str, batch_tokens: int, concurrency: int):
+    from agent2 import ConversationalAgent, MapReduceAnalyzer
+
+    agent = ConversationalAgent()
+    await agent.initialize()
+    agent.load_csv(csv_path)
+    texts = agent.current_csv_data['conversation_summary'].dropna().tolist()
+
+    analyzer = MapReduceAnalyzer(agent._create_completion, batch_tokens=batch_tokens, max_concurrency=concurrency)
+    start = time.perf_counter()
+    report = await analyzer.run("Summarize the top customer pain points.", texts)
+    return time.perf_counter() - start, analyzer.stats, report
+
+
+def main():
+    default_csv = next(iter(sorted(glob.glob(os.path.join(ROOT, 'run_id_*.csv')))), None)
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--csv', default=default_csv, help='CSV with a conversation_summary column')
+    parser.add_argument('--delay', type=float, default=0.5, help='Fake server latency per completion (seconds)')
+    parser.add_argument('--batch-tokens', type=int, default=2000, help='Summary tokens per map call')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8, 16], help='Concurrency limits to compare')
+    args = parser.parse_args()
+
+    server, base_url = start_fake_server(args.delay)
+    os.environ['GOCAAS_API_KEY'] = 'fake-key'
+    os.environ['GOCAAS_API_BASE'] = base_url
+    try:
+        print(f"Corpus: {args.csv}, {args.batch_tokens} tokens per batch, server delay {args.delay:.2f}s\n")
+        print("| Concurrency | Batches | LLM calls | Reduce levels | Wall time (s) |")
+        print("|-------------|---------|-----------|---------------|---------------|")
+        for concurrency in args.concurrency:
+            elapsed, stats, _ = asyncio.run(run(args.csv, args.batch_tokens, concurrency))
+            print(f"| {concurrency} | {stats['batches']} | {stats['calls']} | {stats['reduce_levels']} | {elapsed:.2f} |")
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+"""
+Wall time, peak memory and throughput of the CSV analysis pipeline on synthetic corpora.
+
+Builds exports of each --sizes row count shaped like run_id_*.csv (summaries with
+shuffled sentence order, metadata columns resampled from the sample rows) and times
+load_csv, load_csv_from_buffer, get_csv_summary, analyze_summaries,
+_get_common_topics and _text_similarity. Every (operation, size) runs in a fresh
+subprocess so model/cache warm-up is not shared between measurements; on Linux the
+peak RSS high-water mark is reset after set-up (loading the CSV for the analysis
+steps), so the peak reflects the timed step alone. The agent talks to the local fake OpenAI server, and the LLM result cache is
+disabled, so the suite runs offline and every run does the same work.
+
+Results are written to JSON; --baseline compares against a previous results file and
+exits non-zero when an operation is slower than --threshold.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--csv path/to/run_id_*.csv] [--sizes 1000 10000 100000]
+        [--operations load_csv analyze_summaries ...] [--output results.json]
+        [--baseline baseline.json] [--threshold 0.2]
+"""
+
+import argparse
+import glob
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_openai_server import start_fake_server
+
+OPERATIONS = ['load_csv', 'load_csv_from_buffer', 'get_csv_summary', 'analyze_summaries',
+              '_get_common_topics', '_text_similarity']
+
+
+def build_corpus(sample_csv: str, rows: int, path: str, seed: int = 0):
+    """Write a rows-long export to path, resampling the sample CSV's rows and shuffling summary sentences."""
+    sample = pd.read_csv(sample_csv, dtype=str)
+    sample = sample[sample['conversation_summary'].notna()].reset_index(drop=True)
+    rng = np.random.default_rng(seed)
+    corpus = sample.iloc[rng.integers(0, len(sample), rows)].reset_index(drop=True)
+    # Metadata is drawn independently of the summary so breakdowns see realistic mixes
+    for column in corpus.columns.drop('conversation_summary'):
+        corpus[column] = sample[column].to_numpy()[rng.integers(0, len(sample), rows)]
+    summaries = []
+    for text in corpus['conversation_summary']:
+        sentences = text.split('. ')
+        rng.shuffle(sentences)
+        summaries.append('. '.join(sentences))
+    corpus['conversation_summary'] = summaries
+    corpus.to_csv(path, index=False)
+
+
+def _reset_peak_rss():
+    """Reset the peak RSS high-water mark (Linux only; elsewhere ru_maxrss keeps the set-up peak)."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def _peak_rss_kb() -> int:
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _rss_kb() -> int:
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _agent():
+    """An initialized agent pointed at the fake server from the environment."""
+    import asyncio
+    from agent2 import ConversationalAgent
+
+    agent = ConversationalAgent()
+    asyncio.run(agent.initialize())
+    return agent
+
+
+def child(operation: str, path: str, pairs: int):
+    """Run one operation on the corpus at path and print its measurement as the last stdout line."""
+    agent = _agent()
+    if operation not in ('load_csv', 'load_csv_from_buffer'):
+        with open(path, 'rb') as upload:
+            assert agent.load_csv_from_buffer(upload, os.path.basename(path))
+    texts = agent.current_csv_data['conversation_summary'].dropna().tolist() if agent.current_csv_data is not None else []
+
+    if operation == 'load_csv':
+        run, units = lambda: agent.load_csv(path), None
+    elif operation == 'load_csv_from_buffer':
+        def run():
+            with open(path, 'rb') as upload:
+                return agent.load_csv_from_buffer(upload, os.path.basename(path))
+        units = None
+    elif operation == 'get_csv_summary':
+        run, units = agent.get_csv_summary, len(texts)
+    elif operation == 'analyze_summaries':
+        run, units = agent.analyze_summaries, len(texts)
+    elif operation == '_get_common_topics':
+        run, units = lambda: agent._get_common_topics(texts), len(texts)
+    else:
+        # Consecutive pairs, capped: the pairwise cost is what matters, not corpus size
+        pair_list = list(zip(texts, texts[1:]))[:pairs]
+        run, units = lambda: [agent._text_similarity(a, b) for a, b in pair_list], len(pair_list)
+
+    _reset_peak_rss()
+    baseline_kb = _rss_kb()
+    start = time.perf_counter()
+    result = run()
+    elapsed = time.perf_counter() - start
+    peak_kb = _peak_rss_kb()
+    assert result is not False, f"{operation} failed"
+    if units is None:
+        units = len(agent.current_csv_data)
+    print(json.dumps({
+        'units': units,
+        'wall_s': round(elapsed, 4),
+        'peak_rss_mb': round(peak_kb / 1024, 1),
+        'peak_over_baseline_mb': round((peak_kb - baseline_kb) / 1024, 1),
+    }))
+
+
+def measure(operation: str, rows: int, path: str, pairs: int) -> dict:
+    out = subprocess.run([sys.executable, __file__, '--child', operation, path, '--pairs', str(pairs)],
+                         capture_output=True, text=True)
+    if out.returncode != 0:
+        raise RuntimeError(f"{operation} on {rows} rows failed:\n{out.stderr[-2000:]}")
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result['rows_per_s'] = round(result['units'] / result['wall_s'], 1) if result['wall_s'] else None
+    return {'operation': operation, 'rows': rows, **result}
+
+
+def compare(results: list, baseline_path: str, threshold: float) -> bool:
+    """Print wall time changes against baseline_path. Returns True when nothing regressed past threshold."""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {(r['operation'], r['rows']): r for r in json.load(f)['results']}
+    ok = True
+    print(f"\nCompared with {baseline_path} (regression threshold {threshold:.0%}):\n")
+    print("| Operation | Rows | Baseline (s) | Current (s) | Change | Peak RSS change (MB) |")
+    print("|-----------|------|--------------|-------------|--------|----------------------|")
+    for result in results:
+        previous = baseline.get((result['operation'], result['rows']))
+        if previous is None:
+            print(f"| {result['operation']} | {result['rows']:,d} | n/a | {result['wall_s']:.3f} | new | n/a |")
+            continue
+        change = result['wall_s'] / previous['wall_s'] - 1 if previous['wall_s'] else 0.0
+        rss_change = result['peak_over_baseline_mb'] - previous['peak_over_baseline_mb']
+        flag = " (regression)" if change > threshold else ""
+        ok &= change <= threshold
+        print(f"| {result['operation']} | {result['rows']:,d} | {previous['wall_s']:.3f} | {result['wall_s']:.3f} | "
+              f"{change:+.0%}{flag} | {rss_change:+.1f} |")
+    return ok
+
+
+def main():
+    default_csv = next(iter(sorted(glob.glob(os.path.join(ROOT, 'run_id_*.csv')))), None)
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--csv', default=default_csv, help='Sample CSV whose rows are resampled')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help='Corpus sizes in rows')
+    parser.add_argument('--operations', nargs='+', default=OPERATIONS, choices=OPERATIONS)
+    parser.add_argument('--pairs', type=int, default=1000, help='Text pairs timed for _text_similarity')
+    parser.add_argument('--output', default='bench_pipeline.json', help='Where to write the JSON results')
+    parser.add_argument('--baseline', help='Previous results file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Allowed wall time increase over the baseline')
+    parser.add_argument('--child', nargs=2, metavar=('OPERATION', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child[0], args.child[1], args.pairs)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Offline LLM and a throwaway cache directory, inherited by every child process
+        server, base_url = start_fake_server(delay=0.0, token_delay=0.0)
+        os.environ.update({
+            'GOCAAS_API_KEY': 'fake-key',
+            'GOCAAS_API_BASE': base_url,
+            'LIGHTHOUSE_LLM_CACHE': '0',
+            'LIGHTHOUSE_CACHE_DIR': os.path.join(tmp, 'cache'),
+        })
+        # Fail fast instead of downloading models mid-measurement
+        os.environ.setdefault('LIGHTHOUSE_OFFLINE', '1')
+        results = []
+        try:
+            print(f"Sample: {os.path.basename(args.csv)}, {os.cpu_count()} CPUs\n")
+            print("| Operation | Rows | Wall time (s) | Rows/s | Peak RSS (MB) | Peak over baseline (MB) |")
+            print("|-----------|------|---------------|--------|---------------|-------------------------|")
+            for rows in args.sizes:
+                path = os.path.join(tmp, f'corpus_{rows}.csv')
+                build_corpus(args.csv, rows, path)
+                for operation in args.operations:
+                    result = measure(operation, rows, path, args.pairs)
+                    results.append(result)
+                    rate = f"{result['rows_per_s']:,.0f}" if result['rows_per_s'] is not None else "n/a"
+                    print(f"| {operation} | {rows:,d} | {result['wall_s']:.3f} | {rate} | "
+                          f"{result['peak_rss_mb']:,.0f} | {result['peak_over_baseline_mb']:,.1f} |")
+        finally:
+            server.shutdown()
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'meta': {
+                'sample_csv': os.path.basename(args.csv),
+                'python': platform.python_version(),
+                'pandas': pd.__version__,
+                'cpus': os.cpu_count(),
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            },
+            'results': results,
+        }, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.baseline and not compare(results, args.baseline, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
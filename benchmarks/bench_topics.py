@@ -0,0 +1,72 @@
+"""
+Per-document cost of issue-topic extraction in _get_common_topics, before and after
+restricting noun chunks to the matching sentence spans.
+
+Usage:
+    python benchmarks/bench_topics.py [--csv path/to/run_id_*.csv] [--repeat 5]
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from agent2 import ConversationalAgent, DocFeatures, KEYWORD_INDEX, nlp_service
+
+
+def legacy_issue_chunks(features: DocFeatures):
+    """The previous loop: every doc-level noun chunk, once per matching sentence."""
+    phrases = []
+    for sent_text in features.sentences:
+        if KEYWORD_INDEX.scan(sent_text) & KEYWORD_INDEX.bits['topic_issue']:
+            for chunk_text, _ in features.noun_chunks:
+                if len(chunk_text.split()) >= 2:
+                    phrases.append(chunk_text)
+    return phrases
+
+
+def time_per_doc(extract, docs, repeat):
+    """Best-of-N wall time per document in microseconds, plus the phrases produced."""
+    best = float('inf')
+    phrases = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        phrases = [phrase for features in docs for phrase in extract(features)]
+        best = min(best, time.perf_counter() - start)
+    return best / len(docs) * 1e6, phrases
+
+
+def main():
+    default_csv = next(iter(sorted(glob.glob(os.path.join(ROOT, 'run_id_*.csv')))), None)
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--csv', default=default_csv, help='CSV with a conversation_summary column')
+    parser.add_argument('--repeat', type=int, default=5, help='Timing repetitions (best is reported)')
+    args = parser.parse_args()
+
+    texts = pd.read_csv(args.csv, usecols=['conversation_summary'])['conversation_summary'].dropna().tolist()
+    print(f"Corpus: {args.csv} ({len(texts)} summaries)")
+
+    start = time.perf_counter()
+    docs = nlp_service.features(texts)
+    parse_us = (time.perf_counter() - start) / len(texts) * 1e6
+    print(f"spaCy parse (shared by both variants): {parse_us:,.0f} us/doc")
+
+    before_us, before = time_per_doc(legacy_issue_chunks, docs, args.repeat)
+    after_us, after = time_per_doc(ConversationalAgent._issue_noun_chunks, docs, args.repeat)
+
+    print("\n| Variant | Extraction us/doc | Phrases emitted |")
+    print("|---------|-------------------|-----------------|")
+    print(f"| Before (all chunks x issue sentences) | {before_us:,.1f} | {len(before):,d} |")
+    print(f"| After (chunks in issue sentences) | {after_us:,.1f} | {len(after):,d} |")
+    if after_us:
+        print(f"\nSpeedup: {before_us / after_us:.1f}x, overcount removed: {len(before) - len(after):,d} phrases")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Peak memory of loading an uploaded CSV: the previous decode-to-string path vs. chunked
+parsing straight from the upload stream.
+
+Builds a synthetic export by repeating the sample CSV's rows up to --mb megabytes,
+then loads it in a fresh subprocess per variant and reports peak RSS (ru_maxrss).
+
+Usage:
+    python benchmarks/bench_upload_memory.py [--csv path/to/run_id_*.csv] [--mb 500]
+"""
+
+import argparse
+import glob
+import io
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def build_corpus(sample_csv: str, target_mb: float, path: str) -> int:
+    """Write sample rows repeatedly to path until it reaches target_mb. Returns the row count."""
+    sample = pd.read_csv(sample_csv, dtype=str)
+    rows = 0
+    with open(path, 'w', encoding='utf-8', newline='') as out:
+        sample.to_csv(out, index=False)
+        rows += len(sample)
+        while out.tell() < target_mb * 1024 * 1024:
+            sample.to_csv(out, index=False, header=False)
+            rows += len(sample)
+    return rows
+
+
+def load_legacy(path: str):
+    """The previous upload path: the whole body as a str in a StringIO, parsed twice."""
+    with open(path, 'rb') as upload:
+        csv_content = upload.read().decode('utf-8')
+    csv_buffer = io.StringIO(csv_content)
+    header = pd.read_csv(csv_buffer, nrows=0)
+    csv_buffer.seek(0)
+    col = next(c for c in header.columns if c.lower() == 'conversation_summary')
+    # memory_map=True is dropped: on a StringIO it raises io.UnsupportedOperation
+    df = pd.read_csv(csv_buffer, usecols=[col], dtype=str, encoding='utf-8', on_bad_lines='skip', low_memory=True)
+    df = df.copy()
+    df[col] = df[col].fillna('').str.strip()
+    return len(df)
+
+
+def load_streaming(path: str):
+    """The current path: ConversationalAgent.load_csv_from_buffer on the binary upload stream."""
+    from agent2 import ConversationalAgent
+    agent = ConversationalAgent.__new__(ConversationalAgent)  # Skip __init__: no API credentials needed to load
+    agent.current_csv_data = None
+    agent.csv_summary = None
+    with open(path, 'rb') as upload:
+        assert agent.load_csv_from_buffer(upload, os.path.basename(path))
+    return len(agent.current_csv_data)
+
+
+def child(variant: str, path: str):
+    import agent2  # noqa: F401 -- imported up front so both variants start from the same baseline
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    rows = {'legacy': load_legacy, 'streaming': load_streaming}[variant](path)
+    elapsed = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"{rows} {elapsed:.3f} {peak_kb} {baseline_kb}")
+
+
+def main():
+    default_csv = next(iter(sorted(glob.glob(os.path.join(ROOT, 'run_id_*.csv')))), None)
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--csv', default=default_csv, help='Sample CSV whose rows are repeated')
+    parser.add_argument('--mb', type=float, default=500, help='Size of the synthetic export in MB')
+    parser.add_argument('--child', nargs=2, metavar=('VARIANT', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'export.csv')
+        rows = build_corpus(args.csv, args.mb, path)
+        size_mb = os.path.getsize(path) / (1024 * 1024)
+        print(f"Synthetic export: {size_mb:,.0f} MB, {rows:,d} rows\n")
+        print("| Variant | Rows | Load time (s) | Peak RSS (MB) | Peak over baseline (MB) |")
+        print("|---------|------|---------------|---------------|-------------------------|")
+        for variant in ('legacy', 'streaming'):
+            out = subprocess.run([sys.executable, __file__, '--child', variant, path],
+                                 capture_output=True, text=True, check=True).stdout.split()
+            loaded, elapsed, peak_kb, baseline_kb = int(out[0]), float(out[1]), int(out[2]), int(out[3])
+            print(f"| {variant} | {loaded:,d} | {elapsed:.2f} | {peak_kb / 1024:,.0f} | {(peak_kb - baseline_kb) / 1024:,.0f} |")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+Minimal OpenAI-compatible chat completions server for offline benchmarks.
+
+Responds to POST /v1/chat/completions after a configurable delay (streaming
+word by word when the request sets "stream": true), and can inject 429
+responses with a Retry-After header to exercise client backoff.
+
+Usage:
+    python benchmarks/fake_openai_server.py [--port 8765] [--delay 0.5] [--rate-limit-every 0]
+"""
+
+import argparse
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _completion(model: str, content: str) -> dict:
+    return {
+        'id': 'chatcmpl-fake',
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': model,
+        'choices': [{
+            'index': 0,
+            'message': {'role': 'assistant', 'content': content},
+            'finish_reason': 'stop'
+        }],
+        'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}
+    }
+
+
+def _chunk(model: str, content: str = None, finish_reason: str = None) -> dict:
+    return {
+        'id': 'chatcmpl-fake',
+        'object': 'chat.completion.chunk',
+        'created': int(time.time()),
+        'model': model,
+        'choices': [{
+            'index': 0,
+            'delta': {'content': content} if content is not None else {},
+            'finish_reason': finish_reason
+        }]
+    }
+
+
+def make_handler(delay: float, rate_limit_every: int, retry_after: float, token_delay: float = 0.01):
+    counter = itertools.count(1)
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send_json(self, status: int, payload: dict, headers: dict = None):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_stream(self, model: str, content: str):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.end_headers()
+            words = content.split(' ')
+            for i, word in enumerate(words):
+                piece = word if i == 0 else ' ' + word
+                self.wfile.write(f"data: {json.dumps(_chunk(model, piece))}\n\n".encode('utf-8'))
+                self.wfile.flush()
+                time.sleep(token_delay)
+            self.wfile.write(f"data: {json.dumps(_chunk(model, finish_reason='stop'))}\n\n".encode('utf-8'))
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+
+        def do_POST(self):
+            if not self.path.endswith('/chat/completions'):
+                self._send_json(404, {'error': {'message': 'not found'}})
+                return
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            with lock:
+                request_number = next(counter)
+            if rate_limit_every and request_number % rate_limit_every == 0:
+                self._send_json(429, {'error': {'message': 'rate limited', 'type': 'rate_limit'}},
+                                {'Retry-After': str(retry_after)})
+                return
+            time.sleep(delay)
+            last_user = next((m.get('content', '') for m in reversed(request.get('messages', []))
+                              if m.get('role') == 'user'), '')
+            model = request.get('model', 'fake')
+            content = f"Echo: {last_user[:200]}"
+            if request.get('stream'):
+                self._send_stream(model, content)
+            else:
+                self._send_json(200, _completion(model, content))
+
+    return Handler
+
+
+def start_fake_server(delay: float = 0.5, port: int = 0, rate_limit_every: int = 0, retry_after: float = 0.1,
+                      token_delay: float = 0.01):
+    """Start the server in a daemon thread. Returns (server, base_url)."""
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(delay, rate_limit_every, retry_after, token_delay))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fake OpenAI-compatible chat server')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--delay', type=float, default=0.5, help='Seconds before each completion is returned')
+    parser.add_argument('--rate-limit-every', type=int, default=0, help='Return 429 for every Nth request (0 = never)')
+    parser.add_argument('--retry-after', type=float, default=0.1, help='Retry-After seconds sent with 429s')
+    parser.add_argument('--token-delay', type=float, default=0.01, help='Seconds between streamed words')
+    args = parser.parse_args()
+    server, base_url = start_fake_server(args.delay, args.port, args.rate_limit_every, args.retry_after, args.token_delay)
+    print(f"Fake OpenAI server listening on {base_url} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
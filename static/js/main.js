@@ -1,3 +1,6 @@
+// Per-tab session token issued by the server, so it keeps this tab's conversation and CSV across reconnects
+let sessionToken = sessionStorage.getItem('lighthouseSessionToken');
+
 // Initialize Socket.IO connection with WebSocket transport only
 const socket = io('http://localhost:3000', {
     transports: ['websocket'],
@@ -5,7 +8,14 @@ const socket = io('http://localhost:3000', {
     reconnectionAttempts: 5,
     reconnectionDelay: 1000,
     forceNew: true,
-    timeout: 60000
+    timeout: 60000,
+    // A function, so reconnects present the latest token
+    auth: (cb) => cb({ sessionToken })
+});
+
+socket.on('session', (data) => {
+    sessionToken = data.sessionToken;
+    sessionStorage.setItem('lighthouseSessionToken', sessionToken);
 });
 
 // Socket connection event handlers
@@ -36,6 +46,9 @@ const formatLastPromptButton = document.getElementById('format-last-prompt');
 
 // State
 let isWaitingForResponse = false;
+let streamingMessage = null;  // Assistant message element being filled by response_chunk events
+let streamingText = '';
+let streamingRenderPending = false;
 
 // Helper Functions
 function isCompletePrompt(content) {
@@ -219,8 +232,8 @@ sendButton.addEventListener('click', () => {
         isWaitingForResponse = true;
         const indicator = showTypingIndicator();
         
-        // Send message to server
-        socket.emit('message', { message });
+        // Send message to server (tokens stream back as response_chunk events)
+        socket.emit('message', { message, stream: true });
         
         // Disable input while waiting
         messageInput.disabled = true;
@@ -233,10 +246,14 @@ sendButton.addEventListener('click', () => {
             }
         }, 10000);
         
-        // Clear timeout warning when response is received
-        socket.once('response', () => {
+        // Clear timeout warning as soon as the first token (or the final response) arrives
+        const clearWarning = () => {
             clearTimeout(timeoutWarning);
-        });
+            socket.off('response_chunk', clearWarning);
+            socket.off('response_done', clearWarning);
+        };
+        socket.on('response_chunk', clearWarning);
+        socket.on('response_done', clearWarning);
     }
 });
 
@@ -286,6 +303,7 @@ csvUpload.addEventListener('change', (e) => {
             // Create FormData for file upload
             const formData = new FormData();
             formData.append('file', file);
+            formData.append('session_token', sessionToken);
 
             // Add upload status message
             const uploadStatusMsg = addMessage('📤 Uploading CSV file...', false);
@@ -303,6 +321,9 @@ csvUpload.addEventListener('change', (e) => {
                     addMessage('📊 Summary of uploaded data:', false);
                     addMessage(data.summary, false);
                     analyzeButton.disabled = false;
+                } else if (data.cancelled) {
+                    uploadStatusMsg.textContent = '🛑 Upload cancelled.';
+                    progressMsg.remove();
                 } else {
                     uploadStatusMsg.textContent = `❌ Upload failed: ${data.error}`;
                     progressMsg.remove();
@@ -314,14 +335,18 @@ csvUpload.addEventListener('change', (e) => {
                 progressMsg.remove();
             });
             
-            // Set a timeout to clear the indicator if no response
-            setTimeout(() => {
-                if (currentUploadIndicator) {
-                    removeTypingIndicator(currentUploadIndicator);
-                    currentUploadIndicator = null;
-                    addMessage('⚠️ Upload taking longer than 5 minutes. Please try again.', false);
+            // Warn if the upload has made no progress for 5 minutes (long loads keep reporting progress)
+            const checkStalled = () => {
+                if (!currentUploadIndicator) return;
+                if (Date.now() - lastProgressAt < 300000) {
+                    setTimeout(checkStalled, 300000 - (Date.now() - lastProgressAt));
+                    return;
                 }
-            }, 300000); // 5 minute timeout
+                removeTypingIndicator(currentUploadIndicator);
+                currentUploadIndicator = null;
+                addMessage('⚠️ Upload taking longer than 5 minutes. Please try again.', false);
+            };
+            setTimeout(checkStalled, 300000); // 5 minute timeout
         };
         
         reader.onprogress = (event) => {
@@ -405,6 +430,97 @@ socket.on('response', (data) => {
     }
 });
 
+// Streaming responses: render tokens progressively, then replace with the final response
+function renderStreamingMessage() {
+    streamingRenderPending = false;
+    if (streamingMessage) {
+        streamingMessage.innerHTML = marked.parse(streamingText);
+        chatContainer.scrollTop = chatContainer.scrollHeight;
+    }
+}
+
+socket.on('response_chunk', (data) => {
+    if (!streamingMessage) {
+        removeTypingIndicator(chatContainer.querySelector('.typing-indicator'));
+        streamingMessage = document.createElement('div');
+        streamingMessage.className = 'message assistant-message';
+        chatContainer.appendChild(streamingMessage);
+        streamingText = '';
+    }
+    streamingText += data.delta;
+    
+    // Re-render at most once per animation frame
+    if (!streamingRenderPending) {
+        streamingRenderPending = true;
+        requestAnimationFrame(renderStreamingMessage);
+    }
+});
+
+socket.on('response_done', (data) => {
+    isWaitingForResponse = false;
+    messageInput.disabled = false;
+    sendButton.disabled = false;
+    removeTypingIndicator(chatContainer.querySelector('.typing-indicator'));
+    
+    // The final response may be a formatted prompt that differs from the streamed text
+    if (streamingMessage) {
+        streamingMessage.remove();
+        streamingMessage = null;
+        streamingText = '';
+    }
+    addMessage(data.response);
+    
+    // addMessage already detects complete prompts; cover prompts the server flagged but the heuristic missed
+    if (data.isPrompt && !isCompletePrompt(data.response)) {
+        displayFormattedPrompt(data.response);
+    }
+    
+    if (data.response.includes('```')) {
+        setTimeout(() => Prism.highlightAll(), 100);
+    }
+});
+
+// Progress of long uploads and analyses: one status line with a cancel button per operation
+let lastProgressAt = 0;
+
+function formatSeconds(seconds) {
+    if (seconds === null || seconds === undefined) return '';
+    if (seconds < 60) return `${Math.ceil(seconds)}s`;
+    return `${Math.floor(seconds / 60)}m ${Math.ceil(seconds % 60)}s`;
+}
+
+socket.on('progress', (data) => {
+    lastProgressAt = Date.now();
+    const id = `progress-${data.operation}`;
+    let progressDiv = document.getElementById(id);
+    if (data.finished) {
+        if (progressDiv) progressDiv.remove();
+        return;
+    }
+    if (!progressDiv) {
+        progressDiv = document.createElement('div');
+        progressDiv.id = id;
+        progressDiv.className = 'message assistant-message progress-message';
+        progressDiv.innerHTML = '<span class="progress-text"></span> ' +
+            '<button class="ml-2 px-2 py-1 text-sm bg-red-500 text-white rounded hover:bg-red-600">Cancel</button>';
+        progressDiv.querySelector('button').addEventListener('click', (event) => {
+            event.target.disabled = true;
+            event.target.textContent = 'Cancelling...';
+            socket.emit('cancel_operation', { operation: data.operation });
+        });
+        chatContainer.appendChild(progressDiv);
+        chatContainer.scrollTop = chatContainer.scrollHeight;
+    }
+    
+    const parts = [`⏳ ${data.stage.charAt(0).toUpperCase() + data.stage.slice(1)}:`];
+    parts.push(data.total ? `${data.done.toLocaleString()} / ${data.total.toLocaleString()} ${data.unit}`
+                          : `${data.done.toLocaleString()} ${data.unit}`);
+    if (data.percent !== null) parts.push(`(${data.percent}%)`);
+    if (data.rate) parts.push(`· ${Math.round(data.rate).toLocaleString()} ${data.unit}/s`);
+    if (data.eta !== null) parts.push(`· ETA ${formatSeconds(data.eta)}`);
+    progressDiv.querySelector('.progress-text').textContent = parts.join(' ');
+});
+
 // Listen for CSV processing completion via WebSocket
 socket.on('csv_processed', (data) => {
     console.log('Received CSV processing notification:', data);
@@ -445,6 +561,15 @@ socket.on('csv_processed', (data) => {
     }
 });
 
+socket.on('analysis_queued', (data) => {
+    console.log('Analysis job queued:', data.jobId, data.status);
+    if (data.status === 'queued') {
+        addMessage(data.queuePosition
+            ? `⏳ Analysis queued behind ${data.queuePosition} other job(s)...`
+            : '⏳ Analysis queued, waiting for a free worker...', false);
+    }
+});
+
 socket.on('analysis_result', (data) => {
     removeTypingIndicator(chatContainer.querySelector('.typing-indicator'));
     analyzeButton.disabled = false;
@@ -524,6 +649,9 @@ socket.on('analysis_result', (data) => {
         
         // Highlight code blocks
         Prism.highlightAll();
+    } else if (data.cancelled) {
+        addMessage('🛑 Analysis cancelled.', false);
+        printButton.classList.add('hidden');
     } else {
         analysisResults.innerHTML = `
             <div class="warning-section">
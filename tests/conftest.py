@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# Throwaway cache directory and no model downloads, set before agent2 is imported
+os.environ['LIGHTHOUSE_CACHE_DIR'] = tempfile.mkdtemp(prefix='lighthouse-tests-')
+os.environ['LIGHTHOUSE_OFFLINE'] = '1'
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
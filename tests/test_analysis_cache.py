@@ -0,0 +1,76 @@
+import asyncio
+
+import pandas as pd
+
+from agent2 import ConversationalAgent
+
+
+def _loaded_agent(tmp_path, summaries, name='export.csv') -> ConversationalAgent:
+    path = tmp_path / name
+    pd.DataFrame({'conversation_summary': summaries}).to_csv(path, index=False)
+    agent = ConversationalAgent()
+    assert agent.load_csv(str(path))
+    return agent
+
+
+def test_key_follows_content_not_the_dataframe(tmp_path):
+    summaries = ['Password reset failed.', 'DNS update worked.']
+    first, second = _loaded_agent(tmp_path, summaries), _loaded_agent(tmp_path, summaries)
+    assert first.current_csv_data is not second.current_csv_data
+    assert first._analysis_key('keyword') == second._analysis_key('keyword')
+    other = _loaded_agent(tmp_path, summaries + ['Billing error.'], 'other.csv')
+    assert other._analysis_key('keyword') != first._analysis_key('keyword')
+    assert first._analysis_key('llm', 'a') != first._analysis_key('llm', 'b')
+
+
+def test_reloading_data_misses_and_cache_is_bounded(tmp_path):
+    agent = _loaded_agent(tmp_path, ['Password reset failed.'])
+    agent.analysis_cache_size = 2
+    agent._store_analysis(agent._analysis_key('llm', 'a'), 'report a')
+    agent._store_analysis(agent._analysis_key('llm', 'b'), 'report b')
+    assert agent._cached_analysis(agent._analysis_key('llm', 'a')) == 'report a'  # Now most recently used
+    agent._store_analysis(agent._analysis_key('llm', 'c'), 'report c')
+    assert agent._cached_analysis(agent._analysis_key('llm', 'b')) is None
+    assert agent._cached_analysis(agent._analysis_key('llm', 'a')) == 'report a'
+
+    path = tmp_path / 'next.csv'
+    pd.DataFrame({'conversation_summary': ['Checkout was slow.']}).to_csv(path, index=False)
+    assert agent.load_csv(str(path))
+    assert agent._cached_analysis(agent._analysis_key('llm', 'a')) is None
+
+
+def _spilled_agent(tmp_path) -> ConversationalAgent:
+    path = tmp_path / 'export.csv'
+    pd.DataFrame({'conversation_summary': [
+        'Customer could not reset their password.',
+        'DNS records were missing after the domain transfer.',
+        'Checkout failed with a payment error.',
+    ]}).to_csv(path, index=False)
+    agent = ConversationalAgent()
+    assert agent.load_csv(str(path), spill=True)
+    assert agent.summary_store is not None and agent._csv_data is None
+    return agent
+
+
+def test_cached_summary_analysis_does_not_read_spilled_rows(tmp_path):
+    agent = _spilled_agent(tmp_path)
+    agent._store_analysis(agent._summary_analysis_key(), 'cached report')
+
+    assert agent.analyze_summaries() == 'cached report'
+    assert agent._csv_data is None
+
+
+def test_fingerprint_survives_reading_spilled_rows_back(tmp_path):
+    agent = _spilled_agent(tmp_path)
+    key = agent._summary_analysis_key()
+    assert len(agent.current_csv_data) == 3
+    assert agent._summary_analysis_key() == key
+
+
+def test_cached_prompt_analysis_skips_deduplication(tmp_path):
+    agent = _spilled_agent(tmp_path)
+    agent._store_analysis(agent._prompt_analysis_key('Find the top issues.'), 'cached report')
+
+    assert asyncio.run(agent.analyze_with_prompt('Find the top issues.')) == 'cached report'
+    assert agent._summary_groups == (None, None)
+    assert agent._csv_data is None
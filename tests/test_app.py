@@ -0,0 +1,181 @@
+import threading
+import time
+
+import pytest
+
+import app as server
+from agent2 import ConversationalAgent
+
+
+@pytest.fixture
+def client():
+    client = server.socketio.test_client(server.app)
+    yield client
+    client.disconnect()
+
+
+def _session_key(client) -> str:
+    return server.sessions.key_for(server.socketio.server.manager.sid_from_eio_sid(client.eio_sid, '/'))
+
+
+def test_tracked_operation_is_registered_until_it_finishes(client):
+    key = _session_key(client)
+    with server.track_progress(key, 'upload') as reporter:
+        assert server.active_operations[key] == {reporter: 'upload'}
+        reporter.update('loading', 10)
+    assert key not in server.active_operations
+
+    progress = [event['args'][0] for event in client.get_received() if event['name'] == 'progress']
+    assert progress[-1]['operation'] == 'upload' and progress[-1]['finished'] and progress[-1]['done'] == 10
+
+
+def test_cancel_operation_cancels_the_sessions_running_operation(client):
+    client.emit('cancel_operation')
+    assert client.get_received()[-1]['args'][0] == {'success': False}
+
+    with server.track_progress(_session_key(client), 'upload') as reporter:
+        client.emit('cancel_operation')
+        assert reporter.cancelled
+        assert client.get_received()[-1]['args'][0] == {'success': True}
+
+
+def test_concurrent_operations_are_tracked_and_cancelled_separately(client):
+    key = _session_key(client)
+    with server.track_progress(key, 'analysis') as analysis:
+        with server.track_progress(key, 'upload') as upload:
+            assert server.active_operations[key] == {analysis: 'analysis', upload: 'upload'}
+            client.emit('cancel_operation', {'operation': 'upload'})
+            assert upload.cancelled and not analysis.cancelled
+        # The finished upload leaves the analysis cancellable and its session busy
+        assert server.sessions.busy(key)
+        client.emit('cancel_operation')
+        assert analysis.cancelled
+    assert not server.sessions.busy(key)
+
+
+class BlockingAgent(ConversationalAgent):
+    """Agent whose keyword analysis waits for release() and then returns a fixed report."""
+
+    def __init__(self, report='report'):
+        super().__init__()
+        self.prompt_generated = True
+        self.report = report
+        self.started = threading.Event()
+        self._release = threading.Event()
+
+    def release(self):
+        self._release.set()
+
+    def analyze_summaries(self, progress=None):
+        self.started.set()
+        while not self._release.wait(0.01):
+            progress.check()
+        return self.report
+
+
+def _wait(job, timeout=10.0):
+    """Yield to the monitor greenlets until the job has finished."""
+    deadline = time.time() + timeout
+    while job['finished'] is None:
+        assert time.time() < deadline, f"job still {job['status']}"
+        server.socketio.sleep(0.01)
+    return job
+
+
+@pytest.fixture
+def jobs():
+    jobs = server.AnalysisJobs(max_workers=1, retention=60)
+    yield jobs
+    jobs._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def test_job_runs_and_pushes_its_result(client, jobs):
+    key = _session_key(client)
+    agent = BlockingAgent('keyword report')
+    job = jobs.submit(key, agent)
+    assert jobs.submit(key, agent) is job  # Still pending: the same job comes back
+    agent.started.wait(5)
+    assert jobs.status(job)['status'] == 'running'
+
+    agent.release()
+    _wait(job)
+    assert job['status'] == 'done'
+    assert job['result'] == {'success': True, 'analysis': 'keyword report', 'insights': agent.get_learned_insights(),
+                             'jobId': job['id']}
+    pushed = [event['args'][0] for event in client.get_received() if event['name'] == 'analysis_result']
+    assert pushed == [job['result']]
+    assert key not in server.active_operations
+
+
+def test_jobs_beyond_the_pool_wait_in_order_and_can_be_cancelled(jobs):
+    running, first, second = BlockingAgent(), BlockingAgent(), BlockingAgent()
+    running_job = jobs.submit('session-a', running)
+    running.started.wait(5)
+    first_job, second_job = jobs.submit('session-b', first), jobs.submit('session-c', second)
+    assert jobs.status(first_job)['queuePosition'] == 0
+    assert jobs.status(second_job)['queuePosition'] == 1
+
+    assert jobs.cancel(first_job['id'])
+    running.release()
+    second.release()
+    for job in (running_job, first_job, second_job):
+        _wait(job)
+    assert [job['status'] for job in (running_job, first_job, second_job)] == ['done', 'cancelled', 'done']
+    assert first_job['result']['cancelled'] and not first.started.is_set()
+    assert not jobs.cancel(second_job['id'])
+
+
+def test_failed_job_is_reported_and_old_jobs_are_pruned(jobs):
+    agent = BlockingAgent()
+    agent.analyze_summaries = lambda progress=None: 1 / 0
+    job = _wait(jobs.submit('session-a', agent))
+    assert job['status'] == 'failed' and 'division by zero' in job['result']['error']
+
+    job['finished'] -= 120
+    jobs.prune()
+    assert jobs.get(job['id']) is None
+
+
+def _token_session():
+    token = server.sessions.issue_token()
+    return token, server.sessions.verify_token(token)
+
+
+def test_job_routes_report_status_and_result(jobs, monkeypatch):
+    monkeypatch.setattr(server, 'jobs', jobs)
+    token, key = _token_session()
+    agent = BlockingAgent()
+    job = jobs.submit(key, agent)
+    http = server.app.test_client()
+    agent.started.wait(5)
+    query = {'session_token': token}
+    assert http.get(f"/api/jobs/{job['id']}", query_string=query).get_json()['status'] == 'running'
+    assert http.get(f"/api/jobs/{job['id']}/result", query_string=query).status_code == 202
+
+    agent.release()
+    _wait(job)
+    assert http.get(f"/api/jobs/{job['id']}/result", query_string=query).get_json() == job['result']
+    assert http.get('/api/jobs/unknown', query_string=query).status_code == 404
+
+
+def test_job_routes_only_serve_the_jobs_session(jobs, monkeypatch):
+    monkeypatch.setattr(server, 'jobs', jobs)
+    token, key = _token_session()
+    other_token, _ = _token_session()
+    agent = BlockingAgent()
+    job = jobs.submit(key, agent)
+    http = server.app.test_client()
+    urls = [f"/api/jobs/{job['id']}", f"/api/jobs/{job['id']}/result"]
+
+    for url in urls:
+        assert http.get(url).status_code == 403
+        assert http.get(url, query_string={'session_token': token + 'x'}).status_code == 403
+        assert http.get(url, query_string={'session_token': other_token}).status_code == 404
+    cancel = f"/api/jobs/{job['id']}/cancel"
+    assert http.post(cancel, json={}).status_code == 403
+    assert http.post(cancel, json={'session_token': other_token}).status_code == 404
+    assert not job['progress'].cancelled
+
+    assert http.post(cancel, json={'session_token': token}).get_json() == {'success': True}
+    _wait(job)
+    assert job['status'] == 'cancelled'
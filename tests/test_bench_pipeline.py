@@ -0,0 +1,40 @@
+import json
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+import bench_pipeline
+
+
+def _results(**wall):
+    return [{'operation': op, 'rows': 1000, 'wall_s': s, 'peak_over_baseline_mb': 10.0} for op, s in wall.items()]
+
+
+def test_compare_flags_regressions_past_threshold(tmp_path):
+    baseline = tmp_path / 'baseline.json'
+    baseline.write_text(json.dumps({'results': _results(load_csv=1.0, analyze_summaries=2.0)}))
+    assert bench_pipeline.compare(_results(load_csv=1.1, analyze_summaries=1.5), str(baseline), 0.2)
+    assert not bench_pipeline.compare(_results(load_csv=1.3, analyze_summaries=2.0), str(baseline), 0.2)
+    # Operations missing from the baseline are reported, not failed
+    assert bench_pipeline.compare(_results(_text_similarity=5.0), str(baseline), 0.2)
+
+
+def test_build_corpus_resamples_rows_and_keeps_columns(tmp_path):
+    sample = tmp_path / 'sample.csv'
+    pd.DataFrame({
+        'conversation_summary': ['First point. Second point. Third point.', 'Only one.', None],
+        'customer_type_name': ['new', 'returning', 'new'],
+    }).to_csv(sample, index=False)
+    corpus_path = tmp_path / 'corpus.csv'
+    bench_pipeline.build_corpus(str(sample), 50, str(corpus_path))
+
+    corpus = pd.read_csv(corpus_path)
+    assert len(corpus) == 50 and list(corpus.columns) == ['conversation_summary', 'customer_type_name']
+    assert corpus['conversation_summary'].notna().all()
+    assert set(corpus['customer_type_name']) <= {'new', 'returning'}
+    # Sentence order is shuffled, but every summary keeps the sentences of one sample summary
+    originals = {frozenset(['First point', 'Second point', 'Third point.']), frozenset(['Only one.'])}
+    assert {frozenset(text.split('. ')) for text in corpus['conversation_summary']} <= originals
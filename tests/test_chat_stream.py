@@ -0,0 +1,60 @@
+import asyncio
+from types import SimpleNamespace
+
+from openai.types.chat import ChatCompletionChunk
+
+from agent2 import ConversationalAgent
+
+
+def _chunk(content, finish_reason=None) -> ChatCompletionChunk:
+    return ChatCompletionChunk(id='chatcmpl-test', object='chat.completion.chunk', created=0, model='test-model', choices=[
+        {'index': 0, 'delta': {'content': content}, 'finish_reason': finish_reason}
+    ])
+
+
+def _streaming_agent(pieces):
+    """Agent in summary mode whose client streams the given pieces, recording each request."""
+    calls = []
+
+    async def create(**kwargs):
+        calls.append(kwargs)
+
+        async def stream():
+            for piece in pieces:
+                yield _chunk(piece)
+            yield _chunk(None, 'stop')
+
+        return stream()
+
+    agent = ConversationalAgent()
+    agent.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    agent.current_mode = 'summary'
+    return agent, calls
+
+
+async def _events(agent, message):
+    return [event async for event in agent.chat_stream(message)]
+
+
+def test_tokens_are_relayed_as_they_arrive():
+    agent, calls = _streaming_agent(['Look ', 'at ', 'checkout', '.'])
+    events = asyncio.run(_events(agent, 'Where do customers struggle most?'))
+
+    assert [e['delta'] for e in events[:-1]] == ['Look ', 'at ', 'checkout', '.']
+    assert events[-1] == {'done': True, 'response': 'Look at checkout.', 'is_prompt': False, 'prompt': None}
+    assert len(calls) == 1 and calls[0]['stream'] is True
+    assert agent.conversation_history[-1] == {'role': 'assistant', 'content': 'Look at checkout.'}
+
+
+def test_chat_returns_the_final_response():
+    agent, _ = _streaming_agent(['Checkout ', 'errors.'])
+    assert asyncio.run(agent.chat('What is the top complaint?')) == 'Checkout errors.'
+
+
+def test_canned_replies_are_one_delta_without_an_api_call():
+    agent, calls = _streaming_agent([])
+    agent.current_mode = None
+    events = asyncio.run(_events(agent, 'hello'))
+
+    assert len(events) == 2 and events[1]['done'] and events[0]['delta'] == events[1]['response']
+    assert 'Please type' in events[1]['response'] and calls == []
@@ -0,0 +1,60 @@
+import asyncio
+from types import SimpleNamespace
+
+from agent2 import ConversationMemory, count_message_tokens
+
+
+def _history(turns: int):
+    return [{'role': 'user' if n % 2 == 0 else 'assistant', 'content': f'Turn {n}. ' + 'detail ' * 40}
+            for n in range(turns)]
+
+
+def test_recent_turns_fit_budget_and_old_ones_are_summarized():
+    memory = ConversationMemory(token_budget=400)
+    history = _history(12)
+    messages = asyncio.run(memory.build(history, pinned_prompt='Analyze checkout issues.'))
+
+    assert len(history) < 12 and history[-1]['content'].startswith('Turn 11.')
+    assert messages[0]['content'].endswith('Analyze checkout issues.')
+    assert messages[1]['content'].startswith('Summary of the earlier conversation:')
+    assert '- user: Turn 0.' in memory.summary
+    assert count_message_tokens(messages) <= memory.token_budget
+
+
+def test_summary_growth_is_counted_before_turns_are_kept():
+    # No sentence breaks, so every folded turn adds a long summary line
+    memory = ConversationMemory(token_budget=400)
+    history = []
+    for n in range(30):
+        history.append({'role': 'user', 'content': f'Turn {n} ' + 'detail ' * 40})
+        messages = asyncio.run(memory.build(history))
+        assert count_message_tokens(messages) <= memory.token_budget
+    assert memory.summary and history[-1]['content'].startswith('Turn 29 ')
+
+
+def test_latest_turn_is_kept_even_over_budget():
+    memory = ConversationMemory(token_budget=10)
+    history = _history(3)
+    messages = asyncio.run(memory.build(history))
+    assert history == messages[-1:] and history[0]['content'].startswith('Turn 2.')
+
+
+def test_summary_model_is_used_when_configured():
+    calls = []
+
+    async def complete(messages, model=None):
+        calls.append(model)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content='Model summary.'))])
+
+    memory = ConversationMemory(token_budget=200, summary_model='cheap-model')
+    asyncio.run(memory.build(_history(8), complete=complete))
+    assert calls == ['cheap-model'] and memory.summary == 'Model summary.'
+
+
+def test_failed_summary_model_falls_back_to_extractive():
+    async def complete(messages, model=None):
+        raise RuntimeError('unavailable')
+
+    memory = ConversationMemory(token_budget=200, summary_model='cheap-model')
+    asyncio.run(memory.build(_history(8), complete=complete))
+    assert memory.summary.startswith('- user: Turn 0.')
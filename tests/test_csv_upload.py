@@ -0,0 +1,49 @@
+import io
+import tempfile
+
+from agent2 import ConversationalAgent
+
+CSV = (
+    'id, Conversation_Summary ,notes\n'
+    '1,  Password reset failed.  ,a\n'
+    '2,,b\n'
+    '3,"DNS records, MX included, were missing.",c\n'
+    '4,Checkout was slow.,d\n'
+    '5,Refund issued.,e\n'
+)
+
+
+def _spooled_upload(content: str):
+    """A binary stream like the one the form parser hands the upload endpoint (rolled over to disk)."""
+    stream = tempfile.SpooledTemporaryFile(max_size=64)
+    stream.write(content.encode('utf-8'))
+    stream.seek(0)
+    return stream
+
+
+def test_upload_stream_is_parsed_in_chunks():
+    with _spooled_upload(CSV) as stream:
+        assert len(list(ConversationalAgent._read_summary_chunks(stream, chunksize=2))) == 3
+        stream.seek(0)
+        agent = ConversationalAgent()
+        assert agent.load_csv_from_buffer(stream, 'export.csv')
+
+    data = agent.current_csv_data
+    assert list(data.columns) == ['conversation_summary']
+    assert data['conversation_summary'].tolist() == [
+        'Password reset failed.', '', 'DNS records, MX included, were missing.', 'Checkout was slow.', 'Refund issued.'
+    ]
+    assert 'Total conversation summaries: 5' in agent.get_csv_summary()
+
+
+def test_text_streams_load_too():
+    agent = ConversationalAgent()
+    assert agent.load_csv_from_buffer(io.StringIO(CSV), 'export.csv')
+    assert len(agent.current_csv_data) == 5
+
+
+def test_missing_summary_column_is_rejected():
+    with _spooled_upload('id,notes\n1,a\n2,b\n') as stream:
+        agent = ConversationalAgent()
+        assert not agent.load_csv_from_buffer(stream, 'export.csv')
+    assert agent.current_csv_data is None
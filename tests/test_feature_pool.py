@@ -0,0 +1,25 @@
+import numpy as np
+
+from agent2 import FeaturePool, ProgressReporter, _sentiment_shard
+
+TEXTS = [f'Customer {n} was {"happy with" if n % 3 else "angry about"} the checkout.' for n in range(10)]
+
+
+def test_sharded_sentiment_matches_a_single_pass_in_input_order():
+    expected = _sentiment_shard(TEXTS)
+    pool = FeaturePool(workers=2, shard_rows=3)
+    try:
+        reporter = ProgressReporter()
+        scores = pool.sentiment(TEXTS, reporter)
+    finally:
+        pool.shutdown()
+    np.testing.assert_array_equal(scores, expected)
+    assert (reporter.snapshot()['stage'], reporter.snapshot()['done']) == ('scoring', len(TEXTS))
+
+
+def test_single_worker_runs_in_process():
+    pool = FeaturePool(workers=1, shard_rows=4)
+    assert not pool.parallel
+    np.testing.assert_array_equal(pool.sentiment(TEXTS), _sentiment_shard(TEXTS))
+    assert pool._executor is None
+    assert pool.sentiment([]).shape == (0, 2)
@@ -0,0 +1,67 @@
+import pytest
+
+import agent2
+from agent2 import FeatureStore
+
+
+class Computer:
+    """Feature function that records which texts it was asked to compute."""
+
+    def __init__(self, value=lambda text: [text.lower()] * 3):
+        self.value = value
+        self.computed = []
+
+    def __call__(self, texts):
+        self.computed.extend(texts)
+        return [self.value(text) for text in texts]
+
+
+def test_only_unseen_texts_are_computed(tmp_path):
+    store = FeatureStore(path=str(tmp_path / 'features.sqlite'), enabled=True)
+    compute = Computer(lambda text: (len(text) / 100, 0.5))
+    assert store.features('sentiment', ['Good.', 'Bad.', 'Good.'], compute) == [(0.05, 0.5), (0.04, 0.5), (0.05, 0.5)]
+    assert store.features('sentiment', ['Bad.', 'New.'], compute) == [(0.04, 0.5), (0.04, 0.5)]
+    assert compute.computed == ['Good.', 'Bad.', 'New.']
+    assert (store.hits, store.misses) == (1, 3)
+
+    phrases = Computer()
+    assert FeatureStore(path=store.path, enabled=True).features('phrases', ['Good.'], phrases) == [['good.'] * 3]
+    assert phrases.computed == ['Good.']  # Extractors do not share keys
+
+
+def test_extractor_version_change_recomputes_features(tmp_path, monkeypatch):
+    path = str(tmp_path / 'features.sqlite')
+    compute = Computer()
+    FeatureStore(path=path, enabled=True).features('phrases', ['Login failed.'], compute)
+    FeatureStore(path=path, enabled=True).features('phrases', ['Login failed.'], compute)
+    assert compute.computed == ['Login failed.']
+
+    monkeypatch.setitem(FeatureStore.EXTRACTOR_REVISIONS, 'phrases', FeatureStore.EXTRACTOR_REVISIONS['phrases'] + 1)
+    store = FeatureStore(path=path, enabled=True)
+    assert store.features('phrases', ['Login failed.'], compute) == [['login failed.'] * 3]
+    assert compute.computed == ['Login failed.'] * 2 and store.misses == 1
+
+
+def test_oldest_written_entries_are_dropped_over_the_size_limit(tmp_path, monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(agent2.time, 'time', lambda: now[0])
+    store = FeatureStore(path=str(tmp_path / 'features.sqlite'), max_mb=0.5, enabled=True)
+    compute = Computer(lambda text: [text * 150])
+    batches = [[f'{batch} text {n:04d} ' for n in range(150)] for batch in 'abc']
+    for batch in batches:
+        store.features('phrases', batch, compute)
+        now[0] += 1
+    assert store.evictions > 0
+    assert store.stats()['mb'] <= 0.5
+
+    compute.computed.clear()
+    store.features('phrases', [batches[0][0], batches[2][-1]], compute)
+    assert compute.computed == [batches[0][0]]
+
+
+def test_disabled_store_computes_everything(tmp_path):
+    store = FeatureStore(path=str(tmp_path / 'features.sqlite'), enabled=False)
+    compute = Computer()
+    store.features('phrases', ['One.'], compute)
+    store.features('phrases', ['One.'], compute)
+    assert compute.computed == ['One.', 'One.'] and store.stats()['entries'] == 0
@@ -0,0 +1,51 @@
+import glob
+import os
+
+import pandas as pd
+import pytest
+
+from agent2 import KEYWORD_FAMILIES, KEYWORD_INDEX, KeywordIndex
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEXTS = [
+    "customer can't log in on the mobile app after the password reset failed",
+    "the checkout page was confusing and the payment errored twice",
+    "dns records propagated; no problems reported",
+    "cannot find the search bar on desktop",
+    "",
+    "Everything worked great, thanks!",
+]
+
+
+def _loop_mask(index: KeywordIndex, text_lower: str) -> int:
+    """The scan KeywordIndex replaced: `keyword in text` for every keyword of every family."""
+    mask = 0
+    for family, keywords in KEYWORD_FAMILIES.items():
+        if any(keyword.lower() in text_lower for keyword in keywords):
+            mask |= index.bits[family]
+    return mask
+
+
+def test_masks_match_substring_loop_on_sample_csv():
+    csv = next(iter(sorted(glob.glob(os.path.join(ROOT, 'run_id_*.csv')))), None)
+    texts = TEXTS + (pd.read_csv(csv, usecols=['conversation_summary'])['conversation_summary'].dropna().tolist() if csv else [])
+    texts_lower = [text.lower() for text in texts]
+    assert KEYWORD_INDEX.masks(texts_lower).tolist() == [_loop_mask(KEYWORD_INDEX, text) for text in texts_lower]
+
+
+def test_contained_keywords_also_hit():
+    index = KeywordIndex({'short': ["can't"], 'long': ["can't do"], 'other': ['do it']})
+    assert index.hit_sets(["i can't do it"]) == [{'short', 'long', 'other'}]
+    assert index.hit_sets(["i can't"]) == [{'short'}]
+
+
+def test_count_requires_every_family():
+    index = KeywordIndex({'a': ['alpha'], 'b': ['beta']})
+    masks = index.masks(['alpha beta', 'alpha', 'beta', 'gamma'])
+    assert index.count(masks, 'a') == 2
+    assert index.count(masks, 'a', 'b') == 1
+
+
+def test_too_many_families_rejected():
+    with pytest.raises(ValueError):
+        KeywordIndex({f'family{n}': ['x'] for n in range(64)})
@@ -0,0 +1,102 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from openai.types.chat import ChatCompletionChunk
+
+import agent2
+from agent2 import ConversationalAgent, LLMResultCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(agent2.time, 'time', lambda: now[0])
+    return now
+
+
+def test_key_ignores_surrounding_whitespace_but_not_content_or_params():
+    messages = [{'role': 'system', 'content': 'Analyze.'}, {'role': 'user', 'content': 'Summaries'}]
+    padded = [{'role': 'system', 'content': '  Analyze.\n'}, {'role': 'user', 'content': 'Summaries '}]
+    key = LLMResultCache.make_key('model-a', messages, {'temperature': 0})
+    assert LLMResultCache.make_key('model-a', padded, {'temperature': 0}) == key
+    assert LLMResultCache.make_key('model-b', messages, {'temperature': 0}) != key
+    assert LLMResultCache.make_key('model-a', messages, {'temperature': 1}) != key
+    assert LLMResultCache.make_key('model-a', messages[:1] + [{'role': 'user', 'content': 'Other'}], {'temperature': 0}) != key
+    assert LLMResultCache.make_key('model-a', [{'role': 'user', 'content': 'Analyze.'}] + messages[1:], {'temperature': 0}) != key
+
+
+def test_entries_expire_after_the_ttl(tmp_path, clock):
+    cache = LLMResultCache(path=str(tmp_path / 'cache.sqlite'), ttl=60, enabled=True)
+    cache.put('key', 'value')
+    clock[0] += 59
+    assert cache.get('key') == 'value'
+    clock[0] += 2
+    assert cache.get('key') is None
+    assert (cache.hits, cache.misses, cache.stats()['entries']) == (1, 1, 0)
+
+
+def test_least_recently_used_entries_are_evicted_over_the_size_limit(tmp_path, clock):
+    cache = LLMResultCache(path=str(tmp_path / 'cache.sqlite'), max_mb=250 / (1024 * 1024), enabled=True)
+    for key in ('a', 'b'):
+        cache.put(key, key * 100)
+        clock[0] += 1
+    assert cache.get('a') == 'a' * 100  # 'b' is now the least recently used
+    clock[0] += 1
+    cache.put('c', 'c' * 100)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 'a' * 100 and cache.get('c') == 'c' * 100
+    assert cache.evictions == 1
+
+
+def _chunk(content, finish_reason=None) -> ChatCompletionChunk:
+    return ChatCompletionChunk(id='chatcmpl-test', object='chat.completion.chunk', created=0, model='test-model', choices=[
+        {'index': 0, 'delta': {'content': content}, 'finish_reason': finish_reason}
+    ])
+
+
+def _agent(pieces, calls, finish_reason='stop'):
+    async def create(**kwargs):
+        calls.append(kwargs)
+
+        async def stream():
+            for piece in pieces:
+                yield _chunk(piece)
+            yield _chunk(None, finish_reason)
+
+        return stream()
+
+    agent = ConversationalAgent()
+    agent.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    return agent
+
+
+async def _stream_text(agent, messages):
+    stream = await agent._create_completion(messages, stream=True)
+    return ''.join([chunk.choices[0].delta.content or '' async for chunk in stream if chunk.choices])
+
+
+def test_streamed_completion_is_recorded_and_replayed():
+    calls = []
+    agent = _agent(['Checkout ', 'is ', 'slow.'], calls)
+    messages = [{'role': 'user', 'content': 'Replay this streamed answer.'}]
+
+    assert asyncio.run(_stream_text(agent, messages)) == 'Checkout is slow.'
+    assert asyncio.run(_stream_text(agent, messages)) == 'Checkout is slow.'
+    completion = asyncio.run(agent._create_completion(messages))
+    assert completion.choices[0].message.content == 'Checkout is slow.'
+    assert len(calls) == 1
+
+    asyncio.run(_stream_text(agent, messages + [{'role': 'user', 'content': 'And then?'}]))
+    assert len(calls) == 2
+
+
+def test_truncated_completions_are_not_cached():
+    calls = []
+    agent = _agent(['Checkout ', 'is'], calls, finish_reason='length')
+    messages = [{'role': 'user', 'content': 'Do not replay this truncated answer.'}]
+
+    assert asyncio.run(_stream_text(agent, messages)) == 'Checkout is'
+    assert asyncio.run(_stream_text(agent, messages)) == 'Checkout is'
+    assert len(calls) == 2
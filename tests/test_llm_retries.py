@@ -0,0 +1,96 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+from openai.types.chat import ChatCompletion
+
+import agent2
+from agent2 import ConversationalAgent, is_retryable, retry_delay
+
+REQUEST = httpx.Request('POST', 'https://llm.test/v1/chat/completions')
+
+
+def _status_error(status: int, headers=None) -> openai.APIStatusError:
+    response = httpx.Response(status, headers=headers or {}, request=REQUEST)
+    return openai.APIStatusError(f'status {status}', response=response, body=None)
+
+
+def _completion(content: str) -> ChatCompletion:
+    return ChatCompletion(id='chatcmpl-test', object='chat.completion', created=0, model='test-model', choices=[
+        {'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}
+    ])
+
+
+def test_retry_after_headers_are_honored_and_capped():
+    assert retry_delay(_status_error(429, {'retry-after-ms': '1500'}), attempt=0) == 1.5
+    assert retry_delay(_status_error(429, {'retry-after': '2'}), attempt=0) == 2.0
+    assert retry_delay(_status_error(429, {'retry-after': '600'}), attempt=0, cap=30.0) == 30.0
+    date = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=10), usegmt=True)
+    assert 8.0 <= retry_delay(_status_error(503, {'retry-after': date}), attempt=0) <= 10.0
+
+
+def test_backoff_without_headers_is_jittered_and_capped():
+    delays = [retry_delay(_status_error(500), attempt=3, base=1.0, cap=5.0) for _ in range(50)]
+    assert all(0.0 <= delay <= 5.0 for delay in delays)
+    assert len(set(delays)) > 1
+    assert 0.0 <= retry_delay(openai.APITimeoutError(request=REQUEST), attempt=0, base=0.5) <= 0.5
+
+
+def test_only_transient_errors_are_retryable():
+    assert is_retryable(openai.APITimeoutError(request=REQUEST))
+    assert is_retryable(_status_error(429)) and is_retryable(_status_error(503))
+    assert not is_retryable(_status_error(400)) and not is_retryable(_status_error(401))
+    assert not is_retryable(ValueError('bad input'))
+
+
+def _agent(outcomes):
+    """Agent whose client raises or returns the given outcomes in order, recording each call."""
+    calls = []
+
+    async def create(**kwargs):
+        calls.append(kwargs)
+        outcome = outcomes[len(calls) - 1]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    agent = ConversationalAgent()
+    agent.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    return agent, calls
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+
+    async def sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(agent2.asyncio, 'sleep', sleep)
+    return delays
+
+
+def test_rate_limited_call_waits_for_retry_after_then_succeeds(sleeps):
+    agent, calls = _agent([_status_error(429, {'retry-after': '3'}), _completion('done')])
+    messages = [{'role': 'user', 'content': 'retry after a rate limit'}]
+    response = asyncio.run(agent._create_completion(messages))
+    assert response.choices[0].message.content == 'done'
+    assert len(calls) == 2 and sleeps == [3.0]
+
+
+def test_client_errors_are_not_retried(sleeps):
+    agent, calls = _agent([_status_error(400), _completion('unused')])
+    with pytest.raises(openai.APIStatusError):
+        asyncio.run(agent._create_completion([{'role': 'user', 'content': 'a bad request'}]))
+    assert len(calls) == 1 and sleeps == []
+
+
+def test_retries_stop_after_the_limit(sleeps):
+    agent, calls = _agent([_status_error(503)] * agent2.LLM_MAX_RETRIES)
+    with pytest.raises(openai.APIStatusError):
+        asyncio.run(agent._create_completion([{'role': 'user', 'content': 'an unavailable backend'}]))
+    assert len(calls) == agent2.LLM_MAX_RETRIES and len(sleeps) == agent2.LLM_MAX_RETRIES - 1
@@ -0,0 +1,89 @@
+import asyncio
+import re
+from types import SimpleNamespace
+
+import pytest
+
+import agent2
+from agent2 import MapReduceAnalyzer
+
+
+class FakeCompletions:
+    """
+    Map calls answer with the summary count they saw; reduce calls echo the total they were
+    asked for. Map batches containing a fail_batches marker raise, for failures_per_batch
+    attempts (or always).
+    """
+
+    def __init__(self, fail_batches=(), failures_per_batch=None, fail_reduce=False):
+        self.fail_batches = set(fail_batches)
+        self.failures_per_batch = failures_per_batch
+        self.fail_reduce = fail_reduce
+        self.attempts = {}
+        self.reduce_prompts = []
+
+    async def __call__(self, messages):
+        system, user = messages[0]['content'], messages[1]['content']
+        if 'partial analyses' in system:
+            self.reduce_prompts.append(system)
+            if self.fail_reduce:
+                raise RuntimeError('reduce failed')
+            content = re.search(r'\((\d+) summaries in total\)', system).group(0)
+        else:
+            first = user.split('\n\n')[0]
+            self.attempts[first] = self.attempts.get(first, 0) + 1
+            failing = any(marker in first for marker in self.fail_batches)
+            if failing and (self.failures_per_batch is None or self.attempts[first] <= self.failures_per_batch):
+                raise RuntimeError('rate limited')
+            content = f"{user.count('Summary ')} summaries"
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+@pytest.fixture(autouse=True)
+def no_retry_delay(monkeypatch):
+    monkeypatch.setattr(agent2, 'retry_delay', lambda error, attempt: 0.0)
+
+
+def _run(complete, texts, weights=None, retries=1):
+    analyzer = MapReduceAnalyzer(complete, batch_tokens=16, reduce_tokens=10, retries=retries)
+    return analyzer, asyncio.run(analyzer.run('Analyze these.', texts, weights))
+
+
+TEXTS = [f'summary number {n} about checkout' for n in range(6)]
+
+
+def test_all_batches_succeed():
+    analyzer, report = _run(FakeCompletions(), TEXTS)
+    assert analyzer.stats['batches'] > 1
+    assert analyzer.stats['failed_batches'] == 0
+    assert 'Partial coverage' not in report
+    assert '(6 summaries in total)' in report
+
+
+def test_transient_map_failure_is_retried():
+    complete = FakeCompletions(fail_batches=['number 2 '], failures_per_batch=1)
+    analyzer, report = _run(complete, TEXTS)
+    assert analyzer.stats['failed_batches'] == 0
+    assert analyzer.stats['retried_calls'] == 1
+    assert 'Partial coverage' not in report
+
+
+def test_failed_map_batch_is_reported_and_excluded_from_totals():
+    complete = FakeCompletions(fail_batches=['number 2 '])
+    analyzer, report = _run(complete, TEXTS, weights=[1, 1, 4, 1, 1, 1])
+    assert analyzer.stats['failed_batches'] == 1
+    assert analyzer.stats['conversations_covered'] == 5
+    assert report.startswith(f"⚠️ **Partial coverage:** 1 of {analyzer.stats['batches']} batches failed")
+    assert '5 of 9 conversations' in report
+    assert all('(5 summaries in total)' in prompt for prompt in complete.reduce_prompts)
+
+
+def test_every_map_batch_failing_raises():
+    complete = FakeCompletions(fail_batches=['summary number'])
+    with pytest.raises(RuntimeError, match='rate limited'):
+        _run(complete, TEXTS, retries=0)
+
+
+def test_failed_reduce_raises():
+    with pytest.raises(RuntimeError, match='reduce failed'):
+        _run(FakeCompletions(fail_reduce=True), TEXTS)
@@ -0,0 +1,22 @@
+import io
+
+import pandas as pd
+
+from agent2 import ConversationalAgent
+
+
+def test_out_of_range_scores_become_missing():
+    csv = pd.DataFrame({
+        'conversation_summary': ['Password reset failed.', 'DNS update worked.', 'Billing error.', 'Slow checkout.'],
+        'css_score': ['100', '300', 'n/a', '4.6'],
+        'nps_score': ['-100', '-129', '1e12', '10'],
+        'interaction_duration': ['65', '99999999999', 'inf', ''],
+    }).to_csv(index=False)
+    agent = ConversationalAgent()
+    assert agent.load_csv_from_buffer(io.BytesIO(csv.encode('utf-8')), 'scores.csv')
+
+    data = agent.current_csv_data
+    assert data['css_score'].tolist() == [100, pd.NA, pd.NA, 5]
+    assert data['nps_score'].tolist() == [-100, pd.NA, pd.NA, 10]
+    assert data['interaction_duration'].tolist() == [65, pd.NA, pd.NA, pd.NA]
+    assert str(data['css_score'].dtype) == 'Int8'
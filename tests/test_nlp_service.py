@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+
+import spacy
+
+from agent2 import NLPService
+
+
+class CountingModel:
+    """A blank English pipeline with a sentencizer that records which texts it parsed."""
+
+    def __init__(self):
+        self.nlp = spacy.blank('en')
+        self.nlp.add_pipe('sentencizer')
+        self.parsed = []
+
+    @property
+    def pipe_names(self):
+        return self.nlp.pipe_names
+
+    def pipe(self, texts, batch_size, n_process, disable):
+        self.parsed.extend(texts)
+        return self.nlp.pipe(texts, batch_size=batch_size, n_process=1, disable=disable)
+
+
+def test_features_parse_each_distinct_text_once():
+    model = CountingModel()
+    service = NLPService(SimpleNamespace(spacy_model=lambda: model), batch_size=2)
+    texts = ['Login failed. Reset worked.', 'Billing was wrong.', 'Login failed. Reset worked.']
+
+    features = service.features(texts)
+    assert [f.sentences for f in features] == [['login failed.', 'reset worked.'], ['billing was wrong.'],
+                                                ['login failed.', 'reset worked.']]
+    assert model.parsed == texts[:2]
+
+    assert service.features(['Billing was wrong.', 'New text.'])[0] == features[1]
+    assert model.parsed == texts[:2] + ['New text.']
+
+
+def test_cache_is_bounded_and_clearable():
+    model = CountingModel()
+    service = NLPService(SimpleNamespace(spacy_model=lambda: model), cache_size=2)
+    service.features(['One.', 'Two.'])
+    service.features(['Three.'])  # Over the bound: the cache starts over
+    service.features(['One.'])
+    assert model.parsed == ['One.', 'Two.', 'Three.', 'One.']
+
+    service.clear_cache()
+    service.features(['One.'])
+    assert model.parsed[-1] == 'One.' and len(model.parsed) == 5
@@ -0,0 +1,81 @@
+import io
+
+import pandas as pd
+import pytest
+
+import agent2
+from agent2 import ConversationalAgent, OperationCancelled, ProgressReporter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(agent2.time, 'perf_counter', lambda: now[0])
+    return now
+
+
+def test_snapshot_reports_rate_percent_and_eta(clock):
+    reporter = ProgressReporter()
+    reporter.update('scoring', 0, total=400)
+    clock[0] += 2.0
+    reporter.update('scoring', 100, total=400)
+    snapshot = reporter.snapshot()
+    assert (snapshot['stage'], snapshot['done'], snapshot['total']) == ('scoring', 100, 400)
+    assert snapshot['percent'] == 25.0 and snapshot['rate'] == 50.0 and snapshot['eta'] == 6.0
+
+    clock[0] += 1.0  # The estimate counts down between updates
+    assert reporter.snapshot()['eta'] == 5.0
+    reporter.update('matching', 1, total=None)
+    assert reporter.snapshot()['percent'] is None and reporter.snapshot()['eta'] is None
+
+
+def test_callback_is_throttled_except_on_stage_changes(clock):
+    sent = []
+    reporter = ProgressReporter(callback=sent.append, min_interval=0.5)
+    reporter.update('loading', 1)
+    clock[0] += 0.1
+    reporter.update('loading', 2)  # Too soon
+    reporter.update('scoring', 1)  # New stage
+    clock[0] += 0.6
+    reporter.update('scoring', 2)
+    reporter.finish()
+    assert [(s['stage'], s['done'], s['finished']) for s in sent] == [
+        ('loading', 1, False), ('scoring', 1, False), ('scoring', 2, False), ('scoring', 2, True)
+    ]
+
+
+def test_cancel_stops_the_operation_at_its_next_update():
+    reporter = ProgressReporter()
+    reporter.update('loading', 1)
+    reporter.cancel()
+    with pytest.raises(OperationCancelled):
+        reporter.update('loading', 2)
+    assert reporter.snapshot()['cancelled'] and reporter.snapshot()['done'] == 1
+
+
+def _csv(rows: int) -> io.BytesIO:
+    summaries = [f'Customer {n} could not finish checkout.' for n in range(rows)]
+    return io.BytesIO(pd.DataFrame({'conversation_summary': summaries}).to_csv(index=False).encode('utf-8'))
+
+
+def test_loading_reports_rows_and_honours_cancellation():
+    reporter = ProgressReporter()
+    agent = ConversationalAgent()
+    assert agent.load_csv_from_buffer(_csv(50), 'export.csv', reporter)
+    snapshot = reporter.snapshot()
+    assert (snapshot['stage'], snapshot['done'], snapshot['percent']) == ('loading', 50, 100.0)
+
+    cancelled = ProgressReporter()
+    cancelled.cancel()
+    with pytest.raises(OperationCancelled):
+        agent.load_csv_from_buffer(_csv(10), 'other.csv', cancelled)
+    assert len(agent.current_csv_data) == 50
+
+
+def test_cancelled_analysis_raises():
+    agent = ConversationalAgent()
+    assert agent.load_csv_from_buffer(_csv(20), 'export.csv')
+    reporter = ProgressReporter()
+    reporter.cancel()
+    with pytest.raises(OperationCancelled):
+        agent.analyze_summaries(reporter)
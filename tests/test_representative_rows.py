@@ -0,0 +1,46 @@
+import numpy as np
+from scipy import sparse
+
+from agent2 import representative_rows
+
+
+def _unit(rows):
+    rows = np.asarray(rows, dtype=np.float32)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+# Two near-copies close to the group's centroid, and one distinct but still relevant row
+EMBEDDINGS = _unit([
+    [1.0, 0.10, 0.0],
+    [1.0, 0.11, 0.0],
+    [0.8, 0.00, 0.6],
+    [0.0, 0.00, 1.0],
+])
+
+
+def test_relevance_only_picks_the_nearest_rows():
+    rows = representative_rows(EMBEDDINGS, [0, 1, 2], k=2, diversity=0.0)
+    assert set(rows.tolist()) == {0, 1}
+
+
+def test_diversity_skips_near_copies():
+    rows = representative_rows(EMBEDDINGS, [0, 1, 2], k=2, diversity=0.5)
+    assert rows[0] in (0, 1) and rows[1] == 2
+
+
+def test_weights_move_the_centroid():
+    rows = representative_rows(EMBEDDINGS, [0, 3], k=1, weights=np.array([1, 10]))
+    assert rows.tolist() == [3]
+
+
+def test_sparse_rows_match_dense():
+    for diversity in (0.0, 0.3, 0.7):
+        dense = representative_rows(EMBEDDINGS, [0, 1, 2, 3], k=3, diversity=diversity)
+        sparse_rows = representative_rows(sparse.csr_matrix(EMBEDDINGS), [0, 1, 2, 3], k=3, diversity=diversity)
+        assert dense.tolist() == sparse_rows.tolist()
+
+
+def test_small_inputs():
+    assert representative_rows(EMBEDDINGS, [2], k=2).tolist() == [2]
+    assert representative_rows(EMBEDDINGS, [], k=2).tolist() == []
+    assert len(representative_rows(EMBEDDINGS, [0, 1, 2, 3], k=10)) == 4
@@ -0,0 +1,42 @@
+import pytest
+import spacy
+
+from agent2 import ResourceRegistry
+
+
+def test_spacy_model_loads_once_on_first_use(monkeypatch):
+    loads = []
+    monkeypatch.setattr(spacy, 'load', lambda name: loads.append(name) or f'model {name}')
+    registry = ResourceRegistry(model_name='en_test_model', offline=True)
+    assert 'nothing loaded yet' in registry.startup_report()
+    assert loads == []
+
+    assert registry.spacy_model() == 'model en_test_model'
+    assert registry.spacy_model() == 'model en_test_model'
+    assert loads == ['en_test_model']
+    assert registry.loaded['spacy:en_test_model']['status'] == 'loaded'
+    assert '- spacy:en_test_model: loaded in' in registry.startup_report()
+
+
+def test_offline_missing_model_fails_fast_without_downloading(monkeypatch):
+    def missing(name):
+        raise OSError(f"[E050] Can't find model '{name}'")
+
+    monkeypatch.setattr(spacy, 'load', missing)
+    monkeypatch.setattr(spacy.cli, 'download', lambda name: pytest.fail('offline registry tried to download'))
+    registry = ResourceRegistry(model_name='en_test_model', offline=True)
+    with pytest.raises(RuntimeError, match='not installed and LIGHTHOUSE_OFFLINE is set'):
+        registry.spacy_model()
+    assert registry.loaded['spacy:en_test_model']['status'] == 'missing'
+
+
+def test_offline_missing_nltk_resource_fails_fast(monkeypatch):
+    def not_found(path):
+        raise LookupError(path)
+
+    monkeypatch.setattr('nltk.data.find', not_found)
+    monkeypatch.setattr('nltk.download', lambda *a, **k: pytest.fail('offline registry tried to download'))
+    registry = ResourceRegistry(offline=True)
+    with pytest.raises(RuntimeError, match="NLTK resource 'punkt'"):
+        registry.ensure_nltk('punkt')
+    assert registry.loaded['nltk:punkt']['status'] == 'missing'
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from agent2 import SimilarityIndex
+
+TEXTS = [
+    "password reset email never arrived",
+    "password reset link expired before use",
+    "dns records missing after domain transfer",
+    "domain transfer left dns records missing",
+    "checkout payment declined by the bank",
+    "password reset email never arrived",
+]
+
+
+@pytest.fixture
+def index():
+    return SimilarityIndex(TEXTS, vector_weight=0)
+
+
+def test_rows_are_unit_length_and_self_similarity_is_one(index):
+    norms = np.sqrt(index.matrix.multiply(index.matrix).sum(axis=1)).A1
+    assert np.allclose(norms, 1.0, atol=1e-5)
+    assert index.similarity(0, 5) == pytest.approx(1.0, abs=1e-5)
+    assert index.text_similarity(TEXTS[2], TEXTS[3]) > index.text_similarity(TEXTS[2], TEXTS[4])
+
+
+def test_most_similar_matches_brute_force_and_excludes_self(index):
+    rows = np.arange(len(TEXTS))
+    brute = index.pairwise(rows)
+    np.fill_diagonal(brute, -np.inf)
+    # A batch of one query row at a time exercises the batched path
+    index.batch_cells = len(TEXTS)
+    neighbours, scores = index.most_similar(rows, k=2)
+    assert neighbours.shape == (len(TEXTS), 2)
+    for row in rows:
+        assert row not in neighbours[row]
+        assert np.allclose(scores[row], np.sort(brute[row])[::-1][:2], atol=1e-6)
+    assert neighbours[0, 0] == 5 and neighbours[2, 0] == 3
+
+
+def test_self_is_returned_when_not_excluded(index):
+    neighbours, scores = index.most_similar([2], k=1, exclude_self=False)
+    assert neighbours[0, 0] == 2 and scores[0, 0] == pytest.approx(1.0, abs=1e-5)
+
+
+def test_queries_outside_the_corpus(index):
+    neighbours, scores = index.most_similar(index.transform(["dns records missing"]), k=10)
+    assert neighbours.shape == (1, len(TEXTS))  # k is capped at the corpus size
+    assert set(neighbours[0, :2]) == {2, 3}
+    assert np.all(np.diff(scores[0]) <= 0)
+
+
+def test_stop_word_only_corpus_has_zero_similarity():
+    index = SimilarityIndex(["the and of", "is it"], vector_weight=0)
+    assert index.similarity(0, 1) == 0.0
+    assert index.text_similarity("the", "and") == 0.0
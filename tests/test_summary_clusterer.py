@@ -0,0 +1,80 @@
+from collections import Counter
+
+import numpy as np
+
+from agent2 import SummaryClusterer
+
+TOPICS = {
+    'dns': ["dns records missing after domain transfer {}", "dns records missing after domain renewal {}"],
+    'password': ["password reset link expired before login {}", "password reset link expired before use {}"],
+    'billing': ["card declined at checkout payment page {}", "card declined at checkout payment form {}"],
+}
+# Filler shared by every topic, so texts are not exact copies
+FILLER = ["today", "again", "yesterday", "this morning"]
+
+
+def _corpus():
+    texts, truth = [], []
+    for topic, templates in TOPICS.items():
+        count = {'dns': 12, 'password': 8, 'billing': 6}[topic]
+        for n in range(count):
+            texts.append(templates[n % 2].format(FILLER[n % len(FILLER)]))
+            truth.append(topic)
+    return texts, np.array(truth)
+
+
+def _topics(texts, n):
+    """Most common word pairs, standing in for ConversationalAgent._get_common_topics."""
+    pairs = Counter(" ".join(pair) for text in texts for pair in zip(text.split(), text.split()[1:]))
+    return pairs.most_common(n)
+
+
+def test_clusters_recover_topics_largest_first():
+    texts, truth = _corpus()
+    clusterer = SummaryClusterer(clusters=3, dimensions=8, embedding='tfidf')
+    result = clusterer.cluster(texts, np.ones(len(texts)), _topics)
+
+    assert len(result.labels) == 3 and len(set(result.labels)) == 3
+    # Each cluster holds exactly one topic, numbered by size
+    for cluster, topic in enumerate(['dns', 'password', 'billing']):
+        assert set(truth[result.assignments == cluster]) == {topic}
+    assert sorted(np.concatenate(result.exemplars).tolist()) == list(range(len(texts)))
+    assert 'password reset' in result.labels[1]
+
+
+def test_weights_change_the_ranking():
+    texts, truth = _corpus()
+    weights = np.where(truth == 'billing', 3.0, 1.0)  # 18 conversations: now the largest
+    result = SummaryClusterer(clusters=3, dimensions=8).cluster(texts, weights, _topics)
+    assert set(truth[result.assignments == 0]) == {'billing'}
+
+
+def test_exemplars_start_near_the_centroid():
+    texts, _ = _corpus()
+    clusterer = SummaryClusterer(clusters=3, dimensions=8)
+    embeddings = clusterer.embed(texts)
+    assert np.allclose(np.linalg.norm(embeddings, axis=1), 1.0, atol=1e-5)
+    result = clusterer.cluster(texts, np.ones(len(texts)), _topics)
+    for members in result.exemplars:
+        # The mini-batch centroid approximates the members' mean
+        closeness = embeddings[members] @ embeddings[members].mean(axis=0)
+        assert closeness[0] >= closeness[-1]
+
+
+def test_deterministic_and_disabled_for_tiny_inputs():
+    texts, _ = _corpus()
+    first = SummaryClusterer(clusters=3, dimensions=8).cluster(texts, np.ones(len(texts)), _topics)
+    second = SummaryClusterer(clusters=3, dimensions=8).cluster(texts, np.ones(len(texts)), _topics)
+    assert np.array_equal(first.assignments, second.assignments) and first.labels == second.labels
+    assert SummaryClusterer(clusters=8).cluster(texts[:3], np.ones(3), _topics) is None
+    assert SummaryClusterer(clusters=0).cluster(texts, np.ones(len(texts)), _topics) is None
+
+
+def test_labels_skip_phrases_shared_by_most_clusters():
+    labels = SummaryClusterer._labels([
+        [('account', 9), ('dns records', 5)],
+        [('account', 8), ('password reset', 4)],
+        [('account', 7), ('card declined', 3)],
+    ], phrases=1)
+    assert labels == ['dns records', 'password reset', 'card declined']
+    assert SummaryClusterer._labels([[], [('x y', 1)]]) == ['Cluster 1', 'x y']
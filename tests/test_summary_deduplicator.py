@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from agent2 import SummaryDeduplicator
+
+BASE = ("The customer could not receive email after moving the domain to a new host because the MX "
+        "records still pointed at the old provider, so the agent updated the records and confirmed delivery.")
+NEAR = BASE.replace("confirmed delivery", "confirmed mail delivery")
+OTHER = "Checkout failed twice with a declined card even though the bank approved the payment on its side."
+
+
+def test_exact_duplicates_ignore_case_punctuation_and_spacing():
+    texts = [BASE, OTHER, BASE.upper(), f"  {BASE.replace(',', '')}  ", OTHER + "!"]
+    groups = SummaryDeduplicator(mode='exact').group(texts)
+    assert groups.group.tolist() == [0, 1, 0, 0, 1]
+    assert groups.representatives.tolist() == [0, 1]
+    assert groups.weights.tolist() == [3, 2]
+    assert (groups.exact_duplicates, groups.near_duplicates) == (3, 0)
+
+
+def test_near_duplicates_are_grouped_and_distinct_texts_are_not():
+    texts = [OTHER, BASE, NEAR, BASE]
+    groups = SummaryDeduplicator(mode='near').group(texts)
+    assert groups.group.tolist() == [0, 1, 1, 1]
+    assert groups.representatives.tolist() == [0, 1]
+    assert groups.weights.tolist() == [1, 3]
+    assert (groups.exact_duplicates, groups.near_duplicates) == (1, 1)
+    # Exact mode keeps the near duplicate apart
+    assert SummaryDeduplicator(mode='exact').group(texts).weights.tolist() == [1, 2, 1]
+
+
+def test_threshold_controls_near_matches():
+    assert SummaryDeduplicator(mode='near', threshold=1.0).group([BASE, NEAR]).near_duplicates == 0
+
+
+def test_grouping_is_deterministic_and_order_stable():
+    texts = [f"Ticket {n}: " + (BASE if n % 3 else OTHER) for n in range(60)]
+    first = SummaryDeduplicator().group(texts)
+    second = SummaryDeduplicator().group(texts)
+    assert np.array_equal(first.group, second.group)
+    # Groups are numbered in order of first appearance, and each representative is its group's first row
+    assert first.group[0] == 0 and np.all(np.diff(first.representatives) > 0)
+    assert all(first.group[rep] == number for number, rep in enumerate(first.representatives))
+    assert first.weights.sum() == len(texts)
+
+
+def test_off_and_empty():
+    groups = SummaryDeduplicator(mode='off').group([BASE, BASE])
+    assert groups.group.tolist() == [0, 1] and groups.weights.tolist() == [1, 1]
+    assert len(SummaryDeduplicator().group([]).weights) == 0
+
+
+def test_bands_must_divide_permutations():
+    with pytest.raises(ValueError):
+        SummaryDeduplicator(permutations=64, bands=10)
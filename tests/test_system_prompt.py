@@ -0,0 +1,45 @@
+import asyncio
+from types import SimpleNamespace
+
+from openai.types.chat import ChatCompletionChunk
+
+from agent2 import SYSTEM_PROMPT, ConversationalAgent, SystemPromptTemplate, count_message_tokens
+
+
+def test_cache_key_follows_version_and_text():
+    prompt = SystemPromptTemplate(version='1', text='You analyze summaries.')
+    assert prompt.cache_key == SystemPromptTemplate(version='1', text='You analyze summaries.').cache_key
+    assert prompt.cache_key != SystemPromptTemplate(version='2', text='You analyze summaries.').cache_key
+    assert prompt.cache_key != SystemPromptTemplate(version='1', text='You analyze transcripts.').cache_key
+    assert prompt.token_count == count_message_tokens([prompt.message]) - 2
+
+
+def _agent(requests):
+    async def create(**kwargs):
+        requests.append(kwargs['messages'])
+
+        async def stream():
+            yield ChatCompletionChunk(id='chatcmpl-test', object='chat.completion.chunk', created=0, model='test-model',
+                                      choices=[{'index': 0, 'delta': {'content': 'Noted.'}, 'finish_reason': 'stop'}])
+
+        return stream()
+
+    agent = ConversationalAgent()
+    agent.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    agent.current_mode = 'summary'
+    return agent
+
+
+def test_every_request_starts_with_the_same_system_message():
+    requests = []
+    first, second = _agent(requests), _agent(requests)
+    asyncio.run(first.chat('Focus on checkout errors.'))
+    asyncio.run(second.chat('Focus on DNS problems.'))
+    asyncio.run(first.chat('Also include refunds.'))
+
+    assert len(requests) == 3
+    assert all(messages[0] is SYSTEM_PROMPT.message for messages in requests)
+    stats = first.last_token_stats
+    assert stats['prefix_tokens'] == SYSTEM_PROMPT.token_count
+    assert stats['variable_tokens'] == count_message_tokens(requests[-1][1:])
+    assert stats['total_tokens'] == stats['prefix_tokens'] + stats['variable_tokens']